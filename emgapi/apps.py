@@ -21,3 +21,7 @@ from django.apps import AppConfig
 class EmgApiConfig(AppConfig):
     name = 'emgapi'
     # label = 'api'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
@@ -14,39 +14,104 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
+import threading
 
 import requests
 
+from requests.adapters import HTTPAdapter
+
 from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
 
 from django.contrib.auth.models import User
 
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'emg:auth:'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests session, connections to the auth service are reused.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.EMG_BACKEND_AUTH_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def credentials_key(username, password):
+    """Cache key of the credentials, a salted hash of username and password.
+    """
+    digest = salted_hmac(
+        'emgapi.backends.EMGBackend',
+        '{}\0{}'.format(username.lower(), password),
+        algorithm='sha256').hexdigest()
+    return CACHE_KEY_PREFIX + digest
+
 
 class EMGBackend:
     """ENA Auth backend
+
+    Credentials verified by ENA are cached for
+    EMG_BACKEND_AUTH_CACHE_TTL seconds.
     """
 
     supports_anonymous_user = False
     supports_object_permissions = False
 
-    def authenticate(self, request, username=None, password=None):
-        ena_auth_url = settings.EMG_BACKEND_AUTH_URL
+    def get_cache(self):
+        return caches[settings.EMG_BACKEND_AUTH_CACHE]
+
+    def verify(self, username, password):
+        """Check the credentials with the ENA auth service.
+        """
         data = {
             'authRealms': ['SRA'],
             'rememberMe': False,
             'username': username,
             'password': password,
         }
-        req = requests.post(ena_auth_url, json=data)
-        resp = req.json()
-        if req.status_code == 200:
-            if resp.get('authenticated', False):
-                user, created = User.objects.get_or_create(
-                    username__iexact=username,
-                    defaults={'username': username.lower()}
-                )
-                return user
-        return None
+        try:
+            req = get_session().post(
+                settings.EMG_BACKEND_AUTH_URL, json=data,
+                timeout=settings.EMG_BACKEND_AUTH_TIMEOUT)
+            if req.status_code != 200:
+                return False
+            return bool(req.json().get('authenticated', False))
+        except (requests.RequestException, ValueError):
+            logger.exception("ENA authentication failed for %s", username)
+            return False
+
+    def authenticate(self, request, username=None, password=None):
+        if not username or password is None:
+            return None
+
+        ttl = settings.EMG_BACKEND_AUTH_CACHE_TTL
+        key = credentials_key(username, password)
+        if not (ttl and self.get_cache().get(key)):
+            if not self.verify(username, password):
+                return None
+            if ttl:
+                self.get_cache().set(key, True, timeout=ttl)
+
+        user, created = User.objects.get_or_create(
+            username__iexact=username,
+            defaults={'username': username.lower()}
+        )
+        return user
 
     def get_user(self, user_id):
         try:
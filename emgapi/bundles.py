@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Archives of the download files of a study.
+
+The files are read from RESULTS_DIR while the archive is streamed. The
+layout only depends on the files (names, sizes, modification times and
+checksums): the tar archives can be resumed with range requests, the
+ETag changes if any of the files does.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tarfile
+import time
+import zipfile
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+range_regex = re.compile(r'^\s*bytes=(\d*)-(\d*)\s*$')
+
+BundleFile = namedtuple(
+    'BundleFile', ['name', 'path', 'size', 'mtime', 'algorithm', 'checksum'])
+
+
+def download_path(download, result_directory):
+    """Path of the download file in RESULTS_DIR.
+    """
+    parts = [settings.RESULTS_DIR, result_directory]
+    if download.subdir is not None:
+        parts.append(download.subdir.subdir)
+    parts.append(download.realname)
+    return os.path.abspath(os.path.join(*parts))
+
+
+def _clean(name):
+    return name.replace('/', '_').lstrip('.') or '_'
+
+
+def bundle_files(study, study_downloads, analysis_downloads):
+    """Files of the study bundle sorted by name:
+        <study>/v<pipeline>/<alias> for the study downloads
+        <study>/<analysis>/<alias> for the analyses downloads
+    Files missing in RESULTS_DIR are skipped.
+    """
+    results_dir = os.path.abspath(settings.RESULTS_DIR)
+    candidates = []
+    for download in study_downloads:
+        folder = 'v{}'.format(download.pipeline.release_version) \
+            if download.pipeline is not None else 'study'
+        candidates.append((folder, download, study.result_directory))
+    for download in analysis_downloads:
+        candidates.append(
+            (download.job.accession, download, download.job.result_directory))
+
+    files = {}
+    for folder, download, result_directory in candidates:
+        name = '/'.join(
+            (study.accession, _clean(folder), _clean(download.alias)))
+        if name in files:
+            continue
+        path = download_path(download, result_directory or '')
+        if not path.startswith(results_dir + os.sep):
+            logger.warning("Download outside RESULTS_DIR %s", path)
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.warning("Missing download file %s", path)
+            continue
+        algorithm = download.checksum_algorithm
+        files[name] = BundleFile(
+            name=name, path=path, size=stat.st_size,
+            mtime=int(stat.st_mtime),
+            algorithm=algorithm.name if algorithm is not None else '',
+            checksum=download.file_checksum or '')
+    return [files[name] for name in sorted(files)]
+
+
+def manifest(files):
+    """Tab separated list of the files and their checksums.
+    """
+    lines = ['path\tsize\tchecksum_algorithm\tchecksum']
+    for f in files:
+        lines.append('\t'.join(
+            (f.name, str(f.size), f.algorithm, f.checksum)))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def read_file(path, offset, length):
+    with open(path, 'rb') as source:
+        source.seek(offset)
+        while length > 0:
+            data = source.read(min(BLOCK_SIZE, length))
+            if not data:
+                raise IOError('{} is shorter than expected'.format(path))
+            length -= len(data)
+            yield data
+
+
+class Bundle(object):
+    """Archive of the files, with a manifest.
+    """
+    content_type = None
+    extension = None
+    # range requests
+    ranges = False
+    size = None
+
+    def __init__(self, files, manifest_name):
+        self.files = files
+        self.manifest_name = manifest_name
+        self.mtime = max([f.mtime for f in files] or [0])
+
+    @property
+    def etag(self):
+        key = hashlib.sha1(self.extension.encode('utf-8'))
+        for f in self.files:
+            key.update(repr((f.name, f.size, f.mtime, f.checksum))
+                       .encode('utf-8'))
+        return '"{}"'.format(key.hexdigest())
+
+    def iter_range(self, start=0, end=None):
+        raise NotImplementedError()
+
+
+class TarBundle(Bundle):
+    """Uncompressed (PAX) tar archive.
+
+    The archive is a list of parts, bytes or (path, size) of the files,
+    so any range of it can be produced without reading what comes
+    before.
+    """
+    content_type = 'application/x-tar'
+    extension = 'tar'
+    ranges = True
+
+    def __init__(self, files, manifest_name):
+        super(TarBundle, self).__init__(files, manifest_name)
+        self.parts = []
+        self.size = 0
+        data = manifest(files)
+        self.add(manifest_name, len(data), self.mtime, data)
+        for f in files:
+            self.add(f.name, f.size, f.mtime, (f.path, f.size))
+        # end of archive, padded to a full record
+        end = 2 * tarfile.BLOCKSIZE
+        remainder = (self.size + end) % tarfile.RECORDSIZE
+        if remainder:
+            end += tarfile.RECORDSIZE - remainder
+        self.append(tarfile.NUL * end)
+
+    @staticmethod
+    def part_size(part):
+        return part[1] if isinstance(part, tuple) else len(part)
+
+    def append(self, part):
+        self.parts.append(part)
+        self.size += self.part_size(part)
+
+    def add(self, name, size, mtime, part):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        self.append(
+            info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+        self.append(part)
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            self.append(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    def iter_range(self, start=0, end=None):
+        """Bytes start to end (excluded) of the archive.
+        """
+        end = self.size if end is None else min(end, self.size)
+        offset = 0
+        for part in self.parts:
+            size = self.part_size(part)
+            if offset + size > start and offset < end:
+                first = max(start - offset, 0)
+                length = min(end - offset, size) - first
+                if isinstance(part, tuple):
+                    for data in read_file(part[0], first, length):
+                        yield data
+                else:
+                    yield part[first:first + length]
+            offset += size
+            if offset >= end:
+                return
+
+
+class _ZipSink(object):
+    """Unseekable file for zipfile, the written bytes are taken
+    with drain().
+    """
+
+    def __init__(self):
+        self._buffer = []
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._buffer)
+        self._buffer = []
+        return data
+
+
+class ZipBundle(Bundle):
+    """Zip archive, the files are stored (they are compressed already).
+
+    The size and CRC of the entries are written after their data, the
+    archive is streamed in full, without range requests.
+    """
+    content_type = 'application/zip'
+    extension = 'zip'
+
+    @staticmethod
+    def zip_info(name, mtime):
+        # zip dates start in 1980
+        date_time = time.gmtime(max(mtime, 315532800))[:6]
+        info = zipfile.ZipInfo(name, date_time=date_time)
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        return info
+
+    def iter_range(self, start=0, end=None):
+        sink = _ZipSink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            archive.writestr(
+                self.zip_info(self.manifest_name, self.mtime),
+                manifest(self.files))
+            yield sink.drain()
+            for f in self.files:
+                info = self.zip_info(f.name, f.mtime)
+                with archive.open(
+                        info, 'w',
+                        force_zip64=f.size > zipfile.ZIP64_LIMIT) as dest:
+                    for data in read_file(f.path, 0, f.size):
+                        dest.write(data)
+                        yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+
+
+def parse_range(header, size):
+    """(start, end) of a single range header, end excluded.
+    None if there is no range, multiple ranges are ignored.
+    ValueError if the range can't be satisfied.
+    """
+    match = range_regex.match(header or '')
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # suffix, the last bytes
+        length = int(last)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    end = int(last) + 1 if last else size
+    return start, min(end, size)
+
+
+def bundle_response(request, bundle, filename):
+    """Streaming response of the bundle, a single range of the
+    tar archives can be requested.
+    """
+    etag = bundle.etag
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    byte_range = None
+    if bundle.ranges and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        try:
+            byte_range = parse_range(
+                request.META.get('HTTP_RANGE'), bundle.size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(bundle.size)
+            return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(
+            bundle.iter_range(), content_type=bundle.content_type)
+        if bundle.size is not None:
+            response['Content-Length'] = str(bundle.size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            bundle.iter_range(start, end), status=206,
+            content_type=bundle.content_type)
+        response['Content-Length'] = str(end - start)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(
+            start, end - 1, bundle.size)
+    if bundle.ranges:
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = \
+        'attachment; filename="{}.{}"'.format(filename, bundle.extension)
+    return response
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests session for EBI Search, connections are reused
+    and failed requests retried with an exponential backoff.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=settings.EMG_EBI_SEARCH_RETRIES,
+                    backoff_factor=settings.EMG_EBI_SEARCH_BACKOFF,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    raise_on_status=False)
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.EMG_EBI_SEARCH_WORKERS,
+                    max_retries=retry)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def get_page(url, query, start, size):
+    """Entries of one EBI Search page.
+    """
+    params = dict(query, start=start, size=size)
+    response = get_session().get(
+        url, params=params, timeout=settings.EMG_EBI_SEARCH_TIMEOUT)
+    if not response.ok:
+        raise Exception(
+            "There was an error downloading the data from EBI Search. " +
+            "Status Code: " + str(response.status_code) +
+            " Content: " + response.text)
+    return response.json().get("entries", [])
+
+
+def iter_entries(url, query, total, page_size=100, workers=None):
+    """Entries of the first total results, in order.
+
+    The next pages are fetched by a pool of workers while the previous
+    ones are consumed, at most workers pages are held in memory.
+    """
+    workers = workers or settings.EMG_EBI_SEARCH_WORKERS
+    starts = iter(range(0, total, page_size))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            pending.append(
+                executor.submit(get_page, url, query, start, page_size))
+
+    try:
+        for _ in range(workers):
+            submit_next()
+        while pending:
+            entries = pending.popleft().result()
+            submit_next()
+            for entry in entries:
+                yield entry
+    finally:
+        # the client may have gone away
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
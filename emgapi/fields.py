@@ -19,6 +19,18 @@ import urllib
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
+from .reverse import URLTemplateMixin
+
+
+class HyperlinkedIdentityField(URLTemplateMixin,
+                               serializers.HyperlinkedIdentityField):
+    pass
+
+
+class HyperlinkedRelatedField(URLTemplateMixin,
+                              serializers.HyperlinkedRelatedField):
+    pass
+
 
 class DownloadHyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
 
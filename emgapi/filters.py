@@ -131,17 +131,11 @@ class StudyFilter(django_filters.FilterSet):
         help_text='Biome lineage')
 
     def filter_lineage(self, qs, name, value):
-        try:
-            b = emg_models.Biome.objects.get(lineage=value)
-            studies = emg_models.Sample.objects.values('studies') \
-                .available(self.request) \
-                .filter(
-                    biome__lft__gte=b.lft,
-                    biome__rgt__lte=b.rgt)
-            qs = qs.filter(pk__in=studies)
-        except emg_models.Biome.DoesNotExist:
-            pass
-        return qs
+        samples = emg_models.Sample.objects.available(self.request)
+        studies = emg_models.SampleBiomeAncestor.objects \
+            .filter(biome=value, sample__in=samples) \
+            .values('sample__studies')
+        return qs.filter(pk__in=studies)
 
     biome_name = django_filters.CharFilter(
         method='filter_biome_name', distinct=True,
@@ -309,12 +303,9 @@ class SampleFilter(django_filters.FilterSet):
         help_text='Biome lineage')
 
     def filter_lineage(self, qs, name, value):
-        try:
-            b = emg_models.Biome.objects.get(lineage=value)
-            qs = qs.filter(biome__lft__gte=b.lft, biome__rgt__lte=b.rgt)
-        except emg_models.Biome.DoesNotExist:
-            pass
-        return qs
+        samples = emg_models.SampleBiomeAncestor.objects \
+            .filter(biome=value).values('sample')
+        return qs.filter(pk__in=samples)
 
     instrument_platform = django_filters.CharFilter(
         method='filter_instrument_platform', distinct=True,
@@ -517,14 +508,9 @@ class RunFilter(django_filters.FilterSet):
         help_text='Biome lineage')
 
     def filter_lineage(self, qs, name, value):
-        try:
-            b = emg_models.Biome.objects.get(lineage=value)
-            qs = qs.filter(
-                sample__biome__lft__gte=b.lft,
-                sample__biome__rgt__lte=b.rgt)
-        except emg_models.Biome.DoesNotExist:
-            pass
-        return qs
+        samples = emg_models.SampleBiomeAncestor.objects \
+            .filter(biome=value).values('sample')
+        return qs.filter(sample__in=samples)
 
     species = django_filters.CharFilter(
         method='filter_species', distinct=True,
@@ -704,14 +690,9 @@ class AssemblyFilter(django_filters.FilterSet):
         help_text='Biome lineage')
 
     def filter_lineage(self, qs, name, value):
-        try:
-            b = emg_models.Biome.objects.get(lineage=value)
-            qs = qs.filter(
-                samples__biome__lft__gte=b.lft,
-                samples__biome__rgt__lte=b.rgt)
-        except emg_models.Biome.DoesNotExist:
-            pass
-        return qs
+        samples = emg_models.SampleBiomeAncestor.objects \
+            .filter(biome=value).values('sample')
+        return qs.filter(samples__in=samples)
 
     species = django_filters.CharFilter(
         method='filter_species', distinct=True,
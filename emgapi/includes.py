@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batched relations for the serializer methods.
+
+The first time a relation is requested for an object, it is loaded for
+every object of the same type serialized so far in the document (the
+page and the included resources): one query for the links and one for
+the related objects. The related objects are shared, an object linked
+from many resources is loaded and instantiated once.
+"""
+
+from collections import defaultdict
+
+from rest_framework.serializers import ListSerializer
+
+CONTEXT_KEY = 'include_resolver'
+
+
+class IncludeResolver(object):
+
+    def __init__(self):
+        # model -> {pk: object}, the objects of the document
+        self._objects = defaultdict(dict)
+        # (model, relation name) -> {pk: [related objects]}
+        self._resolved = {}
+
+    def add(self, objects):
+        for obj in objects:
+            self._objects[obj._meta.concrete_model].setdefault(obj.pk, obj)
+
+    def resolve(self, name, obj, links, queryset, siblings=()):
+        """Related objects of obj.
+
+        links(pks) returns the (pk, related pk) pairs of the objects,
+        queryset the related objects, in order.
+        """
+        model = obj._meta.concrete_model
+        resolved = self._resolved.setdefault((model, name), {})
+        if obj.pk in resolved:
+            return resolved[obj.pk]
+
+        self.add(siblings)
+        self.add([obj])
+        pks = [pk for pk in self._objects[model] if pk not in resolved]
+        for pk in pks:
+            resolved[pk] = []
+
+        owners = defaultdict(set)
+        for pk, related_pk in links(pks):
+            owners[related_pk].add(pk)
+        if owners:
+            related = list(queryset.filter(pk__in=list(owners)))
+            for related_obj in related:
+                for pk in owners[related_obj.pk]:
+                    resolved[pk].append(related_obj)
+            self.add(related)
+        return resolved[obj.pk]
+
+
+def resolve(serializer, name, obj, links, queryset):
+    """Resolve the relation for the object serialized by serializer.
+    The resolver is shared through the serializer context.
+    """
+    context = serializer.context
+    resolver = context.get(CONTEXT_KEY, None)
+    if resolver is None:
+        resolver = context[CONTEXT_KEY] = IncludeResolver()
+    siblings = ()
+    parent = serializer.parent
+    if isinstance(parent, ListSerializer) and parent.instance is not None:
+        siblings = parent.instance
+    return resolver.resolve(name, obj, links, queryset, siblings=siblings)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import timeit
+
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, Resolver404
+
+from rest_framework_json_api.renderers import JSONRenderer
+
+from emgapi import renderers as emg_renderers
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compare the output and render time of the JSON:API renderers."
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            "urls",
+            nargs="+",
+            type=str,
+            help="API urls, i.e. /v1/studies?page_size=100",
+        )
+        parser.add_argument(
+            "-n",
+            "--number",
+            action="store",
+            required=False,
+            default=20,
+            type=int,
+            help="Number of renders per renderer",
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        renderers = (
+            ("json_api", JSONRenderer()),
+            ("native", emg_renderers.JSONAPIRenderer()),
+        )
+        if emg_renderers.orjson is None:
+            logger.warning("orjson is not installed, "
+                           "the native renderer uses the json module")
+
+        for url in options["urls"]:
+            request = factory.get(url, HTTP_ACCEPT=JSONRenderer.media_type)
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                raise CommandError("{} is not an API url".format(url))
+            response = match.func(request, *match.args, **match.kwargs)
+            media_type = JSONRenderer.media_type
+            context = response.renderer_context
+            context["response"] = response
+
+            output = {}
+            for name, renderer in renderers:
+                output[name] = renderer.render(
+                    response.data, media_type, context)
+                elapsed = timeit.timeit(
+                    lambda: renderer.render(
+                        response.data, media_type, context),
+                    number=options["number"])
+                self.stdout.write("{}\t{}\t{:.2f} ms\t{} bytes".format(
+                    url, name, elapsed * 1000 / options["number"],
+                    len(output[name])))
+
+            if output["json_api"] != output["native"]:
+                raise CommandError("{} output differs".format(url))
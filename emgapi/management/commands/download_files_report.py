@@ -18,14 +18,54 @@ import logging
 import csv
 import os
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.management import BaseCommand
-from django.conf import settings
-from django.core.paginator import Paginator
 
-from emgapi.models import Study, AnalysisJob, Pipeline, AnalysisJobDownload
+from emgapi import utils as emg_utils
+from emgapi.bundles import download_path
+from emgapi.models import Study, Pipeline, AnalysisJobDownload
 
 logger = logging.getLogger(__name__)
 
+# directory listings kept in memory
+LISTINGS_CACHE_SIZE = 10000
+
+
+class DirectoryListings(object):
+    """Names of the files of the directories, each directory is listed
+    once (the most recently used ones are kept).
+    """
+
+    def __init__(self, max_size=LISTINGS_CACHE_SIZE):
+        self.max_size = max_size
+        self.listings = OrderedDict()
+
+    def missing(self, directories):
+        return [d for d in directories if d not in self.listings]
+
+    def add(self, directory, names):
+        self.listings[directory] = names
+        self.listings.move_to_end(directory)
+        while len(self.listings) > self.max_size:
+            self.listings.popitem(last=False)
+
+    def exists(self, path):
+        directory, name = os.path.split(path)
+        names = self.listings.get(directory)
+        if names is None:
+            return os.path.exists(path)
+        self.listings.move_to_end(directory)
+        return name in names
+
+
+def list_dir(directory):
+    try:
+        return directory, frozenset(os.listdir(directory))
+    except OSError:
+        return directory, frozenset()
+
 
 class Command(BaseCommand):
     help = "Check for missing download files for all (or any) study."
@@ -57,6 +97,24 @@ class Command(BaseCommand):
             choices=["1.0", "2.0", "3.0", "4.0", "4.1", "5.0"],
             required=False,
         )
+        parser.add_argument(
+            "--chunk-size",
+            help="Number of download files read per query",
+            type=int,
+            default=1000,
+        )
+        parser.add_argument(
+            "--workers",
+            help="Number of threads listing the result directories",
+            type=int,
+            default=8,
+        )
+        parser.add_argument(
+            "--after",
+            help="Resume after this file id, the report is appended to the output",
+            type=int,
+            required=False,
+        )
 
     def handle(self, *args, **options):
         """Review all the download files for all the studies."""
@@ -64,72 +122,90 @@ class Command(BaseCommand):
         study_accession = options.get("study")
         pipeline_version = options.get("pipeline")
         out_tsv = options.get("output")
+        after = options.get("after")
 
-        download_files = AnalysisJobDownload.objects.all()
+        download_files = AnalysisJobDownload.objects \
+            .select_related(None) \
+            .select_related("job__study", "subdir")
 
         if study_accession:
-            study = Study.objects.get(accession=study_accession)
-            download_files = download_files.filter(study=study)
+            study = Study.objects.get(*emg_utils.study_accession_query(study_accession))
+            download_files = download_files.filter(job__study=study)
 
         if pipeline_version:
             pipeline = Pipeline.objects.get(release_version=pipeline_version)
             download_files = download_files.filter(job__pipeline=pipeline)
 
-        with open(out_tsv, "w", newline="") as tsvfile:
-            tsv_writer = csv.writer(tsvfile, delimiter="\t")
-            tsv_writer.writerow(
-                [
-                    "file_id",
-                    "file_path",
-                    "job_accession",
-                    "study_accession",
-                    "unzipped?",
-                ]
-            )
-
-            paginator = Paginator(download_files, 50)
+        listings = DirectoryListings()
+        checked = missing = 0
 
-            for page_index in range(1, paginator.num_pages + 1):
-
-                page = paginator.page(page_index)
-                logger.debug(
-                    "Processing page: "
-                    + str(page_index)
-                    + " of "
-                    + str(paginator.num_pages)
+        with open(out_tsv, "a" if after else "w", newline="") as tsvfile, \
+                ThreadPoolExecutor(max_workers=options.get("workers")) as executor:
+            tsv_writer = csv.writer(tsvfile, delimiter="\t")
+            if not after:
+                tsv_writer.writerow(
+                    [
+                        "file_id",
+                        "file_path",
+                        "job_accession",
+                        "study_accession",
+                        "unzipped?",
+                    ]
                 )
 
-                for d_file in page.object_list:
-
-                    d_file_path = "{0}/{1}".format(
-                        d_file.job.study.result_directory, d_file.realname
+            for chunk in self.iter_chunks(download_files, options.get("chunk_size"), after):
+                paths = [
+                    download_path(d_file, d_file.job.result_directory or "")
+                    for d_file in chunk
+                ]
+                directories = listings.missing(
+                    OrderedDict.fromkeys(os.path.dirname(p) for p in paths))
+                for directory, names in executor.map(list_dir, directories):
+                    listings.add(directory, names)
+
+                for d_file, file_path in zip(chunk, paths):
+                    if listings.exists(file_path):
+                        continue
+                    logger.debug("Missing file: " + file_path)
+                    missing += 1
+                    unzipped_exists = None
+                    # if gzipped try with no extension
+                    if file_path.endswith(".gz"):
+                        unzipped_exists = listings.exists(file_path[:-3])
+                        if unzipped_exists:
+                            logger.debug(
+                                "--- but uncompressed file exists: " + file_path[:-3]
+                            )
+                    tsv_writer.writerow(
+                        [
+                            d_file.pk,
+                            file_path,
+                            d_file.job.accession,
+                            d_file.job.study.accession,
+                            unzipped_exists,
+                        ]
                     )
 
-                    if d_file.subdir is not None:
-                        d_file_path = "{0}/{1}/{2}".format(
-                            d_file.job.study.result_directory,
-                            d_file.subdir,
-                            d_file.realname,
-                        )
-
-                    file_path = os.path.join(settings.RESULTS_DIR, d_file_path)
-
-                    if not os.path.exists(file_path):
-                        logging.debug("Missing file: " + file_path)
-                        unzipped_exists = None
-                        # if gzipped try with no extension
-                        if file_path.endswith(".gz"):
-                            unzipped_exists = os.path.exists(file_path[:3])
-                            if unzipped_exists:
-                                logging.debug(
-                                    "--- but uncompressed file exists: " + file_path[:3]
-                                )
-                        tsv_writer.writerow(
-                            [
-                                d_file.pk,
-                                file_path,
-                                d_file.job.study.accession,
-                                d_file.job.accession,
-                                unzipped_exists,
-                            ]
-                        )
+                checked += len(chunk)
+                # the report can be followed (or resumed) while running
+                tsvfile.flush()
+                logger.info(
+                    "Checked {} files, {} missing, last file id {}".format(
+                        checked, missing, chunk[-1].pk)
+                )
+
+    @staticmethod
+    def iter_chunks(queryset, chunk_size, after=None):
+        """The download files by id, in chunks of chunk_size.
+        The chunks are selected by id (no offsets).
+        """
+        queryset = queryset.order_by("pk")
+        while True:
+            chunk_qs = queryset
+            if after is not None:
+                chunk_qs = chunk_qs.filter(pk__gt=after)
+            chunk = list(chunk_qs[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            after = chunk[-1].pk
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from django.core.management import BaseCommand
+
+from emgapi import models as emg_models
+from emgapi import utils as emg_utils
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the study and sample biome closure tables " \
+           "used by the lineage filters."
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            "-s",
+            "--study",
+            action="store",
+            nargs="+",
+            required=False,
+            type=str,
+            help="Study accessions, all the studies and samples if missing",
+        )
+        parser.add_argument(
+            "--database",
+            help="Target emg_db_name alias",
+            default="default",
+        )
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        accessions = options.get("study")
+        if not accessions:
+            logger.info("Refreshing all the biome closures")
+            emg_models.refresh_biome_ancestors(using=database)
+            return
+
+        for accession in accessions:
+            study = emg_models.Study.objects.using(database) \
+                .get(*emg_utils.study_accession_query(accession))
+            samples = emg_models.StudySample.objects.using(database) \
+                .filter(study=study).values_list("sample_id", flat=True)
+            logger.info("Refreshing the biome closures of {}".format(study))
+            emg_models.refresh_biome_ancestors(
+                samples=samples, studies=[study.pk], using=database)
@@ -0,0 +1,76 @@
+# Generated by Django 3.2 on 2021-07-05 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_biome_ancestors(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Biome = apps.get_model("emgapi", "Biome")
+    Sample = apps.get_model("emgapi", "Sample")
+    StudySample = apps.get_model("emgapi", "StudySample")
+    SampleBiomeAncestor = apps.get_model("emgapi", "SampleBiomeAncestor")
+    StudyBiomeAncestor = apps.get_model("emgapi", "StudyBiomeAncestor")
+
+    tree = list(Biome.objects.using(db).values_list('biome_id', 'lft', 'rgt'))
+    ancestors = {}
+    for biome_id, lft, rgt in tree:
+        ancestors[biome_id] = [b_id for b_id, b_lft, b_rgt in tree
+                               if b_lft <= lft and b_rgt >= rgt]
+
+    SampleBiomeAncestor.objects.using(db).bulk_create([
+        SampleBiomeAncestor(sample_id=sample_id, biome_id=ancestor_id)
+        for sample_id, biome_id in Sample.objects.using(db)
+        .filter(biome__isnull=False).values_list('pk', 'biome_id')
+        for ancestor_id in ancestors[biome_id]
+    ], batch_size=1000)
+
+    closure = {}
+    for study_id, biome_id in StudySample.objects.using(db) \
+            .filter(sample__biome__isnull=False) \
+            .values_list('study_id', 'sample__biome_id').distinct():
+        for ancestor_id in ancestors[biome_id]:
+            key = (study_id, ancestor_id)
+            closure[key] = closure.get(key, False) or ancestor_id == biome_id
+    StudyBiomeAncestor.objects.using(db).bulk_create([
+        StudyBiomeAncestor(study_id=study_id, biome_id=biome_id, direct=direct)
+        for (study_id, biome_id), direct in closure.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emgapi', '0032_auto_20210615_0939'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SampleBiomeAncestor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('biome', models.ForeignKey(db_column='BIOME_ID', on_delete=django.db.models.deletion.CASCADE, related_name='sample_descendants', to='emgapi.biome')),
+                ('sample', models.ForeignKey(db_column='SAMPLE_ID', on_delete=django.db.models.deletion.CASCADE, related_name='biome_ancestors', to='emgapi.sample')),
+            ],
+            options={
+                'db_table': 'SAMPLE_BIOME_ANCESTOR',
+                'unique_together': {('sample', 'biome')},
+                'index_together': {('biome', 'sample')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudyBiomeAncestor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direct', models.BooleanField(db_column='IS_DIRECT', default=False)),
+                ('biome', models.ForeignKey(db_column='BIOME_ID', on_delete=django.db.models.deletion.CASCADE, related_name='study_descendants', to='emgapi.biome')),
+                ('study', models.ForeignKey(db_column='STUDY_ID', on_delete=django.db.models.deletion.CASCADE, related_name='biome_ancestors', to='emgapi.study')),
+            ],
+            options={
+                'db_table': 'STUDY_BIOME_ANCESTOR',
+                'unique_together': {('study', 'biome')},
+                'index_together': {('biome', 'study')},
+            },
+        ),
+        migrations.RunPython(populate_biome_ancestors, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,12 +1,17 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import calendar
+import hashlib
+
 from django.shortcuts import get_object_or_404
 from django.http.response import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 from rest_framework.response import Response
 
-from emgapi.renderers import CSVStreamingRenderer
+from emgapi.renderers import StreamingExportMixin
 
 
 class MultipleFieldLookupMixin(object):
@@ -36,13 +41,14 @@ class ListModelMixin(object):
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
-        if isinstance(request.accepted_renderer, CSVStreamingRenderer):
+        renderer = request.accepted_renderer
+        if isinstance(renderer, StreamingExportMixin):
             response = StreamingHttpResponse(
-                request.accepted_renderer.render({
+                renderer.render({
                     'queryset': queryset,
                     'serializer': self.get_serializer_class(),
                     'context': {'request': request},
-                }), content_type='text/csv')
+                }), content_type=renderer.media_type)
             try:
                 filename = queryset.model.__name__
             except AttributeError:
@@ -51,7 +57,8 @@ class ListModelMixin(object):
                 except AttributeError:
                     filename = queryset._document.__name__
             response['Content-Disposition'] = \
-                'attachment; filename="{}.csv"'.format(filename)
+                'attachment; filename="{}.{}"'.format(
+                    filename, renderer.format)
             return response
 
         page = self.paginate_queryset(queryset)
@@ -61,3 +68,56 @@ class ListModelMixin(object):
 
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
+
+
+class LastUpdateConditionalMixin(object):
+    """
+    Conditional GET using validators (ETag and Last-Modified) computed from
+    the MAX(last_update) of the objects in the response and the requested
+    url (fields, include, page...), a 304 is returned before the response
+    is serialized.
+
+    Usage:
+        `get_last_update_querysets`: querysets of the objects in the response
+        `conditional_response(handler, request, ...)` in the view actions
+    """
+
+    def get_last_update_querysets(self):
+        raise NotImplementedError()
+
+    def get_last_modified(self):
+        dates = []
+        for queryset in self.get_last_update_querysets():
+            last_update = queryset.order_by('-last_update') \
+                .values_list('last_update', flat=True).first()
+            if last_update is not None:
+                dates.append(last_update)
+        return max(dates) if dates else None
+
+    def get_etag(self, request, last_modified):
+        key = '|'.join((
+            last_modified.isoformat(),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            # private objects are filtered by user
+            str(request.user.pk or ''),
+        ))
+        return quote_etag(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return handler(request, *args, **kwargs)
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return handler(request, *args, **kwargs)
+
+        etag = self.get_etag(request, last_modified)
+        timestamp = calendar.timegm(last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -30,7 +30,7 @@ from __future__ import unicode_literals
 import os
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models import (CharField, Count, OuterRef, Prefetch, Q,
                               Subquery, Value, Count)
 from django.db.models.functions import Cast, Concat
@@ -737,6 +737,146 @@ class StudySample(models.Model):
         unique_together = (('study', 'sample'),)
 
 
+def biome_ancestors_resolver(using='default'):
+    """Returns a function that maps a biome_id to the ids of the biome
+    and all its ancestors in the hierarchy tree (nested set).
+    The tree is loaded once, it only has a few hundred nodes.
+    """
+    tree = list(
+        Biome._base_manager.using(using)
+        .values_list('biome_id', 'lft', 'rgt'))
+    nodes = {biome_id: (lft, rgt) for biome_id, lft, rgt in tree}
+    cache = {}
+
+    def resolve(biome_id):
+        if biome_id not in cache:
+            lft, rgt = nodes[biome_id]
+            cache[biome_id] = [
+                b_id for b_id, b_lft, b_rgt in tree
+                if b_lft <= lft and b_rgt >= rgt
+            ]
+        return cache[biome_id]
+
+    return resolve
+
+
+class SampleBiomeAncestorManager(models.Manager):
+
+    def refresh(self, samples=None, using='default', batch_size=1000):
+        """Rebuild the closure rows for the samples (all if None).
+        """
+        resolve = biome_ancestors_resolver(using)
+        queryset = Sample._base_manager.using(using) \
+            .filter(biome__isnull=False)
+        if samples is not None:
+            queryset = queryset.filter(pk__in=samples)
+        pairs = list(queryset.values_list('pk', 'biome_id'))
+        with transaction.atomic(using=using):
+            stale = self.using(using)
+            if samples is not None:
+                stale = stale.filter(sample__in=samples)
+            stale.delete()
+            self.using(using).bulk_create([
+                self.model(sample_id=sample_id, biome_id=ancestor_id)
+                for sample_id, biome_id in pairs
+                for ancestor_id in resolve(biome_id)
+            ], batch_size=batch_size)
+        return len(pairs)
+
+
+class SampleBiomeAncestor(models.Model):
+    """Closure of Sample -> Biome and all the biome ancestors.
+    Maintained by the import commands, see
+    SampleBiomeAncestorManager.refresh
+    """
+    sample = models.ForeignKey(
+        'Sample', db_column='SAMPLE_ID', on_delete=models.CASCADE,
+        related_name='biome_ancestors')
+    biome = models.ForeignKey(
+        'Biome', db_column='BIOME_ID', on_delete=models.CASCADE,
+        related_name='sample_descendants')
+
+    objects = SampleBiomeAncestorManager()
+
+    class Meta:
+        db_table = 'SAMPLE_BIOME_ANCESTOR'
+        unique_together = (('sample', 'biome'),)
+        index_together = (('biome', 'sample'),)
+
+
+class StudyBiomeAncestorManager(models.Manager):
+
+    def refresh(self, studies=None, using='default', batch_size=1000):
+        """Rebuild the closure rows for the studies (all if None).
+        direct is set for the biomes of the study samples.
+        """
+        resolve = biome_ancestors_resolver(using)
+        queryset = StudySample.objects.using(using) \
+            .filter(sample__biome__isnull=False)
+        if studies is not None:
+            queryset = queryset.filter(study__in=studies)
+        closure = {}
+        for study_id, biome_id in queryset \
+                .values_list('study_id', 'sample__biome_id').distinct():
+            for ancestor_id in resolve(biome_id):
+                key = (study_id, ancestor_id)
+                closure[key] = closure.get(key, False) or \
+                    ancestor_id == biome_id
+        with transaction.atomic(using=using):
+            stale = self.using(using)
+            if studies is not None:
+                stale = stale.filter(study__in=studies)
+            stale.delete()
+            self.using(using).bulk_create([
+                self.model(study_id=study_id, biome_id=biome_id,
+                           direct=direct)
+                for (study_id, biome_id), direct in closure.items()
+            ], batch_size=batch_size)
+        return len(closure)
+
+
+class StudyBiomeAncestor(models.Model):
+    """Closure of Study -> Biomes of its samples and their ancestors.
+    Maintained by the import commands, see
+    StudyBiomeAncestorManager.refresh
+    """
+    study = models.ForeignKey(
+        'Study', db_column='STUDY_ID', on_delete=models.CASCADE,
+        related_name='biome_ancestors')
+    biome = models.ForeignKey(
+        'Biome', db_column='BIOME_ID', on_delete=models.CASCADE,
+        related_name='study_descendants')
+    # the biome is assigned to one of the study samples
+    direct = models.BooleanField(
+        db_column='IS_DIRECT', default=False)
+
+    objects = StudyBiomeAncestorManager()
+
+    class Meta:
+        db_table = 'STUDY_BIOME_ANCESTOR'
+        unique_together = (('study', 'biome'),)
+        index_together = (('biome', 'study'),)
+
+
+def refresh_biome_ancestors(samples=None, studies=None, using='default'):
+    """Refresh the biome closure tables for the samples and their studies.
+    Everything is rebuilt if no samples or studies are provided.
+    """
+    if samples is None and studies is None:
+        SampleBiomeAncestor.objects.refresh(using=using)
+        StudyBiomeAncestor.objects.refresh(using=using)
+        return
+    studies = set(studies or [])
+    if samples is not None:
+        samples = list(samples)
+        SampleBiomeAncestor.objects.refresh(samples, using=using)
+        studies |= set(
+            StudySample.objects.using(using)
+            .filter(sample__in=samples)
+            .values_list('study_id', flat=True))
+    StudyBiomeAncestor.objects.refresh(list(studies), using=using)
+
+
 class SuperStudyQuerySet(BaseQuerySet):
     pass
 
@@ -16,23 +16,39 @@
 
 import collections
 
+from rest_framework_json_api import relations
 from rest_framework_json_api.relations import (
     SerializerMethodResourceRelatedField,
-    SerializerMethodHyperlinkedRelatedField,
-    ManySerializerMethodHyperlinkedRelatedField,
     SkipDataMixin,
 )
 from rest_framework_json_api.utils import get_resource_type_from_instance
 
+from .reverse import URLTemplateMixin
+
 from rest_framework_json_api.relations import LINKS_PARAMS
 LINKS_PARAMS.append('related_link_self_view_name')
 LINKS_PARAMS.append('related_link_self_lookup_field')
 LINKS_PARAMS.append('related_link_self_lookup_fields')
 
 
+class ManySerializerMethodResourceRelatedField(
+        URLTemplateMixin, relations.ManySerializerMethodResourceRelatedField):
+    pass
+
+
+class ManySerializerMethodHyperlinkedRelatedField(
+        URLTemplateMixin, relations.ManySerializerMethodHyperlinkedRelatedField):  # noqa
+    pass
+
+
+class SerializerMethodHyperlinkedRelatedField(
+        URLTemplateMixin, relations.SerializerMethodHyperlinkedRelatedField):
+    many_cls = ManySerializerMethodHyperlinkedRelatedField
+
 
+class HyperlinkedSerializerMethodResourceRelatedField(URLTemplateMixin, SerializerMethodResourceRelatedField):  # noqa
 
-class HyperlinkedSerializerMethodResourceRelatedField(SerializerMethodResourceRelatedField):  # noqa
+    many_cls = ManySerializerMethodResourceRelatedField
 
     related_link_self_view_name = None
     related_link_self_lookup_field = 'pk'
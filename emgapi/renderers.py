@@ -14,11 +14,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import math
-import json
 import csv
+import io
+import itertools
+import json
+import re
+
+from django.conf import settings
+from django.db.models import QuerySet
 
 from rest_framework import renderers
+from rest_framework import serializers
 # from rest_framework.compat import six
 from rest_framework_json_api.renderers import JSONRenderer
 from rest_framework_csv.renderers import CSVRenderer
@@ -27,18 +33,166 @@ from rest_framework.utils.serializer_helpers import ReturnDict
 
 from mongoengine.base.datastructures import BaseList
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# same output as json.dumps with the default arguments
+_json_encode = json.JSONEncoder().encode
+
+
+class NativeJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson, if installed.
+    The output is the same as rest_framework.renderers.JSONRenderer,
+    documents orjson would write differently (exponent floats,
+    indentation, ascii escaping, big integers or keys that are not
+    strings) are encoded with the json module.
+    """
+
+    # the strings of the orjson output
+    string_regex = re.compile(rb'"(?:[^"\\]|\\.)*"')
+    # numbers json writes with an exponent, orjson can write 1e-05 as
+    # 0.00001 and 1e+16 as 1e16 or 10000000000000000.0
+    exponent_regex = re.compile(
+        rb'(?:^|[:,\[])-?(?:0\.0000|[0-9]+(?:\.[0-9]+)?e|[0-9]{17,}\.)')
+
+    def has_exponent_numbers(self, content):
+        """True if the orjson output has numbers json would write with an
+        exponent (0 < abs(x) < 1e-4 or abs(x) >= 1e16), the strings are not
+        searched.
+        """
+        return self.exponent_regex.search(
+            self.string_regex.sub(b'""', content)) is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii \
+                or not self.compact:
+            return super(NativeJSONRenderer, self).render(
+                data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent is not None:
+            return super(NativeJSONRenderer, self).render(
+                data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        try:
+            # datetimes with a +00:00 offset end in Z, same as the encoder
+            ret = orjson.dumps(
+                data, default=encoder.default,
+                option=orjson.OPT_UTC_Z | orjson.OPT_PASSTHROUGH_DATACLASS)
+        except TypeError:
+            return super(NativeJSONRenderer, self).render(
+                data, accepted_media_type, renderer_context)
+
+        if self.has_exponent_numbers(ret):
+            return super(NativeJSONRenderer, self).render(
+                data, accepted_media_type, renderer_context)
+
+        # Same as rest_framework, \u2028 and \u2029 are escaped.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028') \
+            .replace(b'\xe2\x80\xa9', b'\\u2029')
 
-class DefaultJSONRenderer(JSONRenderer):
+
+class JSONAPIRenderer(JSONRenderer, NativeJSONRenderer):
+    """
+    rest_framework_json_api JSONRenderer encoding with NativeJSONRenderer.
+    The JSON:API document is built by rest_framework_json_api, the final
+    super().render() resolves to NativeJSONRenderer.
+    """
+    pass
+
+
+class DefaultJSONRenderer(JSONAPIRenderer):
     media_type = 'application/json'
     format = 'json'
 
 
-class JSONLDRenderer(renderers.JSONRenderer):
+class JSONLDRenderer(NativeJSONRenderer):
     media_type = 'application/ld+json'
     format = 'ldjson'
 
 
-class CSVStreamingRenderer(CSVRenderer):
+def queryset_chunks(queryset, chunk_size):
+    """Iterate over the queryset in lists of chunk_size objects.
+
+    Django querysets ordered by the primary key (or not ordered) are
+    walked with keyset chunks (pk > last pk), other orderings fetch the
+    ordered primary keys once and load the objects by pk chunks. Both
+    avoid OFFSET queries and keep the prefetch_related lookups. Other
+    iterables (mongoengine querysets and lists) are consumed in chunks.
+    """
+    if not isinstance(queryset, QuerySet):
+        iterator = iter(queryset)
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    pk_name = queryset.model._meta.pk.name
+    ordering = list(queryset.query.order_by)
+    if not ordering and queryset.query.default_ordering:
+        ordering = list(queryset.model._meta.ordering)
+
+    if not ordering or ordering in (['pk'], [pk_name]):
+        descending = False
+    elif ordering in (['-pk'], ['-' + pk_name]):
+        descending = True
+    else:
+        pks = queryset.values_list('pk', flat=True)
+        in_bulk = queryset.order_by()
+        pk_chunks = queryset_chunks(list(pks), chunk_size)
+        for pk_chunk in pk_chunks:
+            objects = {o.pk: o for o in in_bulk.filter(pk__in=pk_chunk)}
+            yield [objects[pk] for pk in pk_chunk if pk in objects]
+        return
+
+    lookup = 'pk__lt' if descending else 'pk__gt'
+    queryset = queryset.order_by('-pk' if descending else 'pk')
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        chunk = list(queryset.filter(**{lookup: chunk[-1].pk})[:chunk_size])
+
+
+class StreamingExportMixin(object):
+    """
+    Renderers of whole querysets, ListModelMixin.list() streams them.
+    The data is a dict with the queryset, the serializer class and the
+    serializer context, the queryset is serialized in chunks of
+    EMG_EXPORT_CHUNK_SIZE objects.
+    """
+
+    def get_chunk_size(self):
+        return settings.EMG_EXPORT_CHUNK_SIZE
+
+    def get_export(self, data):
+        """(queryset, serializer, context) of the data, None if the
+        data is not an export.
+        """
+        try:
+            return data['queryset'], data['serializer'], data['context']
+        except (KeyError, TypeError):
+            return None
+
+    def serialized_chunks(self, queryset, serializer, context):
+        for chunk in queryset_chunks(queryset, self.get_chunk_size()):
+            yield serializer(chunk, many=True, context=context).data
+
+
+class CSVStreamingRenderer(StreamingExportMixin, CSVRenderer):
     """
     Based on rest_framework_csv.renderers.CSVStreamingRenderer,
     tabilize() call is not iterator-friendly.
@@ -55,53 +209,230 @@ class CSVStreamingRenderer(CSVRenderer):
             yield csv_writer.writerow(flat_row)
             return
 
-        try:
-            queryset = data['queryset']
-            serializer = data['serializer']
-            context = data['context']
-        except KeyError:
+        export = self.get_export(data)
+        if export is None:
             return None
+        queryset, serializer, context = export
 
         if isinstance(queryset, BaseList):
             # Handle SortedListField in the AnnotationModels
-            # TODO: pending review as this has no pagination at the moment
             if not queryset:
                 return None
 
-            header_fields = list(serializer(queryset[0], context=context).fields)
-            yield csv_writer.writerow(header_fields)
-
-            for item in queryset:
-                items = serializer(item, context=context).data
-                ordered = [items[column] for column in header_fields]
-                yield csv_writer.writerow(self.flatten(ordered))
-            return
-
-        total = queryset.count()
-        page_size = 25
-
-        header_fields = list(serializer(queryset.first(),
-                             context=context).fields)
+        header_fields = list(serializer(context=context).fields)
         yield csv_writer.writerow(header_fields)
 
-        for page in range(0, math.ceil(total / page_size)):
-            for item in queryset[page * page_size:(page + 1) * page_size]:
-                items = serializer(item, context=context).data
-                ordered = [items[column] for column in header_fields]
-                yield csv_writer.writerow(self.flatten(ordered))
+        for rows in self.serialized_chunks(queryset, serializer, context):
+            buffer = io.StringIO()
+            chunk_writer = csv.writer(buffer)
+            chunk_writer.writerows(
+                self.flatten([row[column] for column in header_fields])
+                for row in rows
+            )
+            yield buffer.getvalue()
 
     def flatten(self, rowdata):
         """
         Flatten the data.
         Used to represent nested fields as json
         """
-        new_row = []
-        for elem in rowdata:
-            if type(elem) is list or type(elem) is tuple:
-                new_row.append(json.dumps(elem))
-            else:
-                new_row.append(elem)
-        return new_row
+        return [
+            _json_encode(elem) if type(elem) in (list, tuple) else elem
+            for elem in rowdata
+        ]
+
+
+class NDJSONRenderer(StreamingExportMixin, renderers.BaseRenderer):
+    """
+    Newline delimited JSON, one object per line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    json_renderer = NativeJSONRenderer()
+
+    def encode(self, row):
+        return self.json_renderer.render(row) + b'\n'
+
+    def render(self, data, media_type=None, renderer_context=None):
+        export = self.get_export(data)
+        if export is None:
+            if data is not None:
+                yield self.encode(data)
+            return
+        queryset, serializer, context = export
+
+        for rows in self.serialized_chunks(queryset, serializer, context):
+            yield b''.join(self.encode(row) for row in rows)
+
+
+class _ParquetSink(object):
+    """Write-only file for pyarrow, the written bytes are taken
+    with drain() as soon as a row group is complete.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self._buffer = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._buffer.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._buffer)
+        self._buffer = []
+        return data
+
+
+class ParquetRenderer(StreamingExportMixin, renderers.BaseRenderer):
+    """
+    Apache Parquet file, one row group per chunk (requires pyarrow).
+    The schema is built from the serializer fields: integer, float and
+    boolean fields keep their type, the other values are strings, JSON
+    encoded if they are not strings. A value that doesn't fit the type of
+    its column is an error.
+    """
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+    charset = None
+    render_style = 'binary'
+
+    def field_type(self, field):
+        """Parquet type of a serializer field"""
+        if isinstance(field, serializers.BooleanField):
+            return pyarrow.bool_()
+        if isinstance(field, serializers.IntegerField):
+            return pyarrow.int64()
+        if isinstance(field, serializers.FloatField):
+            return pyarrow.float64()
+        return pyarrow.string()
+
+    def value_type(self, value):
+        """Parquet type of a value, for the data without serializer"""
+        if isinstance(value, bool):
+            return pyarrow.bool_()
+        if isinstance(value, int):
+            return pyarrow.int64()
+        if isinstance(value, float):
+            return pyarrow.float64()
+        return pyarrow.string()
+
+    def get_schema(self, fields):
+        return pyarrow.schema([
+            pyarrow.field(name, self.field_type(field))
+            for name, field in fields.items()
+        ])
+
+    def to_array(self, values, field):
+        if pyarrow.types.is_string(field.type):
+            values = [
+                v if v is None or isinstance(v, str) else _json_encode(v)
+                for v in values
+            ]
+        try:
+            return pyarrow.array(values, type=field.type)
+        except (pyarrow.ArrowException, TypeError, ValueError) as e:
+            raise ValueError('Parquet column {} values are not {}: {}'.format(
+                field.name, field.type, e)) from e
+
+    def to_table(self, rows, schema):
+        arrays = [
+            self.to_array([row.get(field.name) for row in rows], field)
+            for field in schema
+        ]
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def render(self, data, media_type=None, renderer_context=None):
+        if pyarrow is None:
+            raise ImportError('pyarrow is required by ParquetRenderer')
+
+        export = self.get_export(data)
+        if export is None:
+            if not isinstance(data, dict):
+                return
+            chunks = [[data]]
+            schema = pyarrow.schema([
+                pyarrow.field(name, self.value_type(value))
+                for name, value in data.items()
+            ])
+        else:
+            queryset, serializer, context = export
+            chunks = self.serialized_chunks(queryset, serializer, context)
+            schema = self.get_schema(serializer(context=context).fields)
+
+        sink = _ParquetSink()
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        for rows in chunks:
+            if not rows:
+                continue
+            writer.write_table(self.to_table(rows, schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+
+class BIOMRenderer(NativeJSONRenderer):
+    """
+    BIOM 1.0 tables, JSON.
+    """
+    media_type = 'application/json'
+    format = 'biom'
+
+
+class BIOMTSVRenderer(renderers.BaseRenderer):
+    """
+    BIOM tables as TSV (as biom convert --to-tsv), a row per observation
+    and a column per sample followed by the observations metadata.
+    """
+    media_type = 'text/tab-separated-values'
+    format = 'tsv'
+    charset = 'utf-8'
+
+    def format_value(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, (list, tuple)):
+            return '; '.join(value)
+        return str(value)
+
+    def render(self, data, media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or 'rows' not in data:
+            # errors
+            return _json_encode(data) if data is not None else ''
+
+        rows = data['rows']
+        columns = [c['id'] for c in data['columns']]
+        metadata = list(rows[0]['metadata']) if rows else []
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter='\t', lineterminator='\n')
+        writer.writerow(['# Constructed from biom file'])
+        writer.writerow(['#OTU ID'] + columns + metadata)
+
+        data_iter = iter(data['data'])
+        entry = next(data_iter, None)
+        for i, row in enumerate(rows):
+            values = [0] * len(columns)
+            while entry is not None and entry[0] == i:
+                values[entry[1]] = entry[2]
+                entry = next(data_iter, None)
+            writer.writerow(
+                [row['id']] + values +
+                [self.format_value(row['metadata'].get(m)) for m in metadata])
+        return buffer.getvalue()
 
 
 class TSVRenderer(CSVRenderer):
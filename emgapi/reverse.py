@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""URL templates for the hyperlinked fields.
+
+Each view name is reversed once per host (and API version, format) with
+placeholder values, the absolute URL becomes a format string that is
+filled in with the lookup values of each object. Lookups that can't be
+templated (positional args, values with a path separator, url patterns
+the placeholders don't match) go through rest_framework reverse().
+"""
+
+from urllib.parse import quote
+
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.urls import NoReverseMatch, get_script_prefix
+from django.utils.http import RFC3986_SUBDELIMS
+
+from rest_framework.reverse import reverse as drf_reverse
+
+# same as django.urls.resolvers.URLResolver._reverse_with_prefix
+SAFE_CHARS = RFC3986_SUBDELIMS + '/~:@'
+
+# matches any of the lookup_value_regex of the views with digits only
+PLACEHOLDER = '7305{}1826491'
+
+MAX_TEMPLATES = 4096
+
+_templates = {}
+
+
+@receiver(setting_changed)
+def clear_url_templates(**kwargs):
+    if kwargs.get('setting', 'ROOT_URLCONF') == 'ROOT_URLCONF':
+        _templates.clear()
+
+
+def compile_template(viewname, names, request, format=None):
+    """Absolute URL of viewname as a format string with the kwargs names.
+    None if the view can't be reversed with placeholder values.
+    """
+    placeholders = {
+        name: PLACEHOLDER.format(i) for i, name in enumerate(names)}
+    try:
+        url = drf_reverse(viewname, kwargs=placeholders,
+                          request=request, format=format)
+    except NoReverseMatch:
+        return None
+    template = url.replace('{', '{{').replace('}', '}}')
+    for i, name in enumerate(names):
+        if url.count(placeholders[name]) != 1:
+            return None
+        template = template.replace(
+            placeholders[name], '{%d}' % i)
+    return template
+
+
+def _request_key(request):
+    key = getattr(request, '_url_templates_key', None)
+    if key is None:
+        key = (
+            request.scheme,
+            request.get_host(),
+            get_script_prefix(),
+            getattr(request, 'version', None),
+            request.GET.get('format'),
+        )
+        request._url_templates_key = key
+    return key
+
+
+def reverse(viewname, args=None, kwargs=None, request=None, format=None,
+            **extra):
+    """rest_framework.reverse.reverse using the URL templates.
+    """
+    if args or extra or not kwargs or request is None:
+        return drf_reverse(viewname, args=args, kwargs=kwargs,
+                           request=request, format=format, **extra)
+
+    names = tuple(sorted(kwargs))
+    values = []
+    for name in names:
+        value = str(kwargs[name])
+        if '/' in value or value in ('.', '..'):
+            return drf_reverse(viewname, kwargs=kwargs,
+                               request=request, format=format)
+        values.append(quote(value, safe=SAFE_CHARS))
+
+    key = (_request_key(request), viewname, names, format)
+    try:
+        template = _templates[key]
+    except KeyError:
+        template = compile_template(viewname, names, request, format)
+        if len(_templates) >= MAX_TEMPLATES:
+            _templates.clear()
+        _templates[key] = template
+
+    if template is None:
+        return drf_reverse(viewname, kwargs=kwargs,
+                           request=request, format=format)
+    return template.format(*values)
+
+
+class URLTemplateMixin(object):
+    """Hyperlinked fields mixin, links are built with the URL templates.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(URLTemplateMixin, self).__init__(*args, **kwargs)
+        self.reverse = reverse
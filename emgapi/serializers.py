@@ -23,11 +23,12 @@ from django.db.models import Q
 
 from rest_framework import serializers as drf_serializers
 
-from rest_framework_json_api import serializers, relations, utils
+from rest_framework_json_api import serializers, utils
 
 from . import models as emg_models
 from . import relations as emg_relations
 from . import fields as emg_fields
+from . import includes as emg_includes
 
 # TODO: add related_link_lookup_fields, a list
 from emgapianns import models as m_models
@@ -85,13 +86,13 @@ class BiomeSerializer(ExplicitFieldsModelSerializer,
 
     included_serializers = {}
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:biomes-detail',
         lookup_field='lineage',
     )
 
     # relationships
-    studies = relations.SerializerMethodHyperlinkedRelatedField(
+    studies = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_studies',
         model=emg_models.Biome,
         many=True,
@@ -104,7 +105,7 @@ class BiomeSerializer(ExplicitFieldsModelSerializer,
     def get_studies(self, obj):
         return None
 
-    samples = relations.SerializerMethodHyperlinkedRelatedField(
+    samples = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_samples',
         model=emg_models.Biome,
         many=True,
@@ -117,7 +118,7 @@ class BiomeSerializer(ExplicitFieldsModelSerializer,
     def get_samples(self, obj):
         return None
 
-    children = relations.SerializerMethodHyperlinkedRelatedField(
+    children = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_children',
         model=emg_models.Biome,
         many=True,
@@ -133,7 +134,7 @@ class BiomeSerializer(ExplicitFieldsModelSerializer,
     # counters
     samples_count = serializers.IntegerField()
 
-    genomes = relations.SerializerMethodHyperlinkedRelatedField(
+    genomes = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_genomes',
         model=emg_models.Genome,
         many=True,
@@ -175,13 +176,13 @@ class PublicationSerializer(ExplicitFieldsModelSerializer,
         'studies': 'emgapi.serializers.StudySerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:publications-detail',
         lookup_field='pubmed_id',
     )
 
     # relationships
-    studies = relations.SerializerMethodHyperlinkedRelatedField(
+    studies = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_studies',
         model=emg_models.Publication,
         many=True,
@@ -194,7 +195,7 @@ class PublicationSerializer(ExplicitFieldsModelSerializer,
     def get_studies(self, obj):
         return None
 
-    samples = relations.SerializerMethodHyperlinkedRelatedField(
+    samples = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_samples',
         model=emg_models.Publication,
         many=True,
@@ -288,12 +289,12 @@ class PipelineSerializer(ExplicitFieldsModelSerializer,
         'tools': 'emgapi.serializers.PipelineToolSerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:pipelines-detail',
         lookup_field='release_version',
     )
 
-    samples = relations.SerializerMethodHyperlinkedRelatedField(
+    samples = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_samples',
         model=emg_models.Sample,
         many=True,
@@ -306,7 +307,7 @@ class PipelineSerializer(ExplicitFieldsModelSerializer,
     def get_samples(self, obj):
         return None
 
-    analyses = relations.SerializerMethodHyperlinkedRelatedField(
+    analyses = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_analyses',
         model=emg_models.AnalysisJob,
         many=True,
@@ -350,13 +351,13 @@ class ExperimentTypeSerializer(ExplicitFieldsModelSerializer,
 
     included_serializers = {}
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:experiment-types-detail',
         lookup_field='experiment_type',
     )
 
     # relationships
-    samples = relations.SerializerMethodHyperlinkedRelatedField(
+    samples = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_samples',
         model=emg_models.Sample,
         many=True,
@@ -369,7 +370,7 @@ class ExperimentTypeSerializer(ExplicitFieldsModelSerializer,
     def get_samples(self, obj):
         return None
 
-    runs = relations.SerializerMethodHyperlinkedRelatedField(
+    runs = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_runs',
         model=emg_models.Run,
         many=True,
@@ -382,7 +383,7 @@ class ExperimentTypeSerializer(ExplicitFieldsModelSerializer,
     def get_runs(self, obj):
         return None
 
-    analyses = relations.SerializerMethodHyperlinkedRelatedField(
+    analyses = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_analyses',
         model=emg_models.AnalysisJob,
         many=True,
@@ -415,7 +416,7 @@ class RunSerializer(ExplicitFieldsModelSerializer,
         'assemblies': 'emgapi.serializers.AssemblySerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:runs-detail',
         lookup_field='accession'
     )
@@ -429,13 +430,13 @@ class RunSerializer(ExplicitFieldsModelSerializer,
         return None
 
     # relationships
-    sample = serializers.HyperlinkedRelatedField(
+    sample = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:samples-detail',
         lookup_field='accession'
     )
 
-    study = serializers.HyperlinkedRelatedField(
+    study = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:studies-detail',
         lookup_field='accession'
@@ -454,7 +455,12 @@ class RunSerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_assemblies(self, obj):
-        return obj.assemblies.available(self.context['request'])
+        return emg_includes.resolve(
+            self, 'assemblies', obj,
+            lambda pks: emg_models.AssemblyRun.objects
+            .filter(run__in=pks).values_list('run_id', 'assembly_id'),
+            emg_models.Assembly.objects.available(self.context['request'])
+        )
 
     pipelines = emg_relations.HyperlinkedSerializerMethodResourceRelatedField(
         many=True,
@@ -466,9 +472,12 @@ class RunSerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_pipelines(self, obj):
-        # TODO: push that to manager
-        return emg_models.Pipeline.objects \
-            .filter(analyses__run=obj)
+        return emg_includes.resolve(
+            self, 'pipelines', obj,
+            lambda pks: emg_models.AnalysisJob._base_manager
+            .filter(run__in=pks).values_list('run_id', 'pipeline_id'),
+            emg_models.Pipeline.objects.all()
+        )
 
     analyses = emg_relations.HyperlinkedSerializerMethodResourceRelatedFieldWithoutData(
         many=True,
@@ -497,7 +506,7 @@ class AssemblySerializer(ExplicitFieldsModelSerializer,
         'run': 'emgapi.serializers.RunSerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:assemblies-detail',
         lookup_field='accession'
     )
@@ -521,7 +530,12 @@ class AssemblySerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_runs(self, obj):
-        return obj.runs.available(self.context['request'])
+        return emg_includes.resolve(
+            self, 'runs', obj,
+            lambda pks: emg_models.AssemblyRun.objects
+            .filter(assembly__in=pks).values_list('assembly_id', 'run_id'),
+            emg_models.Run.objects.available(self.context['request'])
+        )
 
     samples = emg_relations.HyperlinkedSerializerMethodResourceRelatedField(
         many=True,
@@ -533,7 +547,12 @@ class AssemblySerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_samples(self, obj):
-        return obj.samples.available(self.context['request'])
+        return emg_includes.resolve(
+            self, 'samples', obj,
+            lambda pks: emg_models.AssemblySample.objects
+            .filter(assembly__in=pks).values_list('assembly_id', 'sample_id'),
+            emg_models.Sample.objects.available(self.context['request'])
+        )
 
     analyses = emg_relations.HyperlinkedSerializerMethodResourceRelatedField(
         many=True,
@@ -555,9 +574,13 @@ class AssemblySerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_pipelines(self, obj):
-        # TODO: push that to queryset
-        return emg_models.Pipeline.objects \
-            .filter(analyses__assembly=obj)
+        return emg_includes.resolve(
+            self, 'pipelines', obj,
+            lambda pks: emg_models.AnalysisJob._base_manager
+            .filter(assembly__in=pks)
+            .values_list('assembly_id', 'pipeline_id'),
+            emg_models.Pipeline.objects.all()
+        )
 
     def get_analyses(self, obj):
         return None
@@ -631,7 +654,7 @@ class BaseDownloadSerializer(ExplicitFieldsModelSerializer,
 
 
 class BasePipelineDownloadSerializer(BaseDownloadSerializer):
-    pipeline = serializers.HyperlinkedRelatedField(
+    pipeline = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:pipelines-detail',
         lookup_field='release_version'
@@ -689,7 +712,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
         'downloads': 'emgapi.serializers.AnalysisJobDownloadSerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:analyses-detail',
         lookup_field='accession'
     )
@@ -716,13 +739,13 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
 
     # relationships
 
-    sample = serializers.HyperlinkedRelatedField(
+    sample = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:samples-detail',
         lookup_field='accession'
     )
 
-    study = serializers.HyperlinkedRelatedField(
+    study = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:studies-detail',
         lookup_field='accession'
@@ -743,7 +766,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
             return obj.downloads
         return None
 
-    taxonomy = relations.SerializerMethodHyperlinkedRelatedField(
+    taxonomy = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_taxonomy',
         model=m_models.Organism,
         many=True,
@@ -756,7 +779,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_taxonomy(self, obj):
         return None
 
-    taxonomy_lsu = relations.SerializerMethodHyperlinkedRelatedField(
+    taxonomy_lsu = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_taxonomy_lsu',
         model=m_models.Organism,
         many=True,
@@ -769,7 +792,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_taxonomy_lsu(self, obj):
         return None
 
-    taxonomy_ssu = relations.SerializerMethodHyperlinkedRelatedField(
+    taxonomy_ssu = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_taxonomy_ssu',
         model=m_models.Organism,
         many=True,
@@ -782,7 +805,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_taxonomy_ssu(self, obj):
         return None
 
-    taxonomy_itsonedb = relations.SerializerMethodHyperlinkedRelatedField(
+    taxonomy_itsonedb = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_taxonomy_itsonedb',
         model=m_models.Organism,
         many=True,
@@ -795,7 +818,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_taxonomy_itsonedb(self, obj):
         return None
 
-    taxonomy_itsunite = relations.SerializerMethodHyperlinkedRelatedField(
+    taxonomy_itsunite = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_taxonomy_unite',
         model=m_models.Organism,
         many=True,
@@ -811,7 +834,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_taxonomy_unite(self, obj):
         return None
 
-    go_terms = relations.SerializerMethodHyperlinkedRelatedField(
+    go_terms = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_goterms',
         model=m_models.GoTerm,
         many=True,
@@ -824,7 +847,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_go_terms(self, obj):
         return None
 
-    go_slim = relations.SerializerMethodHyperlinkedRelatedField(
+    go_slim = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_goslim',
         model=m_models.GoTerm,
         many=True,
@@ -837,7 +860,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_go_slim(self, obj):
         return None
 
-    interpro_identifiers = relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
+    interpro_identifiers = emg_relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
         source='get_interproidentifier',
         model=m_models.InterproIdentifier,
         many=True,
@@ -850,7 +873,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_interpro_identifiers(self, obj):
         return None
 
-    antismash_gene_clusters = relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
+    antismash_gene_clusters = emg_relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
         source='get_antismashgeneclusters',
         model=m_models.AntiSmashGeneCluster,
         many=True,
@@ -863,7 +886,7 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
     def get_antismash_gene_clusters(self, obj):
         return None
 
-    genome_properties = relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
+    genome_properties = emg_relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
         source='get_genomeproperties',
         model=m_models.GenomeProperty,
         many=True,
@@ -895,13 +918,13 @@ class BaseAnalysisSerializer(ExplicitFieldsModelSerializer,
 
 class AnalysisSerializer(BaseAnalysisSerializer):
 
-    run = serializers.HyperlinkedRelatedField(
+    run = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:runs-detail',
         lookup_field='accession'
     )
 
-    assembly = serializers.HyperlinkedRelatedField(
+    assembly = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:assemblies-detail',
         lookup_field='accession',
@@ -958,7 +981,7 @@ class BaseMetadataSerializer(ExplicitFieldsModelSerializer,
 class SampleAnnSerializer(BaseMetadataSerializer):
 
     # attributes
-    sample = serializers.HyperlinkedRelatedField(
+    sample = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:samples-detail',
         lookup_field='accession'
@@ -984,7 +1007,7 @@ class SampleSerializer(ExplicitFieldsModelSerializer,
         'analyses': 'emgapi.serializers.AnalysisSerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:samples-detail',
         lookup_field='accession'
     )
@@ -999,7 +1022,7 @@ class SampleSerializer(ExplicitFieldsModelSerializer,
     sample_metadata = serializers.ListField()
 
     # relationships
-    biome = serializers.HyperlinkedRelatedField(
+    biome = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:biomes-detail',
         lookup_field='lineage',
@@ -1019,9 +1042,14 @@ class SampleSerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_studies(self, obj):
-        return obj.studies.available(self.context['request'])
+        return emg_includes.resolve(
+            self, 'studies', obj,
+            lambda pks: emg_models.StudySample.objects
+            .filter(sample__in=pks).values_list('sample_id', 'study_id'),
+            emg_models.Study.objects.available(self.context['request'])
+        )
 
-    runs = relations.SerializerMethodHyperlinkedRelatedField(
+    runs = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_runs',
         model=emg_models.Run,
         many=True,
@@ -1086,7 +1114,7 @@ class SuperStudySerializer(ExplicitFieldsModelSerializer,
         'flagship-studies': 'emgapi.serializers.StudySerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:super-studies-detail',
         lookup_field='super_study_id',
     )
@@ -1161,7 +1189,7 @@ class StudySerializer(ExplicitFieldsModelSerializer,
         'downloads': 'emgapi.serializers.StudyDownloadSerializer',
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:studies-detail',
         lookup_field='accession',
     )
@@ -1190,11 +1218,15 @@ class StudySerializer(ExplicitFieldsModelSerializer,
     )
 
     def get_biomes(self, obj):
-        biomes = obj.samples \
-            .available(self.context['request']) \
-            .values('biome_id').distinct()
-        return emg_models.Biome.objects \
-            .filter(pk__in=biomes)
+        samples = emg_models.Sample.objects \
+            .available(self.context['request']).values('pk')
+        return emg_includes.resolve(
+            self, 'biomes', obj,
+            lambda pks: emg_models.StudySample.objects
+            .filter(study__in=pks, sample__in=samples)
+            .values_list('study_id', 'sample__biome_id').distinct(),
+            emg_models.Biome.objects.all()
+        )
 
     publications = emg_relations.HyperlinkedSerializerMethodResourceRelatedField(
         source='get_publications',
@@ -1208,10 +1240,15 @@ class StudySerializer(ExplicitFieldsModelSerializer,
 
     def get_publications(self, obj):
         if 'publications' in utils.get_included_resources(self.context['request']):
-            return obj.publications.all()
+            return emg_includes.resolve(
+                self, 'publications', obj,
+                lambda pks: emg_models.StudyPublication.objects
+                .filter(study__in=pks).values_list('study_id', 'pub_id'),
+                emg_models.Publication.objects.all()
+            )
         return None
 
-    downloads = relations.SerializerMethodHyperlinkedRelatedField(
+    downloads = emg_relations.SerializerMethodHyperlinkedRelatedField(
         many=True,
         read_only=True,
         source='get_downloads',
@@ -1224,7 +1261,7 @@ class StudySerializer(ExplicitFieldsModelSerializer,
     def get_downloads(self, obj):
         return None
 
-    samples = relations.SerializerMethodHyperlinkedRelatedField(
+    samples = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_samples',
         model=emg_models.Sample,
         many=True,
@@ -1250,7 +1287,7 @@ class StudySerializer(ExplicitFieldsModelSerializer,
     def get_analyses(self, obj):
         return None
 
-    geocoordinates = relations.SerializerMethodHyperlinkedRelatedField(
+    geocoordinates = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_geocoordinates',
         model=emg_models.SampleGeoCoordinate,
         many=True,
@@ -1466,12 +1503,12 @@ class GenomeSerializer(ExplicitFieldsModelSerializer):
     included_serializers = {
         'download': 'emgapi.serializers.GenomeDownloadSerializer',
     }
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:genomes-detail',
         lookup_field='accession',
     )
 
-    downloads = relations.SerializerMethodHyperlinkedRelatedField(
+    downloads = emg_relations.SerializerMethodHyperlinkedRelatedField(
         many=True,
         read_only=True,
         source='get_downloads',
@@ -1484,7 +1521,7 @@ class GenomeSerializer(ExplicitFieldsModelSerializer):
     def get_downloads(self, obj):
         return None
 
-    kegg_class_matches = relations.SerializerMethodHyperlinkedRelatedField(
+    kegg_class_matches = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_kegg_class_matches',
         model=emg_models.KeggClass,
         many=True,
@@ -1497,7 +1534,7 @@ class GenomeSerializer(ExplicitFieldsModelSerializer):
     def get_kegg_class_matches(self, obj):
         return None
 
-    kegg_modules_matches = relations.SerializerMethodHyperlinkedRelatedField(
+    kegg_modules_matches = emg_relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
         source='get_kegg_module_matches',
         model=emg_models.KeggModule,
         many=True,
@@ -1510,7 +1547,7 @@ class GenomeSerializer(ExplicitFieldsModelSerializer):
     def get_kegg_modules_matches(self, obj):
         return None
 
-    cog_matches = relations.SerializerMethodHyperlinkedRelatedField(
+    cog_matches = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_cog_matches',
         model=emg_models.CogCat,
         many=True,
@@ -1523,7 +1560,7 @@ class GenomeSerializer(ExplicitFieldsModelSerializer):
     def get_cog_matches(self, obj):
         return None
 
-    antismash_geneclusters = relations.SerializerMethodHyperlinkedRelatedField(
+    antismash_geneclusters = emg_relations.SerializerMethodHyperlinkedRelatedField(  # NOQA
         source='get_antismash_geneclusters',
         model=emg_models.AntiSmashGC,
         many=True,
@@ -1549,7 +1586,7 @@ class GenomeSerializer(ExplicitFieldsModelSerializer):
     def get_releases(self, obj):
         return obj.releases.all()
 
-    biome = serializers.HyperlinkedRelatedField(
+    biome = emg_fields.HyperlinkedRelatedField(
         read_only=True,
         view_name='emgapi_v1:biomes-detail',
         lookup_field='lineage',
@@ -1614,12 +1651,12 @@ class ReleaseSerializer(ExplicitFieldsModelSerializer,
         'download': 'emgapi.serializers.ReleaseDownloadSerializer'
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:release-detail',
         lookup_field='version',
     )
 
-    genomes = relations.SerializerMethodHyperlinkedRelatedField(
+    genomes = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_genomes',
         model=emg_models.Genome,
         many=True,
@@ -1635,7 +1672,7 @@ class ReleaseSerializer(ExplicitFieldsModelSerializer,
     # counters
     genome_count = serializers.IntegerField()
 
-    downloads = relations.SerializerMethodHyperlinkedRelatedField(
+    downloads = emg_relations.SerializerMethodHyperlinkedRelatedField(
         many=True,
         read_only=True,
         source='get_downloads',
@@ -1667,12 +1704,12 @@ class GenomeSetSerializer(ExplicitFieldsModelSerializer,
         'genomes': 'emgapi.serializers.GenomeSerializer'
     }
 
-    url = serializers.HyperlinkedIdentityField(
+    url = emg_fields.HyperlinkedIdentityField(
         view_name='emgapi_v1:genomeset-detail',
         lookup_field='name',
     )
 
-    genomes = relations.SerializerMethodHyperlinkedRelatedField(
+    genomes = emg_relations.SerializerMethodHyperlinkedRelatedField(
         source='get_genomes',
         model=emg_models.Genome,
         many=True,
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from emgcli import cache as response_cache
+
+from . import models as emg_models
+
+# cached responses tags of the models
+MODEL_TAGS = {
+    emg_models.Study: lambda study: response_cache.study_tags(study) +
+    [response_cache.collection_tag('studies')],
+    emg_models.Sample: response_cache.sample_tags,
+    emg_models.Run: response_cache.run_tags,
+    emg_models.Assembly: response_cache.assembly_tags,
+    emg_models.AnalysisJob: response_cache.analysis_tags,
+    emg_models.Genome: response_cache.genome_tags,
+}
+
+
+def purge_response_cache(sender, instance, **kwargs):
+    """Purge the cached responses of a saved or deleted object (i.e. in the
+    admin) once the transaction is committed.
+    The bulk updates of the import commands don't send signals, the
+    commands purge the tags themselves.
+    """
+    if not response_cache.is_enabled():
+        return
+    try:
+        tags = MODEL_TAGS[sender](instance)
+    except ObjectDoesNotExist:
+        # related objects deleted with it
+        tags = [getattr(instance, 'accession', None)]
+    using = kwargs.get('using')
+    transaction.on_commit(lambda: response_cache.purge(*tags), using=using)
+
+
+def connect():
+    for model in MODEL_TAGS:
+        post_save.connect(purge_response_cache, sender=model,
+                          dispatch_uid='purge_response_cache')
+        post_delete.connect(purge_response_cache, sender=model,
+                            dispatch_uid='purge_response_cache')
@@ -18,7 +18,6 @@ import os
 import logging
 import inflection
 import csv
-import math
 
 import requests
 
@@ -45,6 +44,8 @@ from . import mixins as emg_mixins
 from . import permissions as emg_perms
 from . import viewsets as emg_viewsets
 from . import utils as emg_utils
+from . import ebisearch as emg_ebisearch
+from . import bundles as emg_bundles
 from . import renderers as emg_renderers
 from . import filters as emg_filters
 
@@ -167,6 +168,9 @@ class MyDataViewSet(emg_mixins.ListModelMixin,
         emg_perms.IsSelf,
     )
 
+    # private data, always read from the primary database
+    use_primary_db = True
+
     filter_backends = (
         filters.SearchFilter,
         filters.OrderingFilter,
@@ -294,7 +298,8 @@ class BiomeViewSet(mixins.RetrieveModelMixin,
         return Response(serializer.data)
 
 
-class StudyViewSet(mixins.RetrieveModelMixin,
+class StudyViewSet(emg_mixins.LastUpdateConditionalMixin,
+                   mixins.RetrieveModelMixin,
                    emg_mixins.ListModelMixin,
                    emg_viewsets.BaseStudyGenericViewSet):
     lookup_field = 'accession'
@@ -326,6 +331,13 @@ class StudyViewSet(mixins.RetrieveModelMixin,
             *emg_utils.study_accession_query(self.kwargs['accession'])
         )
 
+    def get_last_update_querysets(self):
+        study = emg_models.Study.objects.available(self.request) \
+            .filter(*emg_utils.study_accession_query(self.kwargs['accession']))
+        samples = emg_models.Sample.objects \
+            .filter(studies__in=study.values('pk'))
+        return [study, samples]
+
     def get_serializer_class(self):
         f = self.request.GET.get('format', None)
         if f in ('ldjson',):
@@ -370,7 +382,8 @@ class StudyViewSet(mixins.RetrieveModelMixin,
         `/studies/ERP009004?include=samples,biomes,publications`
         with samples, biomes and publications
         """
-        return super(StudyViewSet, self).retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            super(StudyViewSet, self).retrieve, request, *args, **kwargs)
 
     @action(
         detail=False,
@@ -409,7 +422,8 @@ class StudyViewSet(mixins.RetrieveModelMixin,
         """
 
         obj = self.get_object()
-        biomes = obj.samples.values('biome_id').distinct()
+        biomes = emg_models.StudyBiomeAncestor.objects \
+            .filter(study=obj, direct=True).values('biome')
         queryset = emg_models.Biome.objects \
             .filter(pk__in=biomes)
         page = self.paginate_queryset(queryset)
@@ -457,6 +471,59 @@ class StudiesDownloadsViewSet(emg_mixins.ListModelMixin,
         return super(StudiesDownloadsViewSet, self) \
             .list(request, *args, **kwargs)
 
+    @action(detail=False, methods=['get'], url_path='bundle',
+            url_name='bundle')
+    def bundle(self, request, accession, *args, **kwargs):
+        """
+        Streams an archive of the study and analyses download files,
+        with a manifest of their checksums
+        Example:
+        ---
+        `/studies/ERP009004/downloads/bundle` tar archive
+
+        `/studies/ERP009004/downloads/bundle?archive=zip` zip archive
+
+        Filter by:
+        ---
+        `/studies/ERP009004/downloads/bundle?pipeline=4.1`
+
+        `/studies/ERP009004/downloads/bundle?group_type=Taxonomic%20analysis`
+
+        Tar archives can be resumed with range requests.
+        """
+        bundle_classes = {
+            'tar': emg_bundles.TarBundle,
+            'zip': emg_bundles.ZipBundle,
+        }
+        archive = request.GET.get('archive', 'tar')
+        if archive not in bundle_classes:
+            return HttpResponseBadRequest(
+                content="archive must be tar or zip.",
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        study = get_object_or_404(
+            emg_models.Study.objects.available(request),
+            *emg_utils.study_accession_query(accession)
+        )
+        study_downloads = emg_models.StudyDownload.objects \
+            .available(request).filter(study=study)
+        analysis_downloads = emg_models.AnalysisJobDownload.objects \
+            .available(request).filter(job__study=study)
+        filters = {}
+        if request.GET.get('pipeline'):
+            filters['pipeline__release_version'] = request.GET['pipeline']
+        if request.GET.get('group_type'):
+            filters['group_type__group_type'] = request.GET['group_type']
+        study_downloads = study_downloads.filter(**filters)
+        analysis_downloads = analysis_downloads.filter(**filters)
+
+        files = emg_bundles.bundle_files(
+            study, study_downloads, analysis_downloads)
+        bundle = bundle_classes[archive](
+            files, '{}/manifest.tsv'.format(study.accession))
+        return emg_bundles.bundle_response(request, bundle, study.accession)
+
 
 class SuperStudyViewSet(mixins.RetrieveModelMixin,
                         emg_mixins.ListModelMixin,
@@ -541,7 +608,8 @@ class SuperStudyViewSet(mixins.RetrieveModelMixin,
         return Response(serializer.data)
 
 
-class SampleViewSet(mixins.RetrieveModelMixin,
+class SampleViewSet(emg_mixins.LastUpdateConditionalMixin,
+                    mixins.RetrieveModelMixin,
                     emg_mixins.ListModelMixin,
                     emg_viewsets.BaseSampleGenericViewSet):
     lookup_field = 'accession'
@@ -568,6 +636,14 @@ class SampleViewSet(mixins.RetrieveModelMixin,
             Q(primary_accession=self.kwargs['accession'])
         )
 
+    def get_last_update_querysets(self):
+        sample = emg_models.Sample.objects.available(self.request) \
+            .filter(Q(accession=self.kwargs['accession']) |
+                    Q(primary_accession=self.kwargs['accession']))
+        studies = emg_models.Study.objects \
+            .filter(samples__in=sample.values('pk'))
+        return [sample, studies]
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return emg_serializers.RetrieveSampleSerializer
@@ -580,7 +656,8 @@ class SampleViewSet(mixins.RetrieveModelMixin,
         ---
         `/samples/ERS1015417`
         """
-        return super(SampleViewSet, self).retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            super(SampleViewSet, self).retrieve, request, *args, **kwargs)
 
     def list(self, request, *args, **kwargs):
         """
@@ -1165,7 +1242,8 @@ class PublicationViewSet(mixins.RetrieveModelMixin,
         return super(PublicationViewSet, self).list(request, *args, **kwargs)
 
 
-class GenomeViewSet(mixins.RetrieveModelMixin,
+class GenomeViewSet(emg_mixins.LastUpdateConditionalMixin,
+                    mixins.RetrieveModelMixin,
                     emg_mixins.ListModelMixin,
                     viewsets.GenericViewSet):
     
@@ -1206,6 +1284,14 @@ class GenomeViewSet(mixins.RetrieveModelMixin,
         .prefetch_related('releases') \
         .select_related('biome', 'geo_origin')
 
+    def get_last_update_querysets(self):
+        return [emg_models.Genome.objects.filter(
+            accession=self.kwargs[self.lookup_field])]
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super(GenomeViewSet, self).retrieve, request, *args, **kwargs)
+
 
 class GenomeDownloadViewSet(emg_mixins.ListModelMixin,
                             viewsets.GenericViewSet):
@@ -1488,7 +1574,6 @@ class EBISearchCSVDownload(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         total = int(request.GET.get("total"))
-        total_pages = math.ceil(total / page_size)
         fields = request.GET.get("fields", "").split(",")
         base = settings.EBI_SEARCH_URL + domain
 
@@ -1505,22 +1590,10 @@ class EBISearchCSVDownload(APIView):
         def get_data():
             # header
             yield fields
-            for page in range(total_pages + 1):
-                query["size"] = page_size
-                start = page * page_size
-                if start >= total:
-                    return
-                query["start"] = start
-                response = requests.get(base, params=query)
-                if not response.ok:
-                    raise Exception("There was an error downloading the data from EBI Search" +
-                                    "Status Code: " + str(response.status_code) +
-                                    " Content: " +
-                                    response.content)
-                else:
-                    data = response.json()
-                    for entry in data.get("entries"):
-                        yield emg_utils.parse_ebi_search_entry(entry, fields)
+            entries = emg_ebisearch.iter_entries(
+                base, query, total, page_size=page_size)
+            for entry in entries:
+                yield emg_utils.parse_ebi_search_entry(entry, fields)
 
         stream_res = StreamingHttpResponse((csv_writer.writerow(row) for row in get_data()),
                                            content_type="text/csv")
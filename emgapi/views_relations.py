@@ -41,11 +41,11 @@ class BiomeStudyRelationshipViewSet(emg_mixins.ListModelMixin,
     def get_queryset(self):
         lineage = self.kwargs[self.lookup_field]
         obj = get_object_or_404(emg_models.Biome, lineage=lineage)
+        studies = emg_models.StudyBiomeAncestor.objects \
+            .filter(biome=obj).values('study')
         queryset = emg_models.Study.objects \
             .available(self.request) \
-            .filter(samples__biome__lft__gte=obj.lft,
-                    samples__biome__rgt__lte=obj.rgt,
-                    samples__biome__depth__gte=obj.depth)
+            .filter(pk__in=studies)
         if 'samples' in self.request.GET.get('include', '').split(','):
             _qs = emg_models.Sample.objects \
                 .available(self.request, prefetch=True)
@@ -174,10 +174,18 @@ class StudyStudyRelationshipViewSet(emg_mixins.ListModelMixin,
             .list(request, *args, **kwargs)
 
 
-class StudySampleRelationshipViewSet(emg_mixins.ListModelMixin,
+class StudySampleRelationshipViewSet(emg_mixins.LastUpdateConditionalMixin,
+                                     emg_mixins.ListModelMixin,
                                      emg_viewsets.BaseSampleGenericViewSet):
     lookup_field = 'accession'
 
+    def get_last_update_querysets(self):
+        study = emg_models.Study.objects.filter(
+            *emg_utils.study_accession_query(self.kwargs['accession']))
+        samples = emg_models.Sample.objects.available(self.request) \
+            .filter(studies__in=study.values('pk'))
+        return [study, samples]
+
     def get_queryset(self):
         study = get_object_or_404(
             emg_models.Study,
@@ -211,8 +219,9 @@ class StudySampleRelationshipViewSet(emg_mixins.ListModelMixin,
         `/studies/ERP009004/samples?geo_loc_name=Alberta` filtered by
         localtion
         """
-        return super(StudySampleRelationshipViewSet, self) \
-            .list(request, *args, **kwargs)
+        return self.conditional_response(
+            super(StudySampleRelationshipViewSet, self).list,
+            request, *args, **kwargs)
 
 
 class StudyPublicationRelationshipViewSet(emg_mixins.ListModelMixin,
@@ -622,10 +631,11 @@ class BiomeSampleRelationshipViewSet(emg_mixins.ListModelMixin,
     def get_queryset(self):
         lineage = self.kwargs[self.lookup_field]
         obj = get_object_or_404(emg_models.Biome, lineage=lineage)
+        samples = emg_models.SampleBiomeAncestor.objects \
+            .filter(biome=obj).values('sample')
         queryset = emg_models.Sample.objects \
             .available(self.request, prefetch=True) \
-            .filter(biome__lft__gte=obj.lft, biome__rgt__lte=obj.rgt,
-                    biome__depth__gte=obj.depth)
+            .filter(pk__in=samples)
         if 'runs' in self.request.GET.get('include', '').split(','):
             _qs = emg_models.Run.objects.available(self.request)
             queryset = queryset.prefetch_related(
@@ -775,10 +785,18 @@ class SampleRunRelationshipViewSet(emg_mixins.ListModelMixin,
             .list(request, *args, **kwargs)
 
 
-class SampleStudiesRelationshipViewSet(emg_mixins.ListModelMixin,
+class SampleStudiesRelationshipViewSet(emg_mixins.LastUpdateConditionalMixin,
+                                       emg_mixins.ListModelMixin,
                                        emg_viewsets.BaseStudyGenericViewSet):
     lookup_field = 'accession'
 
+    def get_last_update_querysets(self):
+        sample = emg_models.Sample.objects.filter(
+            accession=self.kwargs[self.lookup_field])
+        studies = emg_models.Study.objects.available(self.request) \
+            .filter(samples__in=sample.values('pk'))
+        return [sample, studies]
+
     def get_queryset(self):
         sample = get_object_or_404(
             emg_models.Sample,
@@ -799,8 +817,9 @@ class SampleStudiesRelationshipViewSet(emg_mixins.ListModelMixin,
         ---
         `/sample/ERS1015417/studies`
         """
-        return super(SampleStudiesRelationshipViewSet, self) \
-            .list(request, *args, **kwargs)
+        return self.conditional_response(
+            super(SampleStudiesRelationshipViewSet, self).list,
+            request, *args, **kwargs)
 
 
 class BiomeTreeViewSet(mixins.ListModelMixin,
@@ -1016,7 +1035,23 @@ class AssemblyAnalysisViewSet(emg_mixins.ListModelMixin,
             .list(request, *args, **kwargs)
 
 
-class GenomeCogsRelationshipsViewSet(emg_mixins.ListModelMixin,
+class GenomeRelationshipConditionalMixin(emg_mixins.LastUpdateConditionalMixin):
+    """Genome annotations are uploaded with the genome, its last_update
+    is the validator of the relationship.
+    """
+
+    def get_last_update_querysets(self):
+        return [emg_models.Genome.objects.filter(
+            accession=self.kwargs['accession'])]
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super(GenomeRelationshipConditionalMixin, self).list,
+            request, *args, **kwargs)
+
+
+class GenomeCogsRelationshipsViewSet(GenomeRelationshipConditionalMixin,
+                                     emg_mixins.ListModelMixin,
                                      viewsets.GenericViewSet):
     serializer_class = emg_serializers.CogCountSerializer
 
@@ -1047,7 +1082,8 @@ class GenomeCogsRelationshipsViewSet(emg_mixins.ListModelMixin,
         return queryset
 
 
-class GenomeKeggClassRelationshipsViewSet(emg_mixins.ListModelMixin,
+class GenomeKeggClassRelationshipsViewSet(GenomeRelationshipConditionalMixin,
+                                          emg_mixins.ListModelMixin,
                                           viewsets.GenericViewSet):
     serializer_class = emg_serializers.KeggClassMatchSerializer
 
@@ -1083,7 +1119,8 @@ class GenomeKeggClassRelationshipsViewSet(emg_mixins.ListModelMixin,
         return queryset
 
 
-class GenomeKeggModuleRelationshipsViewSet(emg_mixins.ListModelMixin,
+class GenomeKeggModuleRelationshipsViewSet(GenomeRelationshipConditionalMixin,
+                                           emg_mixins.ListModelMixin,
                                            viewsets.GenericViewSet):
     serializer_class = emg_serializers.KeggModuleMatchSerializer
 
@@ -1119,7 +1156,8 @@ class GenomeKeggModuleRelationshipsViewSet(emg_mixins.ListModelMixin,
         return queryset
 
 
-class GenomeAntiSmashGeneClustersRelationshipsViewSet(emg_mixins.ListModelMixin, viewsets.GenericViewSet):
+class GenomeAntiSmashGeneClustersRelationshipsViewSet(GenomeRelationshipConditionalMixin,
+                                                      emg_mixins.ListModelMixin, viewsets.GenericViewSet):
 
     serializer_class = emg_serializers.AntiSmashCountSerializer
 
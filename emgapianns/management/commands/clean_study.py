@@ -20,6 +20,7 @@ from django.core.management import BaseCommand
 
 from emgapi.models import Study, AnalysisJob, DownloadGroupType, AnalysisJobDownload
 from emgapianns.models import AnalysisJobTaxonomy
+from emgcli import cache as response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -169,3 +170,7 @@ class Command(BaseCommand):
                 logger.info("No annotations to remove.")
             logger.info("Job {} is squeaky clean now".format(job))
             logger.info("##########")
+
+        response_cache.purge(*response_cache.study_tags(study))
+        for job in jobs:
+            response_cache.purge(*response_cache.analysis_tags(job))
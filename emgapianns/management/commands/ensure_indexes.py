@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+
+import mongoengine
+from django.core.management import BaseCommand, CommandError
+
+from emgapianns import models as m_models
+
+from ..lib.mongo_indexes import update_indexes
+
+logger = logging.getLogger(__name__)
+
+
+def documents():
+    """Mongo documents of emgapianns.models, by name"""
+    return {
+        name: obj for name, obj in vars(m_models).items()
+        if isinstance(obj, type) and issubclass(obj, mongoengine.Document)
+        and obj.__module__ == m_models.__name__ and not obj._meta.get('abstract')
+    }
+
+
+class Command(BaseCommand):
+    help = 'Create the indexes of the Mongo documents, the indexes are not ' \
+           'created automatically. Unique indexes that are no longer defined ' \
+           '(i.e. the AnalysisJobContig contig_id index without generation) ' \
+           'are dropped first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('documents', nargs='*', type=str,
+                            help='Documents to index, all by default.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only log the indexes to drop and create.')
+
+    def handle(self, *args, **options):
+        available = documents()
+        names = options['documents'] or sorted(available)
+        unknown = set(names) - set(available)
+        if unknown:
+            raise CommandError('Unknown documents: {}'.format(', '.join(sorted(unknown))))
+        for name in names:
+            stale, missing = update_indexes(available[name], options['dry_run'])
+            logger.info('{}: {} stale unique indexes {}, {} missing indexes {}'.format(
+                name, len(stale), stale, len(missing), missing))
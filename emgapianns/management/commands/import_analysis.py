@@ -25,6 +25,7 @@ from django.utils import timezone
 from ena_portal_api import ena_handler
 
 from emgapi import models as emg_models
+from emgcli import cache as response_cache
 from emgapianns.management.lib import utils
 from emgapianns.management.lib.import_analysis_model import Assembly, Run, ExperimentType
 from emgapianns.management.lib.sanity_check import SanityCheck
@@ -72,6 +73,7 @@ class Command(BaseCommand):
     result_dir = None
     library_strategy = None
     force_study_summary = False
+    study_summary_workers = 1
 
     def __init__(self):
         super().__init__()
@@ -93,6 +95,8 @@ class Command(BaseCommand):
                             choices=['default', 'dev', 'prod'],
                             default='default')
         parser.add_argument('--force-study-summary', dest='force_study_summary', action='store_true', default=False)
+        parser.add_argument('--study-summary-workers', type=int, default=1,
+                            help='Number of processes generating the study summary.')
 
     def handle(self, *args, **options):
         setup_logging(options)
@@ -103,6 +107,7 @@ class Command(BaseCommand):
         self.library_strategy = options['library_strategy']
         self.version = options['pipeline']
         self.force_study_summary = options['force_study_summary']
+        self.study_summary_workers = options['study_summary_workers']
         logger.info("CLI %r" % options)
 
         metadata = self.retrieve_metadata()
@@ -156,6 +161,8 @@ class Command(BaseCommand):
         if self.force_study_summary:
             self.__call_generate_study_summary(secondary_study_accession)
 
+        response_cache.purge(*response_cache.analysis_tags(analysis))
+
         logger.info("The upload of the run/assembly {} finished successfully.".format(self.accession))
 
     def __find_existing_result_dir(self, secondary_study_accession, run_accession, version):
@@ -195,7 +202,7 @@ class Command(BaseCommand):
         """
         logger.info('Generating study summary {}'.format(secondary_study_accession))
         call_command('import_study_summary', secondary_study_accession, self.version, '--database', self.emg_db,
-                     '--rootpath', self.rootpath)
+                     '--rootpath', self.rootpath, '--workers', self.study_summary_workers)
 
     def retrieve_metadata(self):
         """
@@ -116,6 +116,7 @@ class Command(BaseCommand):
                 .get(project_id=study_accession)
             assembly.study = _study
             emg_models.StudySample.objects.using(self.emg_db).get_or_create(study=_study, sample=sample)
+            emg_models.refresh_biome_ancestors(samples=[sample.pk], using=self.emg_db)
         except emg_models.Study.DoesNotExist:
             raise emg_models.Study.DoesNotExist("Study {} does not exist in emg DB".format(study_accession))
 
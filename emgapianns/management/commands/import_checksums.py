@@ -19,12 +19,18 @@ import logging
 import os
 import glob
 
-from emgapi.models import ChecksumAlgorithm, AnalysisJobDownload
+from django.db import transaction
+from django.db.models import Q
+
+from emgapi.models import AnalysisJob, ChecksumAlgorithm, AnalysisJobDownload
 
 from ..lib import EMGBaseCommand
 
 logger = logging.getLogger(__name__)
 
+# downloads updated per query
+BATCH_SIZE = 1000
+
 
 class Command(EMGBaseCommand):
 
@@ -32,12 +38,73 @@ class Command(EMGBaseCommand):
         super(Command, self).add_arguments(parser)
         parser.add_argument("-a", "--algorithm",  type=str, choices=["SHA1", "MD5"], default="SHA1",
                             help="Checksum algorithm used.")
+        parser.add_argument("--accessions", nargs="+", default=[],
+                            help="More study, sample, run, assembly or analysis (MGYA) accessions.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help="Number of downloads updated per query.")
+
+    def find_accession(self, options):
+        """The analyses of all the accessions
+        """
+        self.accession = options.get("accession", None)
+        self.pipeline = options.get("pipeline", None)
+
+        query = Q()
+        for accession in [self.accession] + options.get("accessions", []):
+            query |= Q(study__secondary_accession=accession) | \
+                Q(sample__accession=accession) | \
+                Q(run__accession=accession) | \
+                Q(assembly__accession=accession)
+            if accession.startswith("MGYA"):
+                try:
+                    query |= Q(pk=int(accession[len("MGYA"):]))
+                except ValueError:
+                    pass
+        queryset = AnalysisJob.objects.filter(query)
+        if self.pipeline:
+            queryset = queryset.filter(pipeline__release_version=self.pipeline)
+        self.obj_list = list(queryset.order_by("study_id", "pk"))
+        if len(self.obj_list) < 1:
+            logger.error("No runs %s, SKIPPING!" % self.accession)
 
     def populate_from_accession(self, options):
         logger.info("Found %d" % len(self.obj_list))
+        self.algorithm = ChecksumAlgorithm.objects.get(name=options["algorithm"])
+
+        studies = dict()
         for analysis_job in self.obj_list:
+            studies.setdefault(analysis_job.study_id, []).append(analysis_job)
+
+        for count, (study_id, analysis_jobs) in enumerate(studies.items(), 1):
+            updated = self.process_study(analysis_jobs, options)
+            logger.info("Study %s (%d/%d): %d analyses, %d checksums updated" % (
+                study_id, count, len(studies), len(analysis_jobs), updated))
+
+    @transaction.atomic
+    def process_study(self, analysis_jobs, options):
+        """Import the checksums of the analyses of a study, the downloads
+        are updated in batches in one transaction.
+        """
+        downloads = AnalysisJobDownload.objects \
+            .select_related(None) \
+            .filter(job__in=analysis_jobs) \
+            .only("id", "job", "realname", "file_checksum", "checksum_algorithm") \
+            .order_by()
+        files = dict()
+        for download in downloads:
+            files.setdefault(download.job_id, dict())[download.realname] = download
+
+        self.updated = dict()
+        for analysis_job in analysis_jobs:
+            self.aj_dict = files.get(analysis_job.job_id, dict())
             self.process(analysis_job, options)
 
+        AnalysisJobDownload.objects.bulk_update(
+            list(self.updated.values()),
+            ["file_checksum", "checksum_algorithm"],
+            batch_size=options.get("batch_size") or BATCH_SIZE)
+        return len(self.updated)
+
     def process(self, analysis_job, options):
         """Import the checksums from the json outputs
         Example structure:
@@ -67,16 +134,10 @@ class Command(EMGBaseCommand):
             },...
         }
         """
-        logger.info("CLI %r" % options)
-
         # a few helper variables
         self.analysis_job = analysis_job
-        self.algorithm = ChecksumAlgorithm.objects.get(name=options["algorithm"])
 
-        analysis_files = list(AnalysisJobDownload.objects.filter(job=analysis_job))
-        self.aj_dict = {aj_d.realname: aj_d for aj_d in analysis_files}
-
-        if not len(analysis_files):
+        if not len(self.aj_dict):
             logger.warning("There are no files for " + str(analysis_job))
             return
 
@@ -85,7 +146,7 @@ class Command(EMGBaseCommand):
             analysis_job.result_directory,
             "checksums-*.json")
 
-        json_files = glob.glob(path)
+        json_files = sorted(glob.glob(path))
 
         if not len(json_files):
             logger.warning("NO checksum files: " + path)
@@ -121,7 +182,9 @@ class Command(EMGBaseCommand):
             logger.info("%s is not a file for %s" % (basename, self.analysis_job))
             return
 
+        if ajd_file.file_checksum == checksum and ajd_file.checksum_algorithm_id == self.algorithm.pk:
+            return
+
         ajd_file.file_checksum = checksum
         ajd_file.checksum_algorithm = self.algorithm
-        # TODO: use bulk_update when django is updated
-        ajd_file.save()
+        self.updated[ajd_file.pk] = ajd_file
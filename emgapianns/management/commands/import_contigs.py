@@ -17,11 +17,22 @@ import logging
 from collections import Counter
 import re
 import gzip
+import heapq
+import itertools
+import operator
+import tempfile
+import threading
+import uuid
+
+from datetime import datetime
+
+from django.core.management import CommandError
 
 from emgapi.utils import assembly_contig_coverage
 from emgapianns import models as m_models
 
 from ..lib import EMGBaseCommand
+from ..lib.mongo_indexes import stale_unique_indexes
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +44,8 @@ class Command(EMGBaseCommand):
     rootpath = None
     result_dir = None
     PATHWAY_SUB_DIR = 'pathways-systems'
+    # fasta index and GFF lines sorted in memory at once
+    SORT_CHUNK = 500000
 
     @classmethod
     def _split(cls, string, sep=','):
@@ -57,60 +70,201 @@ class Command(EMGBaseCommand):
                             help='KEGG Modules summary file.', required=False)
         parser.add_argument('--min-length', action='store', type=int, default=500,
                             help='Only import contigs longer that this value.', required=False)
+        parser.add_argument('--staged', action='store_true',
+                            help='Import a new generation of the contigs, the previous one is '
+                                 'served until the import completes.', required=False)
 
     def populate_from_accession(self, options):
         logger.info('Found {}'.format(len(self.obj_list)))
+        if options['staged']:
+            self.check_staged_indexes()
+        collectors = []
         for analysis_job in self.obj_list:
-            self.load_contigs(analysis_job, options)
+            collector = self.load_contigs(analysis_job, options)
+            if collector is not None:
+                collectors.append(collector)
+        for collector in collectors:
+            collector.join()
 
-    def load_gff(self, gff, annotations_dict):
-        """Load the GFF eggNOG data on the cache
+    @staticmethod
+    def check_staged_indexes():
+        """The unique indexes of the contigs have to include the generation,
+        an index created before it rejects the contigs of a new generation
         """
-        if not os.path.exists(gff):
-            logger.error('GFF file does not exist. Path:' + gff)
-            raise ValueError('GFF file does not exist')
+        stale = stale_unique_indexes(m_models.AnalysisJobContig)
+        if stale:
+            raise CommandError(
+                'The unique indexes {} of the contigs do not include the generation, '
+                'run "manage.py ensure_indexes AnalysisJobContig" before staged '
+                'imports'.format(', '.join(stale)))
+
+    @staticmethod
+    def collect_generations(analysis_job, generation):
+        """Delete the contigs of the analysis job from the
+        other generations
+        """
+        deleted = m_models.AnalysisJobContig.objects.filter(
+            analysis_id=str(analysis_job.job_id),
+            generation__ne=generation).delete()
+        logger.info('Deleted {} old contigs of {}'.format(deleted, analysis_job.accession))
+
+    @staticmethod
+    def activate_generation(analysis_job, generation):
+        """Make the generation the one served for the analysis job
+        """
+        m_models.AnalysisJobContigGeneration.objects(pk=str(analysis_job.job_id)).update_one(
+            upsert=True,
+            set__accession=analysis_job.accession,
+            set__pipeline_version=analysis_job.pipeline.release_version,
+            set__job_id=analysis_job.job_id,
+            set__generation=generation,
+            set__updated=datetime.utcnow())
 
+    @staticmethod
+    def read_features(gff, contig_key=None):
+        """(contig id, attributes) of the GFF features, contig_key is
+        applied to the contig ids
+        """
         with gzip.open(gff, 'rt') as gff_file:
-            logger.info('Parsing annotations from: {}'.format(gff))
             for line in gff_file:
                 if line.startswith('#'):
                     continue
                 contig_id, *_, atts = line.split('\t')
-                if contig_id not in annotations_dict:
-                    annotations_dict[contig_id] = {
-                        'kegg': [],
-                        'cog': [],
-                        'pfam': [],
-                        'interpro': [],
-                        'go': []
-                    }
+                if contig_key:
+                    contig_id = contig_key(contig_id)
+                yield contig_id, atts.rstrip('\n')
+
+    @staticmethod
+    def is_sorted(records):
+        """True if the (key, value) records are sorted by key"""
+        previous = None
+        for key, _ in records:
+            if previous is not None and key < previous:
+                return False
+            previous = key
+        return True
+
+    def group_by_contig(self, gff, contig_key=None):
+        """Attributes of the GFF features grouped by contig:
+        (contig id, [attributes, ...]), sorted by contig id.
+        The GFF is streamed if it is sorted by contig (as it is for tabix),
+        otherwise it is sorted first (see sort_records).
+        """
+        features = self.read_features(gff, contig_key)
+        if not self.is_sorted(self.read_features(gff, contig_key)):
+            logger.warning('{} is not sorted by contig, sorting it'.format(gff))
+            features = self.sort_records(features)
+        for contig_id, group in itertools.groupby(features, key=operator.itemgetter(0)):
+            yield contig_id, [atts for _, atts in group]
+
+    def sort_records(self, records):
+        """Stream of the (key, value) string records sorted by key, the
+        order of the records with the same key is kept.
+        The records are sorted in chunks of SORT_CHUNK, stored in temporary
+        files and merged. Neither the key nor the value can have tabs or
+        new lines.
+        """
+        runs = []
+        try:
+            while True:
+                chunk = list(itertools.islice(records, self.SORT_CHUNK))
+                if not chunk:
+                    break
+                chunk.sort(key=operator.itemgetter(0))
+                run = tempfile.TemporaryFile('w+')
+                run.writelines('{}\t{}\n'.format(*r) for r in chunk)
+                run.seek(0)
+                runs.append(run)
+
+            def read_run(run):
+                for line in run:
+                    yield tuple(line.rstrip('\n').split('\t', 1))
+
+            for record in heapq.merge(*[read_run(run) for run in runs],
+                                      key=operator.itemgetter(0)):
+                yield record
+        finally:
+            for run in runs:
+                run.close()
+
+    def load_gff(self, gff):
+        """Stream of the GFF eggNOG annotations, by contig
+        """
+        if not os.path.exists(gff):
+            logger.error('GFF file does not exist. Path:' + gff)
+            raise ValueError('GFF file does not exist')
+
+        logger.info('Parsing annotations from: {}'.format(gff))
+        for contig_id, attributes in self.group_by_contig(gff):
+            annotations = {
+                'kegg': [],
+                'cog': [],
+                'pfam': [],
+                'interpro': [],
+                'go': []
+            }
+            for atts in attributes:
                 for category in atts.split(';'):
                     for possible_cat in ['kegg', 'cog', 'pfam', 'interpro', 'go']:
                         if category.startswith(possible_cat + '='):
                             values = Command._split(category.replace(possible_cat + '=', ''))
-                            annotations_dict[contig_id][possible_cat].extend(values)
+                            annotations[possible_cat].extend(values)
+            yield contig_id, annotations
 
-    def load_antismash(self, antismash, annotations_dict):
-        """Load antiSMASH file data on the cache
+    def load_antismash(self, antismash):
+        """Stream of the antiSMASH annotations, by contig
         """
         if not os.path.exists(antismash):
             logger.warning('antiSMASH file does not exist. SKIPPING!')
             return
 
         logger.info('Loading antiSMASH')
-        with gzip.open(antismash, 'rt') as as_file:
-            for line in as_file:
-                if line.startswith('#'):
-                    continue
-                contig, *_, atts = line.split('\t')
-                contig_id = contig.replace(' ', '-')
-                contig_ann = annotations_dict.setdefault(contig_id, {'antismash': []})
+        contigs = self.group_by_contig(
+            antismash, contig_key=lambda contig: contig.replace(' ', '-'))
+        for contig_id, attributes in contigs:
+            clusters = []
+            for atts in attributes:
                 for at in atts.split(';'):
                     if 'as_gene_clusters' not in at:
                         continue
                     for at_cluster in at.split(','):
-                        cluster = at_cluster.replace('as_gene_clusters=', '').replace('\n', '')
-                        contig_ann.setdefault('antismash', []).append(cluster)
+                        clusters.append(at_cluster.replace('as_gene_clusters=', '').replace('\n', ''))
+            yield contig_id, {'antismash': clusters}
+
+    def load_faix(self, faix, min_length):
+        """Stream of the (contig id, length) of the fasta index sorted by
+        contig id, the contigs shorter than min_length are skipped.
+        """
+        def read_index(fasta):
+            for line in fasta:
+                contig_id, length, *_ = line.split('\t')
+                if min_length <= int(length):
+                    yield contig_id.strip(), length
+
+        with open(faix, 'r') as fasta:
+            for contig_id, length in self.sort_records(read_index(fasta)):
+                yield contig_id, int(length)
+
+    @staticmethod
+    def join_annotations(contigs, *streams):
+        """Merge join of the contigs with the annotations streams, all
+        sorted by contig id: (contig id, length, annotations) of the
+        annotated contigs.
+        """
+        heads = [next(stream, None) for stream in streams]
+        for contig_id, length in contigs:
+            if all(head is None for head in heads):
+                return
+            annotations = {}
+            for i, stream in enumerate(streams):
+                # annotations of short or missing contigs
+                while heads[i] is not None and heads[i][0] < contig_id:
+                    heads[i] = next(stream, None)
+                if heads[i] is not None and heads[i][0] == contig_id:
+                    annotations.update(heads[i][1])
+                    heads[i] = next(stream, None)
+            if annotations:
+                yield contig_id, length, annotations
 
     def load_kegg_modules(self, kegg_modules, annotations_dict):
         """Load KEGG Modules and paths
@@ -175,106 +329,127 @@ class Command(EMGBaseCommand):
 
         logger.info('Starting the contigs import process for: ' + str(analysis_job.accession))
 
-        annotations_dict = {}
-        self.load_gff(gff, annotations_dict)
-        self.load_antismash(antismash, annotations_dict)
         # TODO: calculation not implemented in pipeline yet.
         # self.load_kegg_modules(kegg_modules, annotations_dict)
+        contigs = self.join_annotations(
+            self.load_faix(faix, min_length),
+            self.load_gff(gff),
+            self.load_antismash(antismash))
 
-        # Remove contigs
-        m_models.AnalysisJobContig.objects.filter(
-            analysis_id=str(analysis_job.job_id),
-            accession=analysis_job.accession,
-            job_id=analysis_job.job_id,
-            pipeline_version=analysis_job.pipeline.release_version).delete()
+        if not options['staged']:
+            # Remove contigs
+            m_models.AnalysisJobContig.objects.filter(
+                analysis_id=str(analysis_job.job_id),
+                accession=analysis_job.accession,
+                job_id=analysis_job.job_id,
+                pipeline_version=analysis_job.pipeline.release_version).delete()
+            self.activate_generation(analysis_job, None)
+            self.insert_contigs(analysis_job, contigs, batch_size)
+            return None
 
-        with open(faix, 'r') as fasta:
-            new_contigs = []
-            for line in fasta:
-                contig_id, length, *_ = line.split('\t')
+        generation = uuid.uuid4().hex
+        logger.info('Importing generation {} of {}'.format(generation, analysis_job.accession))
+        try:
+            self.insert_contigs(analysis_job, contigs, batch_size, generation)
+        except BaseException:
+            logger.error('Import of generation {} failed, removing it'.format(generation))
+            m_models.AnalysisJobContig.objects.filter(
+                analysis_id=str(analysis_job.job_id),
+                generation=generation).delete()
+            raise
+        self.activate_generation(analysis_job, generation)
+        logger.info('Generation {} of {} is active'.format(generation, analysis_job.accession))
 
-                annotations = annotations_dict.get(contig_id, {})
-                if min_length > int(length) or not annotations:
-                    continue
+        collector = threading.Thread(
+            target=self.collect_generations, args=(analysis_job, generation),
+            name='contigs-gc-{}'.format(analysis_job.job_id))
+        collector.start()
+        return collector
 
-                contig = m_models.AnalysisJobContig(
-                    contig_id=contig_id.strip(),
-                    length=length,
-                    coverage=assembly_contig_coverage(contig_id),
-                    analysis_id=str(analysis_job.job_id),
-                    accession=analysis_job.accession,
-                    job_id=analysis_job.job_id,
-                    pipeline_version=analysis_job.pipeline.release_version
-                )
-
-                if 'kegg' in annotations:
-                    contig.keggs = list()
-                    feature_count = Counter(annotations['kegg'])
-                    contig.has_kegg = bool(feature_count)
-                    for feature in feature_count:
-                        contig.keggs.append(
-                            m_models.AnalysisJobKeggOrthologAnnotation(ko=feature, count=feature_count[feature])
-                        )
-                if 'cog' in annotations:
-                    contig.cogs = list()
-                    feature_count = Counter(annotations['cog'])
-                    contig.has_cog = bool(feature_count)
-                    for feature in feature_count:
-                        contig.cogs.append(
-                            m_models.AnalysisJobCOGAnnotation(cog=feature, count=feature_count[feature])
-                        )
-                if 'pfam' in annotations:
-                    contig.pfams = list()
-                    feature_count = Counter(annotations['pfam'])
-                    contig.has_pfam = bool(feature_count)
-                    for feature in feature_count:
-                        contig.pfams.append(
-                            m_models.AnalysisJobPfamAnnotation(pfam_entry=feature, count=feature_count[feature])
-                        )
-                if 'interpro' in annotations:
-                    contig.interpros = list()
-                    feature_count = Counter(annotations['interpro'])
-                    contig.has_interpro = bool(feature_count)
-                    for feature in feature_count:
-                        contig.interpros.append(
-                            m_models.AnalysisJobInterproIdentifierAnnotation(
-                                interpro_identifier=feature, count=feature_count[feature])
-                        )
-                if 'go' in annotations:
-                    contig.gos = list()
-                    feature_count = Counter(annotations['go'])
-                    contig.has_go = bool(feature_count)
-                    for feature in feature_count:
-                        contig.gos.append(
-                            m_models.AnalysisJobGoTermAnnotation(go_term=feature, count=feature_count[feature])
-                        )
-                if 'antismash' in annotations:
-                    contig.as_geneclusters = list()
-                    feature_count = Counter(annotations['antismash'])
-                    contig.has_antismash = bool(feature_count)
-                    for feature in feature_count:
-                        contig.as_geneclusters.append(
-                            m_models.AnalysisJobAntiSmashGCAnnotation(gene_cluster=feature,
-                                                                      count=feature_count[feature])
+    def insert_contigs(self, analysis_job, contigs, batch_size, generation=None):
+        """Insert the contigs in Mongo, in batches
+        """
+        new_contigs = []
+        for contig_id, length, annotations in contigs:
+            contig = m_models.AnalysisJobContig(
+                contig_id=contig_id,
+                length=length,
+                coverage=assembly_contig_coverage(contig_id),
+                analysis_id=str(analysis_job.job_id),
+                accession=analysis_job.accession,
+                job_id=analysis_job.job_id,
+                pipeline_version=analysis_job.pipeline.release_version,
+                generation=generation
+            )
+
+            if 'kegg' in annotations:
+                contig.keggs = list()
+                feature_count = Counter(annotations['kegg'])
+                contig.has_kegg = bool(feature_count)
+                for feature in feature_count:
+                    contig.keggs.append(
+                        m_models.AnalysisJobKeggOrthologAnnotation(ko=feature, count=feature_count[feature])
+                    )
+            if 'cog' in annotations:
+                contig.cogs = list()
+                feature_count = Counter(annotations['cog'])
+                contig.has_cog = bool(feature_count)
+                for feature in feature_count:
+                    contig.cogs.append(
+                        m_models.AnalysisJobCOGAnnotation(cog=feature, count=feature_count[feature])
+                    )
+            if 'pfam' in annotations:
+                contig.pfams = list()
+                feature_count = Counter(annotations['pfam'])
+                contig.has_pfam = bool(feature_count)
+                for feature in feature_count:
+                    contig.pfams.append(
+                        m_models.AnalysisJobPfamAnnotation(pfam_entry=feature, count=feature_count[feature])
+                    )
+            if 'interpro' in annotations:
+                contig.interpros = list()
+                feature_count = Counter(annotations['interpro'])
+                contig.has_interpro = bool(feature_count)
+                for feature in feature_count:
+                    contig.interpros.append(
+                        m_models.AnalysisJobInterproIdentifierAnnotation(
+                            interpro_identifier=feature, count=feature_count[feature])
+                    )
+            if 'go' in annotations:
+                contig.gos = list()
+                feature_count = Counter(annotations['go'])
+                contig.has_go = bool(feature_count)
+                for feature in feature_count:
+                    contig.gos.append(
+                        m_models.AnalysisJobGoTermAnnotation(go_term=feature, count=feature_count[feature])
+                    )
+            if 'antismash' in annotations:
+                contig.as_geneclusters = list()
+                feature_count = Counter(annotations['antismash'])
+                contig.has_antismash = bool(feature_count)
+                for feature in feature_count:
+                    contig.as_geneclusters.append(
+                        m_models.AnalysisJobAntiSmashGCAnnotation(gene_cluster=feature,
+                                                                  count=feature_count[feature])
+                    )
+            if 'keggmodules' in annotations:
+                contig.kegg_modules = list()
+                kegg_modules = annotations['keggmodules'].items()
+                contig.has_antismash = bool(kegg_modules)
+                for module, data in kegg_modules:
+                    for completeness, matching, missing in data:
+                        contig.kegg_modules.append(
+                            m_models.AnalysisJobKeggModuleAnnotation(module=module,
+                                                                     completeness=completeness,
+                                                                     matching_kos=matching or list(),
+                                                                     missing_kos=missing or list())
                         )
-                if 'keggmodules' in annotations:
-                    contig.kegg_modules = list()
-                    kegg_modules = annotations['keggmodules'].items()
-                    contig.has_antismash = bool(kegg_modules)
-                    for module, data in kegg_modules:
-                        for completeness, matching, missing in data:
-                            contig.kegg_modules.append(
-                                m_models.AnalysisJobKeggModuleAnnotation(module=module,
-                                                                         completeness=completeness,
-                                                                         matching_kos=matching or list(),
-                                                                         missing_kos=missing or list())
-                            )
-
-                new_contigs.append(contig)
-                if len(new_contigs) % batch_size == 0:
-                    m_models.AnalysisJobContig.objects.insert(new_contigs, load_bulk=False)
-                    logger.info('Creating {} new contigs'.format(len(new_contigs)))
-                    new_contigs = []
+
+            new_contigs.append(contig)
+            if len(new_contigs) % batch_size == 0:
+                m_models.AnalysisJobContig.objects.insert(new_contigs, load_bulk=False)
+                logger.info('Creating {} new contigs'.format(len(new_contigs)))
+                new_contigs = []
         if len(new_contigs):
             m_models.AnalysisJobContig.objects.insert(new_contigs, load_bulk=False)
             logger.info('Creating {} new contigs'.format(len(new_contigs)))
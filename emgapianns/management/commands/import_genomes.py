@@ -1,9 +1,11 @@
 import logging
+import multiprocessing
 import os
 
-from django.core.management import BaseCommand
-from django.db import IntegrityError
+from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
 from emgapi import models as emg_models
+from emgcli import cache as response_cache
 
 from ..lib.genome_util import sanity_check_genome_output, \
     sanity_check_release_dir, find_genome_results, \
@@ -14,6 +16,34 @@ logger = logging.getLogger(__name__)
 cog_cache = {}
 ipr_cache = {}
 
+# dimension tables of the genome counts files:
+# file, model, model field, file column
+DIMENSION_FILES = (
+    ('cog_summary.tsv', emg_models.CogCat, 'name', 'COG_category'),
+    ('kegg_classes.tsv', emg_models.KeggClass, 'class_id', 'KEGG_class'),
+    ('kegg_modules.tsv', emg_models.KeggModule, 'name', 'KEGG_module'),
+)
+ANTISMASH_FILE = os.path.join('genome', 'geneclusters.txt')
+
+# command of the upload processes, inherited on fork
+_command = None
+
+
+def _upload_dir(directory):
+    """Upload a genome dir in a worker process"""
+    return _command.try_upload_dir(directory)
+
+
+def read_antismash_clusters(file):
+    """(cluster name, number of features) of the antiSMASH geneclusters file
+    """
+    clusters = []
+    with open(file, 'rt') as tsv:
+        for row in tsv:
+            *_, cluster, features, _ = row.split('\t')
+            clusters.append((cluster, len(features.split(';')) if len(features) else 0))
+    return clusters
+
 
 class Command(BaseCommand):
     obj_list = list()
@@ -22,12 +52,16 @@ class Command(BaseCommand):
     release_obj = None
 
     database = None
+    # dimension tables rows by model and key
+    dimensions = None
 
     def add_arguments(self, parser):
         parser.add_argument('rootpath', action='store', type=str, )
         parser.add_argument('version', action='store', type=str)
         parser.add_argument('--database', type=str,
                             default='default')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes uploading the genomes.')
 
     def handle(self, *args, **options):
         self.rootpath = os.path.realpath(options.get('rootpath').strip())
@@ -39,6 +73,7 @@ class Command(BaseCommand):
         release_dir = os.path.join(self.rootpath, version)
 
         self.database = options['database']
+        self.dimensions = {}
         self.release_obj = self.get_release(version, release_dir)
 
         logger.info("CLI %r" % options)
@@ -51,11 +86,88 @@ class Command(BaseCommand):
 
         sanity_check_release_dir(release_dir)
 
-        for d in genome_dirs:
-            self.upload_dir(d)
+        genomes, failed = self.upload_dirs(genome_dirs, options['workers'])
 
         self.upload_release_files()
 
+        for genome in genomes:
+            response_cache.purge(*response_cache.genome_tags(genome))
+
+        if failed:
+            raise CommandError('{} genomes failed to upload: {}'.format(
+                len(failed), ', '.join(os.path.basename(d) for d, _ in failed)))
+
+    def prewarm_dimensions(self, genome_dirs):
+        """Create the rows of the tables shared by the genomes (genome sets,
+        locations, COG categories, KEGG classes and modules, antiSMASH
+        clusters) once, before the genomes are uploaded.
+        """
+        keys = {}
+        for directory in genome_dirs:
+            data = read_json(os.path.join(directory, 'genome.json'))
+            data.update(data.pop('pangenome', {}))
+            self.get_or_create_genome_set(data['genome_set'])
+            locations = list(data.get('geographic_range') or [])
+            if 'geographic_origin' in data:
+                locations.append(data['geographic_origin'])
+            for location in locations:
+                self.get_geo_location(location)
+            for subdir in ('genome', 'pan-genome'):
+                for filename, model, field, column in DIMENSION_FILES:
+                    f = os.path.join(directory, subdir, filename)
+                    if os.path.exists(f):
+                        keys.setdefault((model, field), set()) \
+                            .update(row[column] for row in read_tsv_w_headers(f))
+            f = os.path.join(directory, ANTISMASH_FILE)
+            if os.path.exists(f):
+                keys.setdefault((emg_models.AntiSmashGC, 'name'), set()) \
+                    .update(cluster for cluster, _ in read_antismash_clusters(f))
+        for (model, field), model_keys in keys.items():
+            self.get_dimensions(model, field, model_keys)
+
+    def try_upload_dir(self, directory):
+        """Upload a genome dir: (directory, genome accession, error)
+        """
+        try:
+            genome = self.upload_dir(directory)
+            return directory, genome.accession, None
+        except (Exception, SystemExit) as e:
+            logger.exception('Failed to upload {}'.format(directory))
+            return directory, None, '{}: {}'.format(type(e).__name__, e)
+
+    def upload_dirs(self, genome_dirs, workers=1):
+        """Upload the genome dirs, with a pool of processes if workers > 1,
+        each process uses its own DB connection.
+        A failed genome doesn't stop the upload of the others.
+        Returns the uploaded genomes and the (directory, error) of the
+        failed ones.
+        """
+        global _command
+        results = []
+        # outside of the genomes transactions, the rows created in a failed
+        # genome transaction would be rolled back but kept in the cache
+        self.prewarm_dimensions(genome_dirs)
+        if workers > 1:
+            _command = self
+            # the processes open their own connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                for result in pool.imap_unordered(_upload_dir, genome_dirs):
+                    results.append(result)
+                    logger.info('Uploaded {}/{} genome dirs'.format(len(results), len(genome_dirs)))
+        else:
+            for directory in genome_dirs:
+                results.append(self.try_upload_dir(directory))
+                logger.info('Uploaded {}/{} genome dirs'.format(len(results), len(genome_dirs)))
+
+        uploaded = [accession for _, accession, error in results if error is None]
+        failed = sorted((directory, error) for directory, _, error in results if error is not None)
+        logger.info('Uploaded {} genomes, {} failed'.format(len(uploaded), len(failed)))
+        for directory, error in failed:
+            logger.error('Genome {} failed: {}'.format(directory, error))
+        genomes = list(emg_models.Genome.objects.using(self.database).filter(accession__in=uploaded))
+        return genomes, failed
+
     def get_release(self, version, result_dir):
         base_result_dir = get_result_path(result_dir)
         return emg_models.Release.objects \
@@ -65,18 +177,21 @@ class Command(BaseCommand):
 
     def upload_dir(self, directory):
         logger.info('Uploading dir: {}'.format(directory))
-        genome, has_pangenome = self.create_genome(directory)
-        self.set_genome_release(genome)
+        with transaction.atomic(using=self.database):
+            genome, has_pangenome = self.create_genome(directory)
+            self.set_genome_release(genome)
 
-        self.upload_cog_results(genome, directory, has_pangenome)
-        self.upload_kegg_class_results(genome, directory, has_pangenome)
-        self.upload_kegg_module_results(genome, directory, has_pangenome)
-        self.upload_antismash_geneclusters(genome, directory)
-        self.upload_genome_files(genome, has_pangenome)
+            self.upload_cog_results(genome, directory, has_pangenome)
+            self.upload_kegg_class_results(genome, directory, has_pangenome)
+            self.upload_kegg_module_results(genome, directory, has_pangenome)
+            self.upload_antismash_geneclusters(genome, directory)
+            self.upload_genome_files(genome, has_pangenome)
+        return genome
 
     def set_genome_release(self, genome):
         try:
-            emg_models.ReleaseGenomes(release=self.release_obj, genome=genome).save(using=self.database)
+            with transaction.atomic(using=self.database):
+                emg_models.ReleaseGenomes(release=self.release_obj, genome=genome).save(using=self.database)
         except IntegrityError:
             pass
 
@@ -137,157 +252,124 @@ class Command(BaseCommand):
 
         return g, has_pangenome
 
+    def get_dimensions(self, model, field, keys):
+        """Rows of the dimension table (CogCat, KeggClass...) by key,
+        the missing ones are created.
+        The rows are cached for the whole import.
+        """
+        cache = self.dimensions.setdefault(model, {})
+        missing = set(keys) - set(cache)
+        if missing:
+            queryset = model.objects.using(self.database)
+            for obj in queryset.filter(**{field + '__in': missing}):
+                cache[getattr(obj, field)] = obj
+            new = [model(**{field: key}) for key in missing if key not in cache]
+            if new:
+                queryset.bulk_create(new, ignore_conflicts=True)
+                logger.info('Created {} new {}'.format(len(new), model.__name__))
+                for obj in queryset.filter(**{field + '__in': [getattr(n, field) for n in new]}):
+                    cache[getattr(obj, field)] = obj
+            for key in missing:
+                if key not in cache:
+                    # i.e. case insensitive collation
+                    cache[key] = queryset.get_or_create(**{field: key})[0]
+        return {key: cache[key] for key in keys}
+
+    def upload_counts(self, genome, count_model, dimension_field, dimension_model, dimension_key,
+                      column, genome_file, pangenome_file=None):
+        """Genome and pan-genome counts of the TSV files, merged in memory
+        and written with one bulk insert and one bulk update.
+        Existing counts missing from the files are kept.
+        """
+        counts = {}
+        for f, count_field in ((genome_file, 'genome_count'), (pangenome_file, 'pangenome_count')):
+            if f is None:
+                continue
+            for row in read_tsv_w_headers(f):
+                counts.setdefault(row[column], {})[count_field] = int(row['Counts'])
+
+        dimensions = self.get_dimensions(dimension_model, dimension_key, counts)
+
+        queryset = count_model.objects.using(self.database)
+        existing = {
+            getattr(c, dimension_field + '_id'): c
+            for c in queryset.filter(genome=genome)
+        }
+        new_counts = []
+        updated_counts = []
+        for key, values in counts.items():
+            dimension = dimensions[key]
+            count = existing.get(dimension.pk)
+            if count is None:
+                defaults = {'genome_count': 0, 'pangenome_count': 0}
+                defaults.update(values)
+                new_counts.append(count_model(genome=genome, **{dimension_field: dimension}, **defaults))
+            else:
+                for count_field, value in values.items():
+                    setattr(count, count_field, value)
+                updated_counts.append(count)
+        if new_counts:
+            queryset.bulk_create(new_counts, batch_size=1000)
+        if updated_counts:
+            queryset.bulk_update(updated_counts, ['genome_count', 'pangenome_count'], batch_size=1000)
+
     def upload_cog_results(self, genome, d, has_pangenome):
         genome_cogs = os.path.join(d, 'genome', 'cog_summary.tsv')
-        self.upload_cog_result(genome, genome_cogs, False)
-        logger.info('Loaded Genome COG for {}'.format(genome.accession))
-
         pangenome_cogs = os.path.join(d, 'pan-genome', 'cog_summary.tsv')
+        self.upload_counts(genome, emg_models.GenomeCogCounts, 'cog',
+                           emg_models.CogCat, 'name', 'COG_category',
+                           genome_cogs, pangenome_cogs if has_pangenome else None)
+        logger.info('Loaded Genome COG for {}'.format(genome.accession))
         if has_pangenome:
-            self.upload_cog_result(genome, pangenome_cogs, True)
             logger.info('Loaded PanGenome COG for {}'.format(genome.accession))
 
-    def upload_cog_result(self, genome, f, is_pangenome):
-        counts = read_tsv_w_headers(f)
-        for cc in counts:
-            self.upload_cog_count(genome, cc, is_pangenome)
-        logger.info('Loaded Genome COG for {}'.format(genome.accession))
-
-    def upload_cog_count(self, genome, cog_count, is_pangenome):
-        c_name = cog_count['COG_category']
-        cog = self.get_cog_cat(c_name)
-
-        count_val = int(cog_count['Counts'])
-
-        defaults = {'genome_count': 0, 'pangenome_count': 0}
-
-        count, created = emg_models.GenomeCogCounts.objects \
-            .using(self.database) \
-            .get_or_create(genome=genome,
-                           cog=cog,
-                           defaults=defaults)
-        if is_pangenome:
-            count.pangenome_count = count_val
-        else:
-            count.genome_count = count_val
-        count.save(using=self.database)
-
-    def get_cog_cat(self, c_name):
-        return emg_models.CogCat.objects.using(self.database) \
-            .get_or_create(name=c_name)[0]
-
     def upload_kegg_class_results(self, genome, d, has_pangenome):
         genome_kegg_classes = os.path.join(d, 'genome', 'kegg_classes.tsv')
-        self.upload_kegg_class_result(genome, genome_kegg_classes, False)
-        logger.info(
-            'Loaded Genome KEGG classes for {}'.format(genome.accession))
-
         pangenome_kegg_classes = os.path.join(d, 'pan-genome',
                                               'kegg_classes.tsv')
+        self.upload_counts(genome, emg_models.GenomeKeggClassCounts, 'kegg_class',
+                           emg_models.KeggClass, 'class_id', 'KEGG_class',
+                           genome_kegg_classes, pangenome_kegg_classes if has_pangenome else None)
+        logger.info(
+            'Loaded Genome KEGG classes for {}'.format(genome.accession))
         if has_pangenome:
-            self.upload_kegg_class_result(genome, pangenome_kegg_classes, True)
             logger.info(
                 'Loaded PanGenome KEGG classes for {}'.format(genome.accession))
 
-    def upload_kegg_class_result(self, genome, f, pangenome):
-        kegg_matches = read_tsv_w_headers(f)
-        for kegg_match in kegg_matches:
-            self.upload_kegg_class_count(genome, kegg_match, pangenome)
-
-    def get_kegg_class(self, kegg_cls_id):
-        return emg_models.KeggClass.objects.using(self.database) \
-            .get_or_create(class_id=kegg_cls_id)[0]
-
-    def upload_kegg_class_count(self, genome, kegg_match, is_pangenome):
-        kegg_id = kegg_match['KEGG_class']
-        kegg_class = self.get_kegg_class(kegg_id)
-
-        count_val = int(kegg_match['Counts'])
-
-        defaults = {'genome_count': 0, 'pangenome_count': 0}
-
-        count, created = emg_models.GenomeKeggClassCounts.objects \
-            .using(self.database) \
-            .get_or_create(genome=genome,
-                           kegg_class=kegg_class,
-                           defaults=defaults)
-
-        if is_pangenome:
-            count.pangenome_count = count_val
-        else:
-            count.genome_count = count_val
-
-        count.save(using=self.database)
-
     def upload_kegg_module_results(self, genome, d, has_pangenome):
         genome_kegg_modules = os.path.join(d, 'genome', 'kegg_modules.tsv')
-        self.upload_kegg_module_result(genome, genome_kegg_modules, False)
+        pangenome_kegg_modules = os.path.join(d, 'pan-genome',
+                                              'kegg_modules.tsv')
+        self.upload_counts(genome, emg_models.GenomeKeggModuleCounts, 'kegg_module',
+                           emg_models.KeggModule, 'name', 'KEGG_module',
+                           genome_kegg_modules, pangenome_kegg_modules if has_pangenome else None)
         logger.info(
             'Loaded Genome KEGG modules for {}'.format(genome.accession))
-
-        pangenome_kegg_classes = os.path.join(d, 'pan-genome',
-                                              'kegg_modules.tsv')
         if has_pangenome:
-            self.upload_kegg_module_result(genome, pangenome_kegg_classes, True)
             logger.info(
                 'Loaded PanGenome KEGG modules for {}'.format(genome.accession))
 
-    def upload_kegg_module_result(self, genome, f, is_pangenome):
-        kegg_matches = read_tsv_w_headers(f)
-        for kegg_match in kegg_matches:
-            self.upload_kegg_module_count(genome, kegg_match, is_pangenome)
-
-    def get_kegg_module(self, name):
-        return emg_models.KeggModule.objects.using(self.database) \
-            .get_or_create(name=name)[0]
-
-    def upload_kegg_module_count(self, genome, kegg_match, is_pangenome):
-        kegg_module_id = kegg_match['KEGG_module']
-        kegg_module = self.get_kegg_module(kegg_module_id)
-
-        count_val = int(kegg_match['Counts'])
-
-        defaults = {'genome_count': 0, 'pangenome_count': 0}
-
-        count, created = emg_models.GenomeKeggModuleCounts.objects \
-            .using(self.database) \
-            .get_or_create(genome=genome,
-                           kegg_module=kegg_module,
-                           defaults=defaults)
-
-        if is_pangenome:
-            count.pangenome_count = count_val
-        else:
-            count.genome_count = count_val
-
-        count.save(using=self.database)
-
     def upload_antismash_geneclusters(self, genome, directory):
         """Upload AS results in the DB
         """
-        file = os.path.join(directory, 'genome', 'geneclusters.txt')
+        file = os.path.join(directory, ANTISMASH_FILE)
 
         if not os.path.exists(file):
             logger.warning('Genome {} does not have antiSMASH geneclusters'.format(genome.accession))
             return
 
-        with open(file, 'rt') as tsv:
-            for row in tsv:
-                *_, cluster, features, _ = row.split('\t')
-
-                as_cluster, _ = emg_models.AntiSmashGC.objects \
-                    .using(self.database) \
-                    .get_or_create(name=cluster)
+        clusters = read_antismash_clusters(file)
+        as_clusters = self.get_dimensions(emg_models.AntiSmashGC, 'name',
+                                          set(cluster for cluster, _ in clusters))
+        for cluster, count_val in clusters:
+            model, _ = emg_models.GenomeAntiSmashGCCounts.objects \
+                .using(self.database) \
+                .get_or_create(genome=genome, antismash_genecluster=as_clusters[cluster],
+                               genome_count=count_val)
+            model.save(using=self.database)
 
-                count_val = len(features.split(';')) if len(features) else 0
-                model, _ = emg_models.GenomeAntiSmashGCCounts.objects \
-                    .using(self.database) \
-                    .get_or_create(genome=genome, antismash_genecluster=as_cluster,
-                                   genome_count=count_val)
-                model.save(using=self.database)
-
-            logger.info(
-                'Loaded Genome AntiSMASH geneclusters for {}'.format(genome.accession))
+        logger.info(
+            'Loaded Genome AntiSMASH geneclusters for {}'.format(genome.accession))
 
     def upload_genome_files(self, genome, has_pangenome):
         logger.info('Uploading genome files...')
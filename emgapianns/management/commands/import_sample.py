@@ -74,6 +74,7 @@ class Command(BaseCommand):
         sample = self.create_or_update_sample(ena_db_model, api_sample_data)
         self.tag_sample_anns(sample, api_sample_data)
         self.tag_study(sample)
+        emg_models.refresh_biome_ancestors(samples=[sample.pk], using=self.emg_db)
 
     @staticmethod
     def fetch_sample_api(accession):
@@ -56,6 +56,8 @@ class Command(BaseCommand):
                             help='Target emg_db_name alias',
                             choices=['default', 'dev', 'prod'],
                             default='default')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes parsing the analyses result files.')
         parser.set_defaults(no_study_summary=False)
 
     def handle(self, *args, **options):
@@ -68,5 +70,6 @@ class Command(BaseCommand):
         nfs_public_rootpath = os.path.abspath(options['nfs_public_rootpath'])
 
         gen = StudySummaryGenerator(accession=study_accession, pipeline=pipeline, rootpath=rootpath,
-                                    nfs_public_rootpath=nfs_public_rootpath, database=database)
+                                    nfs_public_rootpath=nfs_public_rootpath, database=database,
+                                    workers=options['workers'])
         gen.run()
@@ -17,6 +17,10 @@
 import os
 import csv
 import logging
+import operator
+
+import mongoengine
+from pymongo.errors import BulkWriteError
 
 from emgapianns import models as m_models
 
@@ -37,6 +41,11 @@ class Command(EMGBaseCommand):
         self.kegg_pathway_suffix = ['.kegg_pathways']
         self.joined_suffixes = self.suffixes + self.kegg_pathway_suffix
 
+    # accessions per $in query
+    LOOKUP_BATCH_SIZE = 5000
+    # duplicate key, the entity was created by another import
+    DUPLICATE_KEY_ERROR = 11000
+
     def add_arguments(self, parser):
         super(Command, self).add_arguments(parser)
         parser.add_argument('suffix', nargs='?', type=str, default='.go_slim', choices=self.joined_suffixes,
@@ -100,188 +109,147 @@ class Command(EMGBaseCommand):
         else:
             logger.warning("Suffix {} not accepted!".format(self.suffix))
 
-    def load_go_from_summary_file(self, reader, obj):  # noqa
-        try:
-            run = m_models.AnalysisJobGoTerm.objects \
-                .get(pk=str(obj.job_id))
-        except m_models.AnalysisJobGoTerm.DoesNotExist:
-            run = m_models.AnalysisJobGoTerm()
-        run.analysis_id = str(obj.job_id)
-        run.accession = obj.accession
-        run.pipeline_version = obj.pipeline.release_version
-        run.job_id = obj.job_id
-        new_anns = []
-        anns = []
-        if self.suffix == '.go':
-            run.go_terms = []
-        if self.suffix == '.go_slim':
-            run.go_slim = []
-        for row in reader:
+    def get_or_create_entities(self, entity_model, entries):
+        """Annotation entities by accession.
+        entries maps the accessions to the fields of the entities to
+        create if missing. The existing ones are fetched with one $in query
+        per batch, the missing ones created with one insert.
+        """
+        accessions = list(entries)
+        entities = {}
+        for i in range(0, len(accessions), self.LOOKUP_BATCH_SIZE):
+            batch = accessions[i:i + self.LOOKUP_BATCH_SIZE]
+            for entity in entity_model.objects(pk__in=batch):
+                entities[entity.pk] = entity
+
+        new_entities = [
+            entity_model(accession=accession, **entries[accession])
+            for accession in accessions if accession not in entities
+        ]
+        if new_entities:
             try:
-                row[0].lower().startswith('go:')
-            except KeyError:
-                pass
-            else:
-                ann = None
-                try:
-                    ann = m_models.GoTerm.objects.get(accession=row[0])
-                except m_models.GoTerm.DoesNotExist:
-                    ann = m_models.GoTerm(
-                        accession=row[0],
-                        description=row[1],
-                        lineage=row[2],
-                    )
-                    new_anns.append(ann)
-                if ann is not None:
-                    anns.append(ann)
-                    if self.suffix == '.go_slim':
-                        rann = m_models.AnalysisJobGoTermAnnotation(
-                            count=row[3],
-                            go_term=ann
-                        )
-                        run.go_slim.append(rann)
-                    elif self.suffix == '.go':
-                        rann = m_models.AnalysisJobGoTermAnnotation(
-                            count=row[3],
-                            go_term=ann
-                        )
-                        run.go_terms.append(rann)
-        if len(anns) > 0:
+                entity_model._get_collection().insert_many(
+                    [entity.to_mongo() for entity in new_entities],
+                    ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if any(error['code'] != self.DUPLICATE_KEY_ERROR
+                       for error in errors):
+                    raise
+            logger.info('Created {} new {} entries'.format(
+                len(new_entities), entity_model.__name__))
+            for entity in new_entities:
+                entities[entity.pk] = entity
+        return entities
+
+    @staticmethod
+    def save_analysis(analysis_model, obj, **fields):
+        """Create or update the analysis document in one write,
+        the other annotation fields of the document are kept.
+        The sorted list fields are sorted as save() would.
+        """
+        updates = {}
+        for name, value in fields.items():
+            field = analysis_model._fields[name]
+            if isinstance(field, mongoengine.SortedListField) and field._ordering:
+                value = sorted(value, key=operator.itemgetter(field._ordering),
+                               reverse=field._order_reverse)
+            updates['set__' + name] = value
+        analysis_model.objects(pk=str(obj.job_id)).update_one(
+            upsert=True,
+            set__accession=obj.accession,
+            set__pipeline_version=obj.pipeline.release_version,
+            set__job_id=obj.job_id,
+            **updates)
+
+    def load_go_from_summary_file(self, reader, obj):  # noqa
+        rows = list(reader)
+        entities = self.get_or_create_entities(m_models.GoTerm, {
+            row[0]: {'description': row[1], 'lineage': row[2]}
+            for row in rows
+        })
+        annotations = [
+            m_models.AnalysisJobGoTermAnnotation(
+                count=int(row[3]),
+                go_term=entities[row[0]]
+            ) for row in rows
+        ]
+        if len(annotations) > 0:
             logger.info(
                 "Total %d Annotations for Run: %s" % (
-                    len(anns), obj.accession))
-            if len(new_anns) > 0:
-                m_models.GoTerm.objects.insert(new_anns)
-                logger.info(
-                    "Created %d new GoTerm Annotations" % len(new_anns))
-            if len(run.go_slim) > 0:
-                logger.info("Go slim %d" % len(run.go_slim))
-            if len(run.go_terms) > 0:
-                logger.info("Go terms %d" % len(run.go_terms))
-            run.save()
-            logger.info("Saved Run %r" % run)
+                    len(annotations), obj.accession))
+            if self.suffix == '.go_slim':
+                logger.info("Go slim %d" % len(annotations))
+                self.save_analysis(m_models.AnalysisJobGoTerm, obj,
+                                   go_slim=annotations)
+            elif self.suffix == '.go':
+                logger.info("Go terms %d" % len(annotations))
+                self.save_analysis(m_models.AnalysisJobGoTerm, obj,
+                                   go_terms=annotations)
+            logger.info("Saved Run %s" % obj.accession)
 
     def load_ipr_from_summary_file(self, reader, obj):  # noqa
-        try:
-            run = m_models.AnalysisJobInterproIdentifier.objects.get(
-                pk=str(obj.job_id))
-        except m_models.AnalysisJobInterproIdentifier.DoesNotExist:
-            run = m_models.AnalysisJobInterproIdentifier()
-        run.analysis_id = str(obj.job_id)
-        run.accession = obj.accession
         version = obj.pipeline.release_version
-        run.pipeline_version = version
-        run.job_id = obj.job_id
-        run.interpro_identifiers = []
-        new_anns = []
-        anns = []
-        for row in reader:
-            try:
-                row[0].lower().startswith('ipr')
-            except KeyError:
-                pass
-            else:
-                ann = None
-                try:
-                    ann = m_models.InterproIdentifier.objects \
-                        .get(accession=row[0])
-                except m_models.InterproIdentifier.DoesNotExist:
-                    ann = m_models.InterproIdentifier(
-                        accession=row[0],
-                        description=row[1],
-                    )
-                    new_anns.append(ann)
-                if ann is not None:
-                    anns.append(ann)
-                    if self.suffix in ['.ipr']:
-                        rann = m_models.AnalysisJobInterproIdentifierAnnotation(  # NOQA
-                            count=row[2],
-                            interpro_identifier=ann
-                        )
-                        run.interpro_identifiers.append(rann)
-        if len(anns) > 0:
+        rows = list(reader)
+        entities = self.get_or_create_entities(
+            m_models.InterproIdentifier,
+            {row[0]: {'description': row[1]} for row in rows})
+        annotations = [
+            m_models.AnalysisJobInterproIdentifierAnnotation(
+                count=int(row[2]),
+                interpro_identifier=entities[row[0]]
+            ) for row in rows
+        ]
+        if len(annotations) > 0:
             logger.info(
                 "Total %d Annotations for Run: %s %s" % (
-                    len(anns), obj.accession, version))
-            if len(new_anns) > 0:
-                m_models.InterproIdentifier.objects.insert(new_anns)
-                logger.info(
-                    "Created %d new IPR Annotations" % len(new_anns))
-            if len(run.interpro_identifiers) > 0:
-                logger.info(
-                    "Interpro identifiers %d" % len(run.interpro_identifiers))
-            run.save()
-            logger.info("Saved Run %r" % run)
-
-    @staticmethod
-    def load_kegg_from_summary_file(obj, summary_infile, delimiter=','):
+                    len(annotations), obj.accession, version))
+            logger.info("Interpro identifiers %d" % len(annotations))
+            self.save_analysis(m_models.AnalysisJobInterproIdentifier, obj,
+                               interpro_identifiers=annotations)
+            logger.info("Saved Run %s" % obj.accession)
+
+    def load_kegg_from_summary_file(self, obj, summary_infile,
+                                    delimiter=','):
         """Load KEGG Modules results for a job into Mongo.
         KEGG results are composed of 3 files:
             - summary file
             - matching ko per pathway
             - missing ko per pathway
         """
-        try:
-            analysis_keggs = m_models.AnalysisJobKeggModule.objects \
-                .get(pk=str(obj.job_id))
-        except m_models.AnalysisJobKeggModule.DoesNotExist:
-            analysis_keggs = m_models.AnalysisJobKeggModule()
-
-        analysis_keggs.analysis_id = str(obj.job_id)
-        analysis_keggs.accession = obj.accession
-        analysis_keggs.pipeline_version = obj.pipeline.release_version
-        analysis_keggs.job_id = obj.job_id
-
-        # drop previous annotations
-        analysis_keggs.kegg_modules = []
-
-        analysis_keggs.save()
-
-        new_kmodules = set()
-        annotations = []
-
         with open(summary_infile) as csvfile:
             reader = csv.reader(csvfile, delimiter=delimiter)
             next(reader)  # skip header
+            rows = [
+                [value.strip() if i == 0 else value
+                 for i, value in enumerate(row)]
+                for row in reader
+            ]
 
-            for accession, completeness, pathway_name, pathway_class, matching_kos, missing_kos in reader:
-                accession = accession.strip()
-                completeness = float(completeness)
-                matching_kos_list = list(filter(None, matching_kos.strip().split(',')))
-                missing_kos_list = list(filter(None, missing_kos.strip().split(',')))
-
-                k_module = None
-                try:
-                    k_module = m_models.KeggModule.objects \
-                        .get(accession=accession)
-                except m_models.KeggModule.DoesNotExist:
-                    k_module = m_models.KeggModule(
-                        accession=accession,
-                        name=pathway_name,
-                        description=pathway_class
-                    )
-                    new_kmodules.add(k_module)
-
-                kpann = m_models.AnalysisJobKeggModuleAnnotation(
-                    module=k_module,
-                    completeness=completeness,
-                    matching_kos=matching_kos_list,
-                    missing_kos=missing_kos_list
-                )
-                annotations.append(kpann)
-
-            if len(new_kmodules):
-                m_models.KeggModule.objects.insert(new_kmodules)
-                logger.info(
-                    'Created {} new KEGG Modules'.format(len(new_kmodules)))
-
-            if len(annotations):
-                analysis_keggs.kegg_modules.extend(annotations)
-                logger.info(
-                    'Created {} new KEGG Module Annotations'.format(len(annotations)))
-
-        analysis_keggs.save()
-        logger.info('Saved Run {analysis_keggs}')
+        k_modules = self.get_or_create_entities(m_models.KeggModule, {
+            accession: {'name': pathway_name, 'description': pathway_class}
+            for accession, _, pathway_name, pathway_class, _, _ in rows
+        })
+
+        annotations = []
+        for accession, completeness, _, _, matching_kos, missing_kos in rows:
+            annotations.append(m_models.AnalysisJobKeggModuleAnnotation(
+                module=k_modules[accession],
+                completeness=float(completeness),
+                matching_kos=list(
+                    filter(None, matching_kos.strip().split(','))),
+                missing_kos=list(
+                    filter(None, missing_kos.strip().split(',')))
+            ))
+        if len(annotations):
+            logger.info(
+                'Created {} new KEGG Module Annotations'.format(
+                    len(annotations)))
+
+        # previous annotations are replaced
+        self.save_analysis(m_models.AnalysisJobKeggModule, obj,
+                           kegg_modules=annotations)
+        logger.info('Saved Run {}'.format(obj.accession))
 
     def load_summary_file(self, reader, obj, analysis_model, analysis_field,
                           entity_model, ann_model, ann_field):
@@ -289,88 +257,39 @@ class Command(EMGBaseCommand):
         To generate this file for example:
         sed 's/\t/ /23g' KO.tbl | cut -f1,23 | sort | uniq -c
         """
-        analysis = None
-        try:
-            analysis = analysis_model.objects \
-                .get(pk=str(obj.job_id))
-        except analysis_model.DoesNotExist:
-            analysis = analysis_model()
-        analysis.analysis_id = str(obj.job_id)
-        analysis.accession = obj.accession
-        analysis.pipeline_version = obj.pipeline.release_version
-        analysis.job_id = obj.job_id
-
-        new_entities = []
-        annotations = []
-
-        # drop previous annotations
-        setattr(analysis, analysis_field, [])
-        analysis.save()
-
-        # next(reader)  # skip header
+        rows = list(reader)
+        entities = self.get_or_create_entities(entity_model, {
+            model_id: {'description': description}
+            for _, model_id, description in rows
+        })
 
-        for count, model_id, description in reader:
-            count = int(count)
-
-            new_entity = None
-            try:
-                new_entity = entity_model.objects.get(accession=model_id)
-            except entity_model.DoesNotExist:
-                new_entity = entity_model(
-                    accession=model_id,
-                    description=description
-                )
-                new_entities.append(new_entity)
-            new_annotation = ann_model(count=count)
-            setattr(new_annotation, ann_field, new_entity)
+        annotations = []
+        for count, model_id, _ in rows:
+            new_annotation = ann_model(count=int(count))
+            setattr(new_annotation, ann_field, entities[model_id])
             annotations.append(new_annotation)
 
-        if len(new_entities):
-            entity_model.objects.insert(new_entities)
-            logger.info(
-                'Created {} new entries'.format(len(new_entities)))
-
         if len(annotations):
-            setattr(analysis, analysis_field, annotations)
             logger.info(
                 'Created {} new annotations'.format(len(annotations)))
 
-        analysis.save()
+        # previous annotations are replaced
+        self.save_analysis(analysis_model, obj,
+                           **{analysis_field: annotations})
         logger.info('Saved {}'.format(analysis_field))
 
-
     def load_genome_properties(self, reader,  obj):
         """Genome properties import, using the output summary from GP
         File structure:
         "GenProp0678","C-type cytochrome biogenesis, system I","NO"|"YES"|"PARTIAL  "
         """
-        analysis_genprop = None
-        try:
-            analysis_genprop = m_models.AnalysisJobGenomeProperty.objects \
-                                                                 .get(pk=str(obj.job_id))
-        except m_models.AnalysisJobGenomeProperty.DoesNotExist:
-            analysis_genprop = m_models.AnalysisJobGenomeProperty()
-
-        analysis_genprop.analysis_id = str(obj.job_id)
-        analysis_genprop.accession = obj.accession
-        analysis_genprop.pipeline_version = obj.pipeline.release_version
-        analysis_genprop.job_id = obj.job_id
-
-        new_entities = []
-        annotations = []
-
-        for gp_id, desc, presence in reader:
-            gp = None
-            try:
-                gp = m_models.GenomeProperty.objects \
-                    .get(accession=gp_id)
-            except m_models.GenomeProperty.DoesNotExist:
-                gp = m_models.GenomeProperty(
-                    accession=gp_id,
-                    description=desc
-                )
-                new_entities.append(gp)
+        rows = list(reader)
+        entities = self.get_or_create_entities(m_models.GenomeProperty, {
+            gp_id: {'description': desc} for gp_id, desc, _ in rows
+        })
 
+        annotations = []
+        for gp_id, desc, presence in rows:
             parsed_presence = None
             upper_presence = presence.upper() if presence else None
             if upper_presence == "YES":
@@ -382,25 +301,20 @@ class Command(EMGBaseCommand):
 
             if not parsed_presence:
                 raise ValueError("Invalid 'presence' value for genome properties row: {}"
-                                 .format(" ".join(gp_id, desc, presence)))
+                                 .format(" ".join((gp_id, desc, presence))))
 
             new_annotation = m_models.AnalysisJobGenomePropAnnotation(
-                genome_property=gp,
+                genome_property=entities[gp_id],
                 presence=parsed_presence
             )
             annotations.append(new_annotation)
 
-        if len(new_entities):
-            m_models.GenomeProperty.objects.insert(new_entities)
-            logger.info(
-                "Created {} new genome properties".format(len(new_entities)))
-
         if len(annotations):
-            analysis_genprop.genome_properties = annotations
             logger.info(
                 "Created {} new annotations".format(len(annotations)))
 
-        analysis_genprop.save()
+        self.save_analysis(m_models.AnalysisJobGenomeProperty, obj,
+                           genome_properties=annotations)
         logger.info("Saved Analysis annnotations Genome Properties")
 
     def _parse_and_load_summary_file(self, source_file, obj):
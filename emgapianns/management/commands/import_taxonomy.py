@@ -6,6 +6,10 @@ import logging
 import os
 import re
 
+from collections import OrderedDict
+
+from pymongo import UpdateOne
+
 from emgapianns import models as m_models
 
 from ..lib import EMGBaseCommand
@@ -29,6 +33,68 @@ ORGANISM_RANK = {
 }
 
 
+class LineageResolver(object):
+    """Organisms by id (lineage|pipeline version), cached for the process.
+
+    The organisms missing from the cache are fetched with one query per
+    batch, the ones that don't exist are created with an unordered
+    bulk upsert.
+    """
+    BATCH_SIZE = 5000
+    MAX_SIZE = 200000
+
+    def __init__(self):
+        self.organisms = OrderedDict()
+
+    def clear(self):
+        self.organisms.clear()
+
+    def cache(self, organism):
+        self.organisms[organism.pk] = organism
+        self.organisms.move_to_end(organism.pk)
+        while len(self.organisms) > self.MAX_SIZE:
+            self.organisms.popitem(last=False)
+
+    def resolve(self, candidates):
+        """Organisms of the candidates (organisms by id), the existing
+        organism is returned if there is one.
+        """
+        organisms = {}
+        missing = []
+        for pk in candidates:
+            if pk in self.organisms:
+                self.organisms.move_to_end(pk)
+                organisms[pk] = self.organisms[pk]
+            else:
+                missing.append(pk)
+
+        for i in range(0, len(missing), self.BATCH_SIZE):
+            batch = missing[i:i + self.BATCH_SIZE]
+            for organism in m_models.Organism.objects(pk__in=batch):
+                organisms[organism.pk] = organism
+                self.cache(organism)
+
+        new_orgs = [candidates[pk] for pk in missing if pk not in organisms]
+        if new_orgs:
+            requests = []
+            for organism in new_orgs:
+                document = organism.to_mongo()
+                document.pop('_id')
+                requests.append(UpdateOne(
+                    {'_id': organism.pk}, {'$setOnInsert': document},
+                    upsert=True))
+            m_models.Organism._get_collection().bulk_write(
+                requests, ordered=False)
+            logger.info('Created {} new Organisms'.format(len(new_orgs)))
+            for organism in new_orgs:
+                organisms[organism.pk] = organism
+                self.cache(organism)
+        return organisms
+
+
+lineage_resolver = LineageResolver()
+
+
 class Command(EMGBaseCommand):
 
     def add_arguments(self, parser):
@@ -120,19 +186,9 @@ class Command(EMGBaseCommand):
                 reader, ajob, 'taxonomy_its{}'.format(field))
 
     def load_organism_from_summary_file(self, reader, obj, tax):  # noqa
-        try:
-            run = m_models.AnalysisJobTaxonomy.objects \
-                .get(pk=str(obj.job_id))
-        except m_models.AnalysisJobTaxonomy.DoesNotExist:
-            run = m_models.AnalysisJobTaxonomy()
-        run.analysis_id = str(obj.job_id)
-        run.accession = obj.accession
         version = obj.pipeline.release_version
-        run.pipeline_version = version
-        run.job_id = obj.job_id
-        new_orgs = list()
-        orgs = []
-        setattr(run, tax, list())
+        rows = []
+        candidates = {}
         for row in reader:
             if len(row) < 1:
                 continue
@@ -175,39 +231,31 @@ class Command(EMGBaseCommand):
                     lineage = ['Unusigned']
                     hierarchy = {}
                     domain = None
-            organism = None
-            try:
-                organism = m_models.Organism.objects.get(
-                    lineage=":".join(lineage), rank=rank,
-                    pipeline_version=version
-                )
-            except m_models.Organism.DoesNotExist:
-                #  TODO https://github.com/MongoEngine/mongoengine/issues/1685
-                pk = "%s|%s" % (":".join(lineage), version)
-                organism = m_models.Organism(
+            #  TODO https://github.com/MongoEngine/mongoengine/issues/1685
+            pk = "%s|%s" % (":".join(lineage), version)
+            if pk not in candidates:
+                candidates[pk] = m_models.Organism(
                     id=pk,
                     lineage=":".join(lineage), name=name, parent=parent,
                     ancestors=ancestors, hierarchy=hierarchy,
                     rank=rank, pipeline_version=version, domain=domain
                 )
-                new_orgs.append(organism)
-
-            if organism is not None:
-                orgs.append(organism)
-                rorg = m_models.AnalysisJobOrganism(
-                    count=count,
-                    organism=organism
-                )
-                t = getattr(run, tax, list())
-                t.append(rorg)
-                setattr(run, tax, t)
+            rows.append((count, pk))
 
-        if len(orgs) > 0:
+        if len(rows) > 0:
             logger.info(
-                'Total {} Organisms for Run: {} {} {}'.format(len(orgs), obj.accession, version, tax))
-            if len(new_orgs) > 0:
-                m_models.Organism.objects.insert(new_orgs)
-                logger.info(
-                    'Created {} new Organisms'.format(len(new_orgs)))
-            run.save()
-            logger.info('Saved Run {}'.format(run))
+                'Total {} Organisms for Run: {} {} {}'.format(len(rows), obj.accession, version, tax))
+            organisms = lineage_resolver.resolve(candidates)
+            annotations = [
+                m_models.AnalysisJobOrganism(
+                    count=int(count),
+                    organism=organisms[pk]
+                ) for count, pk in rows
+            ]
+            m_models.AnalysisJobTaxonomy.objects(pk=str(obj.job_id)).update_one(
+                upsert=True,
+                set__accession=obj.accession,
+                set__pipeline_version=version,
+                set__job_id=obj.job_id,
+                **{'set__' + tax: annotations})
+            logger.info('Saved Run {} {}'.format(obj.accession, tax))
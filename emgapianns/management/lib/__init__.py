@@ -9,6 +9,7 @@ import csv
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 from emgapi import models as emg_models
+from emgcli import cache as response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +50,11 @@ class EMGBaseCommand(BaseCommand):
         logger.info("CLI %r" % options)
         self.find_accession(options)
         self.populate_from_accession(options)
+        self.purge_cached_responses()
+
+    def purge_cached_responses(self):
+        for job in self.obj_list:
+            response_cache.purge(*response_cache.analysis_tags(job))
 
     def find_accession(self, options):
         self.accession = options.get('accession', None)
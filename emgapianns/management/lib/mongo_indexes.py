@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def stale_unique_indexes(document):
+    """Names of the unique indexes of the document collection that are not
+    defined on the document (i.e. unique_with changed), they are not
+    replaced by ensure_indexes() and reject valid documents.
+    """
+    required = [
+        spec['fields'] for spec in document._meta['index_specs']
+        if spec.get('unique')
+    ]
+    return [
+        name for name, info in document._get_collection().index_information().items()
+        if info.get('unique') and info['key'] not in required
+    ]
+
+
+def update_indexes(document, dry_run=False):
+    """Drop the stale unique indexes of the document collection and create
+    the missing ones.
+    Returns the names of the dropped indexes and the keys of the missing ones.
+    """
+    collection = document._get_collection()
+    stale = stale_unique_indexes(document)
+    missing = document.compare_indexes()['missing']
+    if dry_run:
+        return stale, missing
+    for name in stale:
+        logger.info('Dropping index {} of {}'.format(name, collection.name))
+        collection.drop_index(name)
+    if missing:
+        logger.info('Creating {} indexes of {}'.format(len(missing), collection.name))
+    document.ensure_indexes()
+    return stale, missing
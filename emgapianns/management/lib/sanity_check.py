@@ -1,19 +1,48 @@
+import fnmatch
 import glob
 import os
-from subprocess import check_output, CalledProcessError
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
 
 import logging
 
 from emgapianns.management.lib.uploader_exceptions import NoAnnotationsFoundException, \
     UnexpectedLibraryStrategyException, QCNotPassedException, CoverageCheckException
-from emgapianns.management.lib import utils
+from emgapianns.management.lib import sequence_counts, utils
 from emgapianns.management.webuploader_configs import get_downloadset_config
 from backlog import models as backlog_models
 
 logger = logging.getLogger(__name__)
 BACKLOG_CONFIG = os.environ.get('BACKLOG_CONFIG')
 
+# threads counting the content of the result files
+CHECK_WORKERS = 8
+
+SEQUENCES = 'sequences'
+LINES = 'lines'
+COMPRESSED_LINES = 'compressed_lines'
+
+# content counts by (path, size, mtime, count type), shared by the checks
+_content_counts = {}
+
+
+def count_content(filepath, count_type):
+    """
+        Counts the sequences (compressed fasta file) or lines of a file.
+    :return:
+    """
+    if count_type == SEQUENCES:
+        logging.info("Counting number of sequences for compressed file {}".format(filepath))
+        count = sequence_counts.count_fasta_records(filepath)
+        logging.info("Result: File contains {} sequences.".format(count))
+    else:
+        compressed = count_type == COMPRESSED_LINES
+        logging.info("Counting number of lines for {} file {}".format(
+            'compressed' if compressed else 'uncompressed', filepath))
+        count = sequence_counts.count_lines(filepath, compressed=compressed)
+        logging.info("Result: File contains {} lines.".format(count))
+    return count
+
 
 def get_result_status(db_name, accession):
     """
@@ -55,7 +84,8 @@ class SanityCheck:
     MIN_NUM_LINES = 3
     failed_statuses = ['no_cds', 'no_tax', 'no_qc', 'no_cds_tax']
 
-    def __init__(self, accession, d, library_strategy, version, result_status=None, emg_db='default'):
+    def __init__(self, accession, d, library_strategy, version, result_status=None, emg_db='default',
+                 workers=CHECK_WORKERS):
         self.dir = d
         self.prefix = os.path.basename(d)
         self.accession = accession
@@ -72,6 +102,9 @@ class SanityCheck:
         else:
             self.result_status = get_result_status(self.emg_db, self.accession)
         self.config = get_downloadset_config(version, library_strategy, self.result_status)
+        self.workers = workers
+        # files of the result directories: {directory: {name: (size, mtime)}}
+        self.listings = {}
 
     def check_file_existence(self):
         skip_antismash_check = False
@@ -127,43 +160,97 @@ class SanityCheck:
         else: # wgs or rna-seq
             return self.run_coverage_check_wgs()
 
-    @staticmethod
-    def __count_number_of_lines(filepath, compressed_file=False):
+    def list_dir(self, directory):
         """
-            Counts number of lines in text file.
+            Size and modification time of the files of the directory, by name.
+            The directory is scanned once.
         :return:
         """
-        if compressed_file:
-            logging.info("Counting number of lines for compressed file {}".format(filepath))
-            count = check_output("zcat {} | wc -l".format(filepath), shell=True).rstrip()
-        else:
-            logging.info("Counting number of lines for uncompressed file {}".format(filepath))
-            count = check_output("wc -l < {}".format(filepath), shell=True).rstrip()
-        logging.info("Result: File contains {} lines.".format(count))
-        return int(count)
+        listing = self.listings.get(directory)
+        if listing is None:
+            listing = {}
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat()
+                            listing[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                        except OSError:
+                            # broken link
+                            listing[entry.name] = None
+            except OSError:
+                pass
+            self.listings[directory] = listing
+        return listing
 
-    @staticmethod
-    def __count_number_of_seqs(filepath):
+    def find_files(self, filepath):
         """
-            Counts number of sequences in compressed fasta file.
+            Paths of the files matching filepath (a glob pattern), from the directory listings.
         :return:
         """
-        try:
-            logging.info("Counting number of sequences for compressed file {}".format(filepath))
-            count = check_output("zcat {} | grep -c '>'".format(filepath), shell=True).rstrip()
-            logging.info("Result: File contains {} sequences.".format(count))
-            return int(count)
-        except CalledProcessError:
+        directory, name = os.path.split(filepath)
+        if not name or glob.has_magic(directory):
+            return glob.glob(filepath)
+        listing = self.list_dir(directory)
+        if not glob.has_magic(name):
+            return [filepath] if name in listing else []
+        names = fnmatch.filter(listing, name)
+        if not name.startswith('.'):
+            # hidden files are not matched, as with glob
+            names = [n for n in names if not n.startswith('.')]
+        return [os.path.join(directory, n) for n in sorted(names)]
+
+    def __count(self, filepath, count_type):
+        """
+            Counts the content of the file, memoised by path, size and modification time.
+        :return:
+        """
+        directory, name = os.path.split(filepath)
+        stat = self.list_dir(directory).get(name)
+        if stat is None:
+            return count_content(filepath, count_type)
+        size, mtime = stat
+        if not size:
             return 0
+        key = (filepath, size, mtime, count_type)
+        count = _content_counts.get(key)
+        if count is None:
+            count = count_content(filepath, count_type)
+            _content_counts[key] = count
+        return count
 
-    def __check_chunked_file(self, file_config, coverage_check=False):
+    def __prefetch_content(self, filepaths):
+        """
+            Counts the content of the files with a pool of threads, the checks read the memoised counts.
+        :return:
+        """
+        filepaths = [f for f in filepaths if self.find_files(f)]
+        if self.workers <= 1 or len(filepaths) < 2:
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.__count, f, self.__content_type(f)) for f in filepaths]
+        for future in futures:
+            # the errors are raised by the checks
+            future.exception()
+
+    @staticmethod
+    def __content_type(filepath):
+        if "faa.gz" in filepath:
+            return SEQUENCES
+        if "I5.tsv.gz" in filepath:
+            return COMPRESSED_LINES
+        return LINES
+
+    def __chunk_filepaths(self, file_config):
         chunk_file = file_config['chunk_file']
         if '{}' in chunk_file:
             chunk_file = chunk_file.format(self.prefix)
         chunk_filepath = self.get_filepath(file_config, chunk_file)
         chunks = utils.read_chunkfile(chunk_filepath)
-        for f in chunks:
-            filepath = self.get_filepath(file_config, f)
+        return [self.get_filepath(file_config, f) for f in chunks]
+
+    def __check_chunked_file(self, file_config, coverage_check=False):
+        for filepath in self.__chunk_filepaths(file_config):
             self.__check_exists(filepath)
             if coverage_check:
                 self.__check_file_content(filepath)
@@ -175,18 +262,37 @@ class SanityCheck:
             p = [self.dir, filename]
         return os.path.join(*p)
 
-    def __check_file(self, file_config, coverage_check=False):
+    def __file_filepath(self, file_config):
         file_name = file_config['real_name']
         if '{}' in file_name:
             file_name = file_name.format(self.prefix)
-        filepath = self.get_filepath(file_config, file_name)
+        return self.get_filepath(file_config, file_name)
+
+    def __check_file(self, file_config, coverage_check=False):
+        filepath = self.__file_filepath(file_config)
         file_exists = self.__check_exists(filepath, file_config['_required'])
         if coverage_check and file_exists:
             self.__check_file_content(filepath)
 
-    @staticmethod
-    def __check_exists(filepath, required=True):
-        found_file = glob.glob(filepath)
+    def __coverage_check_filepaths(self):
+        """
+            Files of the config checked by the coverage check.
+        :return:
+        """
+        filepaths = []
+        for f in self.config:
+            if 'coverage_check' in f:
+                try:
+                    if f['_chunked']:
+                        filepaths.extend(self.__chunk_filepaths(f))
+                    else:
+                        filepaths.append(self.__file_filepath(f))
+                except FileNotFoundError:
+                    continue
+        return filepaths
+
+    def __check_exists(self, filepath, required=True):
+        found_file = self.find_files(filepath)
         if not found_file and required:
             raise FileNotFoundError('{} is missing'.format(filepath))
         return len(found_file) > 0
@@ -194,15 +300,15 @@ class SanityCheck:
     def __check_file_content(self, filepath):
         logging.info("Checking content of file {}".format(filepath))
         if "faa.gz" in filepath:
-            count = self.__count_number_of_seqs(filepath)
+            count = self.__count(filepath, SEQUENCES)
             if count >= self.MIN_NUM_SEQS:
                 return True
         if "I5.tsv.gz" in filepath:
-            num_lines = self.__count_number_of_lines(filepath, compressed_file=True)
+            num_lines = self.__count(filepath, COMPRESSED_LINES)
             if num_lines >= self.MIN_NUM_LINES:
                 return True
         else:
-            num_lines = self.__count_number_of_lines(filepath)
+            num_lines = self.__count(filepath, LINES)
             if num_lines >= self.MIN_NUM_LINES:
                 return True
         raise NoAnnotationsFoundException('No annotations found in result file:\n{}'.format(filepath))
@@ -244,6 +350,7 @@ class SanityCheck:
         if not os.path.exists(taxa_folder) and self.result_status not in ['no_tax', 'no_cds_tax']:
             raise CoverageCheckException("Could not find the taxonomy output folder: {}!".format(taxa_folder))
 
+        self.__prefetch_content(self.__coverage_check_filepaths())
         for f in self.config:
             if 'coverage_check' in f:
                 try:
@@ -276,6 +383,7 @@ class SanityCheck:
         if not os.path.exists(taxa_folder) and self.result_status not in ['no_tax', 'no_cds_tax']:
             raise CoverageCheckException("Could not find the taxonomy output folder: {}!".format(taxa_folder))
             
+        self.__prefetch_content(self.__coverage_check_filepaths())
         for f in self.config:
             if 'coverage_check' in f:
                 try:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import gzip
+import logging
+import zlib
+
+import pandas as pd
+
+# bytes read from the gzip files at once
+BUFFER_SIZE = 4 * 1024 * 1024
+# mapseq rows parsed at once
+MAPSEQ_CHUNK_SIZE = 500000
+
+
+def _count_lines_with(lines, char):
+    """Number of lines of the block (complete lines) containing char
+    """
+    total = lines.count(char)
+    starts = lines.count(b'\n' + char) + lines.startswith(char)
+    if total == starts:
+        # one char per line, at the start: the usual FASTA headers
+        return total
+    return sum(1 for line in lines.split(b'\n') if char in line)
+
+
+def count_fasta_records(filepath):
+    """Number of sequences in a gzip compressed FASTA file, the lines
+    with a '>' (as zcat | grep -c '>').
+    The file is read in blocks of BUFFER_SIZE, the count read so far is
+    returned if the file is truncated or corrupted.
+    """
+    count = 0
+    tail = b''
+    try:
+        with gzip.open(filepath, 'rb') as fasta:
+            while True:
+                block = fasta.read(BUFFER_SIZE)
+                if not block:
+                    break
+                block = tail + block
+                end = block.rfind(b'\n') + 1
+                count += _count_lines_with(block[:end], b'>')
+                tail = block[end:]
+    except (OSError, EOFError, zlib.error) as e:
+        logging.warning("Error reading {}: {}".format(filepath, e))
+    if b'>' in tail:
+        count += 1
+    return count
+
+
+def count_lines(filepath, compressed=False):
+    """Number of lines of a text file, gzip compressed or not
+    (as wc -l, the newlines are counted).
+    The count read so far is returned if a compressed file is truncated
+    or corrupted.
+    """
+    count = 0
+    opener = gzip.open if compressed else open
+    try:
+        with opener(filepath, 'rb') as f:
+            while True:
+                block = f.read(BUFFER_SIZE)
+                if not block:
+                    break
+                count += block.count(b'\n')
+    except (OSError, EOFError, zlib.error) as e:
+        if not compressed:
+            raise
+        logging.warning("Error reading {}: {}".format(filepath, e))
+    return count
+
+
+def count_mapseq_lineages(mapseq_file, column_name, delimiter='\t', compression='gzip', header=1):
+    """Number of sequences by lineage (the column_name column) of a mapseq
+    result file, in the order the lineages first appear in the file.
+    Sequences without lineage are not counted.
+    """
+    counts = collections.OrderedDict()
+    chunks = pd.read_csv(mapseq_file, compression=compression, header=header, sep=delimiter,
+                         usecols=[column_name], chunksize=MAPSEQ_CHUNK_SIZE)
+    for chunk in chunks:
+        lineages = chunk[column_name].dropna()
+        chunk_counts = lineages.value_counts()
+        for lineage in pd.unique(lineages):
+            counts[lineage] = counts.get(lineage, 0) + int(chunk_counts[lineage])
+    return counts
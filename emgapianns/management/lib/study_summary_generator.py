@@ -1,23 +1,34 @@
 import collections
+import contextlib
 import logging
+import multiprocessing
 import os
 import subprocess
 import sys
 from pathlib import Path
-from subprocess import check_output, CalledProcessError
 
 import numpy as np
 import pandas as pd
 from django.db.models import Q
-from django.db import close_old_connections
+from django.db import close_old_connections, connections
 
 from emgapi import models as emg_models
-from emgapianns.management.lib import utils
+from emgapianns.management.lib import sequence_counts, utils
 from emgapianns.management.lib.utils import DownloadFileDatabaseHandler
 
+# generator of the parsing processes, inherited on fork
+_generator = None
+
+
+def _parse(args):
+    """Call a parsing method of the generator in a worker process
+    """
+    method, arguments = args
+    return getattr(_generator, method)(*arguments)
+
 
 class StudySummaryGenerator(object):
-    def __init__(self, accession, pipeline, rootpath, nfs_public_rootpath, database):
+    def __init__(self, accession, pipeline, rootpath, nfs_public_rootpath, database, workers=1):
         self.study_accession = accession
         self.pipeline = pipeline
         self.rootpath = rootpath
@@ -27,6 +38,8 @@ class StudySummaryGenerator(object):
         self.study_result_dir = os.path.join(self.rootpath, self.study.result_directory)
         self.summary_dir = None
         self.MAPSEQ_COLUMN_MAPPER = {'SSU': 'SILVA', 'LSU': 'SILVA', 'unite': 'UNITE', 'itsonedb': 'ITSone'}
+        self.workers = workers
+        self.pool = None
 
     def run(self):
         if not os.path.exists(self.study_result_dir):
@@ -50,24 +63,53 @@ class StudySummaryGenerator(object):
         self.summary_dir = os.path.join(self.study_result_dir, 'version_{}/project-summary'.format(self.pipeline))
         self.create_summary_dir()
 
-        for rna_types in self.MAPSEQ_COLUMN_MAPPER.keys():
-            self.generate_taxonomy_phylum_summary(analysis_jobs, self.pipeline, '{}'.format(rna_types),
-                                                  'phylum_taxonomy_abundances_{}_v{}.tsv'.format(rna_types,
-                                                                                                 self.pipeline))
-            self.generate_taxonomy_summary(analysis_jobs, '{}'.format(rna_types),
-                                           'taxonomy_abundances_{}_v{}.tsv'.format(rna_types, self.pipeline))
+        with self.parsing_pool():
+            for rna_types in self.MAPSEQ_COLUMN_MAPPER.keys():
+                self.generate_taxonomy_phylum_summary(analysis_jobs, self.pipeline, '{}'.format(rna_types),
+                                                      'phylum_taxonomy_abundances_{}_v{}.tsv'.format(rna_types,
+                                                                                                     self.pipeline))
+                self.generate_taxonomy_summary(analysis_jobs, '{}'.format(rna_types),
+                                               'taxonomy_abundances_{}_v{}.tsv'.format(rna_types, self.pipeline))
 
-        if len(experiment_types) == 1 and 'amplicon' in experiment_types:
-            logging.info("AMPLICON datasets only! Skipping the generation of the functional matrix files!")
-        else:
-            self.generate_ipr_summary(analysis_jobs, 'IPR_abundances_v{}.tsv'.format(self.pipeline), self.pipeline)
-            self.generate_go_summary(analysis_jobs, 'slim', self.pipeline)
-            self.generate_go_summary(analysis_jobs, 'full', self.pipeline)
+            if len(experiment_types) == 1 and 'amplicon' in experiment_types:
+                logging.info("AMPLICON datasets only! Skipping the generation of the functional matrix files!")
+            else:
+                self.generate_ipr_summary(analysis_jobs, 'IPR_abundances_v{}.tsv'.format(self.pipeline), self.pipeline)
+                self.generate_go_summary(analysis_jobs, 'slim', self.pipeline)
+                self.generate_go_summary(analysis_jobs, 'full', self.pipeline)
 
         self.sync_study_summary_files()
 
         logging.info("Program finished successfully.")
 
+    @contextlib.contextmanager
+    def parsing_pool(self):
+        """Pool of processes parsing the result files of the analyses,
+        if there is more than one worker.
+        """
+        global _generator
+        if self.workers <= 1:
+            yield
+            return
+        _generator = self
+        # the processes would share the connections otherwise
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(self.workers) as pool:
+            self.pool = pool
+            try:
+                yield
+            finally:
+                self.pool = None
+
+    def parse_all(self, method, arguments):
+        """Results of the method for each tuple of arguments, in order.
+        The calls run in the pool processes if there is one, the results
+        are returned as soon as they are available.
+        """
+        if self.pool is None:
+            return (getattr(self, method)(*args) for args in arguments)
+        return self.pool.imap(_parse, ((method, args) for args in arguments))
+
     def sync_study_summary_files(self):
         logging.info("Syncing project summary files over to NFS public...")
         _study_result_dir = self.study.result_directory
@@ -155,28 +197,40 @@ class StudySummaryGenerator(object):
     def generate_taxonomy_phylum_summary_v5(self, analysis_jobs, rna_type):
         job_data_frames = dict()
         # Iterate over each run
-        for acc, result_directory in analysis_jobs.items():
-            # Define results files and for each result file perform necessary operations
-            if rna_type in ['unite', 'itsonedb']:
-                sequence_file = self.__get_rna_fasta_file(result_directory, 'ITS_masked.fasta.gz')
-            else:  # for SILVA: LSU and SSU
-                sequence_file = self.__get_rna_fasta_file(result_directory, '{}.fasta.gz'.format(rna_type))
-            if not sequence_file:
-                continue
-            num_rna_seqs = self.__count_number_of_seqs(sequence_file)
-            #
-            mapseq_result_file = self.__get_mapseq_result_file(acc, result_directory, rna_type, '.fasta.mseq.gz')
-            if not mapseq_result_file:
-                continue
-            phylum_count_data = self.__parse_phylum_counts_v5(mapseq_result_file, num_rna_seqs, rna_type)
-
-            job_df = self.__build_dataframe(phylum_count_data)
-            job_data_frames[acc] = job_df
+        results = self.parse_all('parse_phylum_counts_v5', [
+            (acc, result_directory, rna_type)
+            for acc, result_directory in analysis_jobs.items()
+        ])
+        for result in results:
+            if result is not None:
+                acc, job_df = result
+                job_data_frames[acc] = job_df
 
         study_df = self.merge_dfs_v5(job_data_frames, key=['superkingdom', 'kingdom', 'phylum'])
 
         return study_df
 
+    def parse_phylum_counts_v5(self, acc, result_directory, rna_type):
+        """Phylum counts of a run: (acc, counts data frame), None if the
+        result files are missing.
+        """
+        # Define results files and for each result file perform necessary operations
+        if rna_type in ['unite', 'itsonedb']:
+            sequence_file = self.__get_rna_fasta_file(result_directory, 'ITS_masked.fasta.gz')
+        else:  # for SILVA: LSU and SSU
+            sequence_file = self.__get_rna_fasta_file(result_directory, '{}.fasta.gz'.format(rna_type))
+        if not sequence_file:
+            return None
+        num_rna_seqs = self.__count_number_of_seqs(sequence_file)
+        #
+        mapseq_result_file = self.__get_mapseq_result_file(acc, result_directory, rna_type, '.fasta.mseq.gz')
+        if not mapseq_result_file:
+            return None
+        phylum_count_data = self.__parse_phylum_counts_v5(mapseq_result_file, num_rna_seqs, rna_type)
+
+        job_df = self.__build_dataframe(phylum_count_data)
+        return acc, job_df.filter(['superkingdom', 'kingdom', 'phylum', 'count'])
+
     def generate_taxonomy_summary(self, analysis_result_dirs, rna_type, filename):
         res_files = self.get_mapseq_result_files(analysis_result_dirs, rna_type, '.fasta.mseq.tsv')
 
@@ -203,25 +257,58 @@ class StudySummaryGenerator(object):
         return [str(p.resolve()) for p in paths]
 
     def merge_dfs_v5(self, dataframes, key):
-        study_df = pd.DataFrame(columns=key)
-
-        for accession, df in dataframes.items():
-            df = df.filter(key + ['count'])
-            df = df.rename(columns={'count': accession})
-            study_df = study_df.merge(df, on=key, how='outer')
-        study_df = study_df.sort_values(by=key)
-        study_df = self.clean_summary_df(study_df)
-        return study_df
+        frames = [(accession, df.filter(key + ['count'])) for accession, df in dataframes.items()]
+        return self.build_study_df(frames, key)
 
     def merge_dfs(self, filelist, delimiter, key, raw_cols, skip_rows=0):
-        study_df = pd.DataFrame(columns=key)
-
-        for f in sorted(filelist):
-            accession = utils.get_accession_from_result_dir_path(f)
-            df = self.read_count_tsv(f, delimiter, raw_cols, skip_rows)
-            df = df.filter(key + ['count'])
-            df = df.rename(columns={'count': accession})
-            study_df = study_df.merge(df, on=key, how='outer')
+        frames = list(self.parse_all('read_counts',
+                                     [(f, delimiter, key, raw_cols, skip_rows) for f in sorted(filelist)]))
+        return self.build_study_df(frames, key)
+
+    def read_counts(self, filename, delimiter, key, raw_cols, skip_rows=0):
+        """Counts of an analysis result file: (accession, key and count columns)
+        """
+        accession = utils.get_accession_from_result_dir_path(filename)
+        df = self.read_count_tsv(filename, delimiter, raw_cols, skip_rows)
+        return accession, df.filter(key + ['count'])
+
+    @staticmethod
+    def _is_pivotable(frames, key):
+        """The counts can be pivoted if the analyses and the keys of each
+        analysis are unique and there are no missing keys.
+        """
+        accessions = [accession for accession, _ in frames]
+        if len(set(accessions)) != len(accessions):
+            return False
+        if not any(len(df.index) for _, df in frames):
+            return False
+        for _, df in frames:
+            if df[key].isnull().values.any() or df.duplicated(subset=key).any():
+                return False
+        return True
+
+    def build_study_df(self, frames, key):
+        """Study matrix of the (accession, counts) frames: the key columns
+        and one count column per analysis.
+        The counts are concatenated in long format and pivoted in one step,
+        the unusual inputs (duplicated or missing keys) are merged one
+        analysis at a time.
+        """
+        if frames and self._is_pivotable(frames, key):
+            accessions = [accession for accession, _ in frames]
+            long_df = pd.concat([df.assign(_accession=accession) for accession, df in frames],
+                                ignore_index=True)
+            study_df = long_df.set_index(key + ['_accession'])['count'].unstack('_accession')
+            # analyses without counts are kept as empty columns
+            study_df = study_df.reindex(columns=accessions)
+            study_df.columns.name = None
+            study_df = study_df.reset_index()
+            study_df = study_df.astype({k: 'object' for k in key})
+        else:
+            study_df = pd.DataFrame(columns=key)
+            for accession, df in frames:
+                df = df.rename(columns={'count': accession})
+                study_df = study_df.merge(df, on=key, how='outer')
         study_df = study_df.sort_values(by=key)
         study_df = self.clean_summary_df(study_df)
         return study_df
@@ -238,21 +325,20 @@ class StudySummaryGenerator(object):
         unassigned = 'Unassigned'
         # column header keywords: UNITE, ITSone, SILVA
         column_name = self.MAPSEQ_COLUMN_MAPPER.get(rna_type)
-        # Fixme: Replace pandas dataframe read csv function by pure python and introduce buffered reading
-        df = pd.read_csv(mapseq_file, compression=compression, header=header, sep=delimiter)
-        filtered_df = df.dropna(subset=[column_name])
-        taxonomies = list()
-        for i, row in filtered_df.iterrows():
-            value = filtered_df.at[i, column_name]
+        lineages = sequence_counts.count_mapseq_lineages(mapseq_file, column_name, delimiter=delimiter,
+                                                         compression=compression, header=header)
+        # the distinct lineages are truncated to the phylum, in order of appearance
+        taxonomies = collections.Counter()
+        for value, count in lineages.items():
             index = value.find(";c__")
             if index > 0:
                 value = value[0:index]
             value = self.normalize_taxa_hierarchy(value)
-            taxonomies.append(value)
+            taxonomies[value] += count
 
         counter = 1
         data = dict()
-        for phylum, count in collections.Counter(taxonomies).items():
+        for phylum, count in taxonomies.items():
             new_columns = phylum.split(';')
             while len(new_columns) < 3:
                 new_columns.append(unassigned)
@@ -260,7 +346,7 @@ class StudySummaryGenerator(object):
             data[counter] = new_columns
             counter += 1
 
-        num_assigned_seqs = filtered_df[column_name].count()
+        num_assigned_seqs = sum(lineages.values())
         num_unassigned_seqs = num_rna_seqs - num_assigned_seqs
         if num_unassigned_seqs > 0:
             data[counter] = [unassigned, unassigned, unassigned, num_unassigned_seqs]
@@ -503,11 +589,7 @@ class StudySummaryGenerator(object):
             Counts number of sequences in compressed fasta file.
         :return:
         """
-        try:
-            count = check_output("zcat {} | grep -c '>'".format(filepath), shell=True).rstrip()
-            return int(count)
-        except CalledProcessError:
-            return 0
+        return sequence_counts.count_fasta_records(filepath)
 
     @staticmethod
     def __build_dataframe(data):
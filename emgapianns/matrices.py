@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Study abundance matrices (annotations x analyses) built from Mongo.
+
+The counts of every analysis of the study are aggregated by annotation
+with one aggregation on the analyses annotations collection. The full
+matrix is cached, keyed by the study, pipeline version and the analyses
+(with their completion time), the columns the user can access or asked
+for are selected from it.
+"""
+
+import datetime
+import hashlib
+import logging
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import models as m_models
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'emg:matrix:'
+
+MatrixSource = namedtuple(
+    'MatrixSource', ['document', 'field', 'reference', 'annotation', 'type'])
+
+TAXONOMY = 'OTU table'
+FUNCTION = 'Function table'
+
+MATRICES = {
+    'taxonomy': MatrixSource(
+        m_models.AnalysisJobTaxonomy, 'taxonomy', 'organism',
+        m_models.Organism, TAXONOMY),
+    'taxonomy-ssu': MatrixSource(
+        m_models.AnalysisJobTaxonomy, 'taxonomy_ssu', 'organism',
+        m_models.Organism, TAXONOMY),
+    'taxonomy-lsu': MatrixSource(
+        m_models.AnalysisJobTaxonomy, 'taxonomy_lsu', 'organism',
+        m_models.Organism, TAXONOMY),
+    'taxonomy-itsonedb': MatrixSource(
+        m_models.AnalysisJobTaxonomy, 'taxonomy_itsonedb', 'organism',
+        m_models.Organism, TAXONOMY),
+    'taxonomy-unite': MatrixSource(
+        m_models.AnalysisJobTaxonomy, 'taxonomy_itsunite', 'organism',
+        m_models.Organism, TAXONOMY),
+    'go-terms': MatrixSource(
+        m_models.AnalysisJobGoTerm, 'go_terms', 'go_term',
+        m_models.GoTerm, FUNCTION),
+    'go-slim': MatrixSource(
+        m_models.AnalysisJobGoTerm, 'go_slim', 'go_term',
+        m_models.GoTerm, FUNCTION),
+    'interpro-identifiers': MatrixSource(
+        m_models.AnalysisJobInterproIdentifier, 'interpro_identifiers',
+        'interpro_identifier', m_models.InterproIdentifier, FUNCTION),
+}
+
+
+def annotation_metadata(source, ids):
+    """Metadata of the rows, by annotation id.
+    """
+    metadata = {}
+    if source.annotation is m_models.Organism:
+        organisms = m_models.Organism.objects(pk__in=ids) \
+            .only('id', 'lineage', 'name', 'rank')
+        for organism in organisms:
+            metadata[organism.pk] = {
+                'taxonomy': organism.lineage.split(':'),
+                'name': organism.name,
+                'rank': organism.rank,
+            }
+    else:
+        fields = ['accession', 'description']
+        if source.annotation is m_models.GoTerm:
+            fields.append('lineage')
+        for annotation in source.annotation.objects(pk__in=ids).only(*fields):
+            metadata[annotation.pk] = {
+                f: getattr(annotation, f) for f in fields[1:]}
+    return metadata
+
+
+def aggregate(source, job_ids):
+    """Rows of the matrix for the analyses: (annotation id, metadata,
+    [(job id, count), ...]), sorted by annotation id.
+    """
+    collection = source.document._get_collection()
+    field = source.document._fields[source.field].db_field
+    embedded = source.document._fields[source.field].field.document_type
+    reference = embedded._fields[source.reference].db_field
+    count = embedded._fields['count'].db_field
+    pipeline = [
+        {'$match': {'_id': {'$in': [str(j) for j in job_ids]}}},
+        {'$project': {field: 1}},
+        {'$unwind': '$' + field},
+        {'$group': {
+            '_id': '$' + field + '.' + reference,
+            'counts': {'$push': {
+                'job': '$_id',
+                'count': '$' + field + '.' + count,
+            }},
+        }},
+    ]
+    groups = {}
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        groups[group['_id']] = [
+            (int(c['job']), c['count']) for c in group['counts']]
+
+    metadata = annotation_metadata(source, list(groups))
+    return [
+        (annotation_id, metadata.get(annotation_id, {}),
+         groups[annotation_id])
+        for annotation_id in sorted(groups)
+    ]
+
+
+def cache_key(study, release_version, matrix, jobs):
+    key = hashlib.sha1()
+    for job_id, complete_time in sorted(jobs):
+        key.update('{}:{}|'.format(job_id, complete_time).encode())
+    return '{}{}:{}:{}:{}'.format(
+        CACHE_KEY_PREFIX, study.pk, release_version, matrix,
+        key.hexdigest())
+
+
+def study_rows(study, release_version, matrix, jobs):
+    """Rows of the matrix for all the analyses of the study, cached.
+    jobs are the (job id, complete time) of the analyses.
+    """
+    source = MATRICES[matrix]
+    ttl = settings.EMG_MATRIX_CACHE_TTL
+    cache = caches[settings.EMG_MATRIX_CACHE]
+    key = cache_key(study, release_version, matrix, jobs)
+    rows = cache.get(key) if ttl else None
+    if rows is None:
+        rows = aggregate(source, [job_id for job_id, _ in jobs])
+        if ttl:
+            cache.set(key, rows, timeout=ttl)
+    return rows
+
+
+def biom(study, release_version, matrix, rows, columns, rank=None):
+    """BIOM 1.0 (JSON) sparse table of the rows for the columns.
+
+    columns are the analyses, empty rows are skipped. With rank only
+    the organisms of the rank are kept.
+    """
+    index = {job.pk: i for i, job in enumerate(columns)}
+    table_rows = []
+    data = []
+    for annotation_id, metadata, counts in rows:
+        if rank is not None and metadata.get('rank') != rank:
+            continue
+        values = sorted(
+            (index[job_id], count) for job_id, count in counts
+            if job_id in index and count)
+        if not values:
+            continue
+        row = len(table_rows)
+        table_rows.append({'id': annotation_id, 'metadata': metadata})
+        data.extend([row, column, count] for column, count in values)
+
+    return {
+        'id': '{}_{}_v{}'.format(study.accession, matrix, release_version),
+        'format': 'Biological Observation Matrix 1.0.0',
+        'format_url': 'http://biom-format.org',
+        'type': MATRICES[matrix].type,
+        'generated_by': settings.EMG_TITLE,
+        'date': datetime.datetime.utcnow().replace(microsecond=0)
+        .isoformat(),
+        'matrix_type': 'sparse',
+        'matrix_element_type': 'int',
+        'shape': [len(table_rows), len(columns)],
+        'rows': table_rows,
+        'columns': [{
+            'id': job.accession,
+            'metadata': {
+                'sample': job.sample.accession if job.sample else None,
+                'run': job.run.accession if job.run else None,
+                'assembly':
+                    job.assembly.accession if job.assembly else None,
+            },
+        } for job in columns],
+        'data': data,
+    }
@@ -392,7 +392,7 @@ class AnalysisJobContig(mongoengine.Document):
     """
 
     contig_id = mongoengine.StringField(required=True,
-                                        unique_with=['accession', 'pipeline_version'])
+                                        unique_with=['accession', 'pipeline_version', 'generation'])
 
     length = mongoengine.IntField()
     coverage = mongoengine.FloatField()
@@ -402,6 +402,9 @@ class AnalysisJobContig(mongoengine.Document):
     pipeline_version = mongoengine.StringField(required=True)
     job_id = mongoengine.IntField(required=True)
 
+    # import id of the staged imports
+    generation = mongoengine.StringField(required=False)
+
     cogs = mongoengine.EmbeddedDocumentListField(AnalysisJobCOGAnnotation, required=False)
     keggs = mongoengine.EmbeddedDocumentListField(AnalysisJobKeggOrthologAnnotation, required=False)
     gos = mongoengine.EmbeddedDocumentListField(AnalysisJobGoTermAnnotation, required=False)
@@ -427,6 +430,7 @@ class AnalysisJobContig(mongoengine.Document):
             'accession',
             'job_id',
             'pipeline_version',
+            'generation',
             'length',  # ordering
             'coverage',  # ordering
             'cogs.cog',
@@ -445,3 +449,12 @@ class AnalysisJobContig(mongoengine.Document):
             'has_kegg_module',
         ]
     }
+
+
+class AnalysisJobContigGeneration(BaseAnalysisJob):
+    """The active generation of the contigs of an analysis job,
+    None for the contigs that were not staged
+    """
+
+    generation = mongoengine.StringField(required=False)
+    updated = mongoengine.DateTimeField()
@@ -266,5 +266,6 @@ class AnalysisJobContigSerializer(m_serializers.DocumentSerializer):
             'gos',
             'interpros',
             'kegg_modules',
-            'as_geneclusters'
+            'as_geneclusters',
+            'generation'
         )
@@ -219,4 +219,8 @@ urlpatterns = [
     url(r'^v1/analyses/(?P<accession>[^/]+)/taxonomy/overview',
         m_views.AnalysisTaxonomyOverview.as_view(),
         name='analysis-taxonomy-overview'),
+    url((r'^v1/studies/(?P<accession>[^/]+)/pipelines/'
+         r'(?P<release_version>[0-9\.]+)/matrices/(?P<matrix>[a-z\-]+)$'),
+        m_views.StudyAnnotationMatrix.as_view(),
+        name='study-annotation-matrix'),
 ]
@@ -45,12 +45,14 @@ from emgapi import serializers as emg_serializers
 from emgapi import models as emg_models
 from emgapi import filters as emg_filters
 from emgapi import utils as emg_utils
+from emgapi import renderers as emg_renderers
 
 from . import serializers as m_serializers
 from . import models as m_models
 from . import pagination as m_pagination
 from . import viewsets as m_viewsets
 from . import mixins as m_mixins
+from . import matrices as m_matrices
 
 
 logger = logging.getLogger(__name__)
@@ -868,6 +870,59 @@ class AnalysisTaxonomyOverview(APIView):
         })
 
 
+class StudyAnnotationMatrix(APIView):
+    """Abundance matrix of the study analyses for a pipeline version,
+    BIOM (JSON) or TSV (`?format=tsv`).
+    """
+    renderer_classes = (
+        emg_renderers.BIOMRenderer,
+        emg_renderers.BIOMTSVRenderer,
+    )
+
+    def get(self, request, accession, release_version, matrix):
+        """
+        Retrieves the taxonomic or functional abundances of the analyses
+        of the study, an annotation per row and an analysis per column.
+        Matrices:
+        ---
+        taxonomy, taxonomy-ssu, taxonomy-lsu, taxonomy-itsonedb,
+        taxonomy-unite, go-terms, go-slim, interpro-identifiers
+        Example:
+        ---
+        `/studies/MGYS00000410/pipelines/4.1/matrices/taxonomy-ssu`
+
+        `/studies/MGYS00000410/pipelines/4.1/matrices/go-slim?format=tsv`
+
+        Filter by:
+        ---
+        `?samples=ERS1,ERS2` the analyses of the samples
+
+        `?rank=genus` the organisms of the rank
+        """
+        if matrix not in m_matrices.MATRICES:
+            raise NotFound("Matrix not found. Matrix: " + matrix)
+
+        study = get_object_or_404(
+            emg_models.Study.objects.available(request),
+            *emg_utils.study_accession_query(accession)
+        )
+        jobs = emg_models.AnalysisJob.objects \
+            .filter(study=study, pipeline__release_version=release_version) \
+            .prefetch_related(None)
+        rows = m_matrices.study_rows(
+            study, release_version, matrix,
+            list(jobs.values_list('pk', 'complete_time')))
+
+        columns = jobs.available(request).order_by('pk')
+        samples = request.GET.get('samples', None)
+        if samples:
+            columns = columns.filter(sample__accession__in=samples.split(','))
+        rank = request.GET.get('rank', None) or None
+
+        return Response(m_matrices.biom(
+            study, release_version, matrix, rows, list(columns), rank=rank))
+
+
 class OrganismAnalysisRelationshipViewSet(m_viewsets.ListReadOnlyModelViewSet):
 
     serializer_class = emg_serializers.AnalysisSerializer
@@ -1014,7 +1069,13 @@ class AnalysisContigViewSet(viewsets.ReadOnlyModelViewSet):
         if search:
             query_filter &= M_Q(contig_id__icontains=search)
 
-        identifier = M_Q(job_id=obj.job_id, pipeline_version=obj.pipeline.release_version)
+        # staged imports, only the active generation is served
+        active = m_models.AnalysisJobContigGeneration.objects(pk=str(obj.job_id)) \
+            .only('generation').first()
+        generation = active.generation if active is not None else None
+
+        identifier = M_Q(job_id=obj.job_id, pipeline_version=obj.pipeline.release_version,
+                         generation=generation)
 
         return queryset.filter(identifier & query_filter)
 
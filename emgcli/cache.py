@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Response cache for anonymous GET requests.
+
+Cached responses are tagged with the accessions in the request path (or
+with the collection if there are none). Tags are versioned, purging a tag
+changes its version so every response stored with the previous one is
+ignored. The import commands purge the tags of the objects they touch,
+saving or deleting a study, sample, run, assembly, analysis or genome
+(i.e. in the admin) purges its tags (see emgapi.signals).
+The tag versions are read before the view renders the response, a purge
+during the rendering makes the stored response stale.
+"""
+
+import hashlib
+import logging
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'emg:rsp:'
+TAG_PREFIX = 'emg:tag:'
+
+ACCESSION_REGEX = re.compile(
+    r'^(MGY[SAGP]\d+|[EDS]R[PSRZX]\d+|PRJ[EDN][A-Z]\d+|SAM[EDN][A-Z]*\d+|'
+    r'GCA_\d+(\.\d+)?)$')
+
+# Responses of the collections affected by an analysis import
+ANALYSIS_COLLECTIONS = (
+    'studies', 'samples', 'runs', 'assemblies', 'analyses',
+    'biomes', 'annotations', 'pipelines', 'experiment-types',
+)
+
+GENOME_COLLECTIONS = (
+    'genomes', 'genomeset', 'release', 'biomes', 'cogs', 'kegg-modules',
+    'kegg-classes', 'antismash-geneclusters',
+)
+
+
+def get_conf():
+    return getattr(settings, 'RESPONSE_CACHE', None) or {}
+
+
+def is_enabled():
+    return bool(get_conf())
+
+
+def get_cache():
+    return caches[get_conf().get('cache', 'default')]
+
+
+def collection_tag(name):
+    return 'collection:{}'.format(name)
+
+
+def request_tags(request):
+    """Tags for the response: the accessions in the path or the collection.
+    """
+    segments = [s for s in request.path_info.split('/') if s]
+    try:
+        # drop everything up to the API version, i.e. /v1/
+        segments = segments[segments.index('v1') + 1:]
+    except ValueError:
+        pass
+    tags = [s for s in segments if ACCESSION_REGEX.match(s)]
+    if not tags and segments:
+        tags.append(collection_tag(segments[0]))
+    return tags
+
+
+def request_key(request):
+    """Cache key from path, normalised query string and Accept header.
+    """
+    query = sorted(
+        (k, v) for k in request.GET for v in request.GET.getlist(k))
+    raw = '|'.join((
+        request.scheme,
+        request.get_host(),
+        request.path,
+        '&'.join('{}={}'.format(k, v) for k, v in query),
+        request.META.get('HTTP_ACCEPT', ''),
+    ))
+    return KEY_PREFIX + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def is_cacheable_request(request):
+    if request.method != 'GET':
+        return False
+    # only anonymous requests
+    if 'HTTP_AUTHORIZATION' in request.META:
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    return True
+
+
+def is_cacheable_response(response):
+    if response.status_code != 200 or response.streaming:
+        return False
+    if response.cookies:
+        return False
+    cache_control = response.get('Cache-Control', '')
+    if 'private' in cache_control or 'no-store' in cache_control:
+        return False
+    return True
+
+
+def _tag_versions(cache, tags, create=False):
+    """Current version of each tag, missing tags are created if `create`.
+    """
+    found = cache.get_many([TAG_PREFIX + t for t in tags])
+    versions = {t: found[TAG_PREFIX + t]
+                for t in tags if TAG_PREFIX + t in found}
+    if create:
+        for tag in tags:
+            if tag not in versions:
+                version = uuid.uuid4().hex
+                # another process could have set it in the meantime
+                if not cache.add(TAG_PREFIX + tag, version, timeout=None):
+                    version = cache.get(TAG_PREFIX + tag)
+                versions[tag] = version
+    return versions
+
+
+def get_response(request):
+    """Cached response for the request, None if missing or stale.
+    """
+    cache = get_cache()
+    entry = cache.get(request_key(request))
+    if entry is None:
+        return None
+    if _tag_versions(cache, list(entry['versions'])) != entry['versions']:
+        return None
+    response = HttpResponse(
+        content=entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+def request_versions(request):
+    """Current version of the request tags, to be read before the response
+    is rendered.
+    """
+    return _tag_versions(get_cache(), request_tags(request), create=True)
+
+
+def set_response(request, response, versions):
+    """Store the response, versions are the request_versions() read
+    before it was rendered.
+    """
+    cache = get_cache()
+    entry = {
+        'versions': versions,
+        'content': response.content,
+        'status': response.status_code,
+        'headers': list(response.items()),
+    }
+    cache.set(request_key(request), entry,
+              timeout=get_conf().get('timeout', 3600))
+
+
+def purge(*tags):
+    """Invalidate every response tagged with any of the tags.
+    """
+    tags = [t for t in tags if t]
+    if not is_enabled() or not tags:
+        return
+    logger.info("Purging cached responses tagged %r", tags)
+    get_cache().set_many(
+        {TAG_PREFIX + t: uuid.uuid4().hex for t in tags}, timeout=None)
+
+
+def study_tags(study):
+    return [study.accession, study.secondary_accession, study.project_id]
+
+
+def analysis_tags(job):
+    tags = [job.accession]
+    if job.study_id:
+        tags.extend(study_tags(job.study))
+    if job.sample_id:
+        tags.append(job.sample.accession)
+    if job.run_id:
+        tags.append(job.run.accession)
+    if job.assembly_id:
+        tags.append(job.assembly.accession)
+    tags.extend(collection_tag(c) for c in ANALYSIS_COLLECTIONS)
+    return tags
+
+
+def sample_tags(sample):
+    return [sample.accession, sample.primary_accession,
+            collection_tag('samples')]
+
+
+def run_tags(run):
+    return [run.accession, run.secondary_accession, collection_tag('runs')]
+
+
+def assembly_tags(assembly):
+    return [assembly.accession, assembly.wgs_accession,
+            assembly.legacy_accession, collection_tag('assemblies')]
+
+
+def genome_tags(genome):
+    return [genome.accession] + \
+        [collection_tag(c) for c in GENOME_COLLECTIONS]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import random
+import time
+
+from asgiref.local import Local
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Request scoped routing state, set by emgcli.middleware.ReadReplicaMiddleware
+_state = Local()
+
+# alias -> timestamp until which the replica is considered unhealthy
+_unhealthy = {}
+
+
+def get_replicas():
+    """Configured read replica aliases, only those present in DATABASES.
+    """
+    return [r for r in getattr(settings, 'DATABASE_READ_REPLICAS', [])
+            if r in settings.DATABASES]
+
+
+def mark_unhealthy(alias, cooldown=None):
+    """Take a replica out of rotation for `cooldown` seconds.
+    """
+    if cooldown is None:
+        cooldown = getattr(settings, 'DATABASE_REPLICA_COOLDOWN', 30)
+    logger.warning("Read replica %s marked as unhealthy for %ss",
+                   alias, cooldown)
+    _unhealthy[alias] = time.monotonic() + cooldown
+
+
+def is_healthy(alias):
+    until = _unhealthy.get(alias)
+    if until is None:
+        return True
+    if until <= time.monotonic():
+        _unhealthy.pop(alias, None)
+        return True
+    return False
+
+
+def _probe(alias):
+    """Make sure the replica accepts connections, re-using the persistent
+    connection if there is one already.
+    """
+    try:
+        connections[alias].ensure_connection()
+    except Exception:
+        logger.exception("Read replica %s not available", alias)
+        mark_unhealthy(alias)
+        return False
+    return True
+
+
+def choose_replica():
+    """Pick a healthy replica at random, None if all of them are down.
+    """
+    candidates = [r for r in get_replicas() if is_healthy(r)]
+    random.shuffle(candidates)
+    for alias in candidates:
+        if _probe(alias):
+            return alias
+    return None
+
+
+def start_request(pinned=False):
+    """Enable replica reads for the current request.
+    """
+    _state.replica = None if pinned else choose_replica()
+    _state.pinned = pinned
+
+
+def end_request():
+    _state.replica = None
+    _state.pinned = False
+
+
+def pin_to_primary():
+    """Send every following query of the current request to the primary.
+    """
+    _state.pinned = True
+
+
+def current_replica():
+    if getattr(_state, 'pinned', False):
+        return None
+    return getattr(_state, 'replica', None)
+
+
+class ReadReplicaRouter(object):
+    """Route the reads of read-only API requests to a replica.
+
+    Outside of a request (i.e. management commands and importers) or when
+    the request has been pinned to the primary it returns None, so django
+    falls back to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        # read your own writes for the rest of the request
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        dbs = {DEFAULT_DB_ALIAS} | set(get_replicas())
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
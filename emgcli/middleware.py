@@ -1,10 +1,14 @@
 import logging
 
 from django.conf import settings
+from django.db import OperationalError
 from django.middleware.common import BrokenLinkEmailsMiddleware
 
 from django.utils.encoding import force_text
 
+from emgcli import cache as response_cache
+from emgcli import dbrouters
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -46,3 +50,64 @@ class BrokenLinkSlackMiddleware(BrokenLinkEmailsMiddleware):
 
                 slack_message(template, {'text': subject}, [attachments])
         return response
+
+
+class ReadReplicaMiddleware(object):
+    """Send the reads of safe requests to the read replicas.
+
+    Requests are pinned to the primary database when:
+    - the method is not safe (i.e. POST)
+    - the view sets `use_primary_db = True` (i.e. mydata)
+    - the request writes to the database (see ReadReplicaRouter)
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        dbrouters.start_request(
+            pinned=request.method not in self.SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            dbrouters.end_request()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if getattr(view_class, 'use_primary_db', False):
+            dbrouters.pin_to_primary()
+        return None
+
+    def process_exception(self, request, exception):
+        replica = dbrouters.current_replica()
+        if replica is not None and isinstance(exception, OperationalError):
+            dbrouters.mark_unhealthy(replica)
+        return None
+
+
+class ResponseCacheMiddleware(object):
+    """Serve anonymous GET requests from the response cache.
+    See emgcli.cache
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not response_cache.is_cacheable_request(request):
+            return self.get_response(request)
+
+        response = response_cache.get_response(request)
+        if response is not None:
+            response['X-Cache'] = 'HIT'
+            return response
+
+        # before rendering, a purge in the meantime makes the response stale
+        versions = response_cache.request_versions(request)
+        response = self.get_response(request)
+        if response_cache.is_cacheable_response(response):
+            response_cache.set_response(request, response, versions)
+            response['X-Cache'] = 'MISS'
+        return response
@@ -33,6 +33,7 @@ import warnings
 import logging
 import binascii
 import datetime
+import importlib.util
 
 from os.path import expanduser
 
@@ -276,6 +277,24 @@ try:
 except KeyError:
     raise KeyError("Config must container default database.")
 
+# Read replicas, aliases defined in databases. Read-only API requests
+# are routed to them, see emgcli.dbrouters
+try:
+    DATABASE_READ_REPLICAS = EMG_CONF['emg']['read_replicas']
+except KeyError:
+    DATABASE_READ_REPLICAS = []
+
+try:
+    DATABASE_REPLICA_COOLDOWN = EMG_CONF['emg']['read_replicas_cooldown']
+except KeyError:
+    DATABASE_REPLICA_COOLDOWN = 30
+
+if DATABASE_READ_REPLICAS:
+    DATABASE_ROUTERS = ['emgcli.dbrouters.ReadReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.http.ConditionalGetMiddleware'),
+        'emgcli.middleware.ReadReplicaMiddleware')
+
 try:
     SESSION_ENGINE = EMG_CONF['emg']['session_engine']
 except KeyError:
@@ -286,6 +305,16 @@ try:
 except KeyError:
     pass
 
+# Response cache for anonymous GET requests, see emgcli.cache
+# i.e. {'cache': 'default', 'timeout': 3600}
+try:
+    RESPONSE_CACHE = EMG_CONF['emg']['response_cache']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.http.ConditionalGetMiddleware') + 1,
+        'emgcli.middleware.ResponseCacheMiddleware')
+except KeyError:
+    RESPONSE_CACHE = None
+
 try:
     CONN_MAX_AGE = EMG_CONF['emg']['conn_max_age']
 except KeyError:
@@ -347,13 +376,14 @@ REST_FRAMEWORK = {
     ),
 
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework_json_api.renderers.JSONRenderer',
+        'emgapi.renderers.JSONAPIRenderer',
         'emgapi.renderers.DefaultJSONRenderer',
         # 'rest_framework.renderers.JSONRenderer',
         'emgapi.renderers.JSONLDRenderer',
         # 'rest_framework_xml.renderers.XMLRenderer',
         # 'rest_framework_yaml.renderers.YAMLRenderer',
         'emgapi.renderers.CSVStreamingRenderer',
+        'emgapi.renderers.NDJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 
@@ -378,6 +408,12 @@ REST_FRAMEWORK = {
 
 }
 
+# ?format=parquet, only with pyarrow installed
+if importlib.util.find_spec('pyarrow') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += (
+        'emgapi.renderers.ParquetRenderer',
+    )
+
 JSON_API_FORMAT_KEYS = 'dasherize'
 JSON_API_FORMAT_TYPES = 'dasherize'
 JSON_API_PLURALIZE_TYPES = True
@@ -396,6 +432,22 @@ try:
 except:
     EMG_DEFAULT_LIMIT = 20
 
+# objects serialized at once by the export renderers (CSV...)
+try:
+    EMG_EXPORT_CHUNK_SIZE = EMG_CONF['emg']['export_chunk_size']
+except KeyError:
+    EMG_EXPORT_CHUNK_SIZE = 1000
+
+# study abundance matrices cache, 0 disables it
+try:
+    EMG_MATRIX_CACHE_TTL = EMG_CONF['emg']['matrix_cache_ttl']
+except KeyError:
+    EMG_MATRIX_CACHE_TTL = 24 * 60 * 60
+try:
+    EMG_MATRIX_CACHE = EMG_CONF['emg']['matrix_cache']
+except KeyError:
+    EMG_MATRIX_CACHE = 'default'
+
 # Authentication backends
 try:
     AUTHENTICATION_BACKENDS = EMG_CONF['emg']['auth_backends']
@@ -548,6 +600,26 @@ try:
     EMG_BACKEND_AUTH_URL = EMG_CONF['emg']['emg_backend_auth']
 except KeyError:
     EMG_BACKEND_AUTH_URL = None
+# (connect, read) timeouts in seconds
+try:
+    EMG_BACKEND_AUTH_TIMEOUT = \
+        tuple(EMG_CONF['emg']['emg_backend_auth_timeout'])
+except KeyError:
+    EMG_BACKEND_AUTH_TIMEOUT = (3.05, 10)
+try:
+    EMG_BACKEND_AUTH_POOL_SIZE = EMG_CONF['emg']['emg_backend_auth_pool']
+except KeyError:
+    EMG_BACKEND_AUTH_POOL_SIZE = 10
+# verified credentials cache, 0 disables it
+try:
+    EMG_BACKEND_AUTH_CACHE_TTL = \
+        EMG_CONF['emg']['emg_backend_auth_cache_ttl']
+except KeyError:
+    EMG_BACKEND_AUTH_CACHE_TTL = 300
+try:
+    EMG_BACKEND_AUTH_CACHE = EMG_CONF['emg']['emg_backend_auth_cache']
+except KeyError:
+    EMG_BACKEND_AUTH_CACHE = 'default'
 
 # Documentation
 try:
@@ -600,3 +672,21 @@ try:
     EBI_SEARCH_URL = EMG_CONF['emg']['ebi_search_url']
 except KeyError:
     EBI_SEARCH_URL = 'https://wwwdev.ebi.ac.uk/ebisearch/ws/rest/'
+# EBI Search downloads: pages fetched concurrently, (connect, read)
+# timeouts in seconds and retries of the failed requests
+try:
+    EMG_EBI_SEARCH_WORKERS = EMG_CONF['emg']['ebi_search_workers']
+except KeyError:
+    EMG_EBI_SEARCH_WORKERS = 4
+try:
+    EMG_EBI_SEARCH_TIMEOUT = tuple(EMG_CONF['emg']['ebi_search_timeout'])
+except KeyError:
+    EMG_EBI_SEARCH_TIMEOUT = (3.05, 30)
+try:
+    EMG_EBI_SEARCH_RETRIES = EMG_CONF['emg']['ebi_search_retries']
+except KeyError:
+    EMG_EBI_SEARCH_RETRIES = 3
+try:
+    EMG_EBI_SEARCH_BACKOFF = EMG_CONF['emg']['ebi_search_backoff']
+except KeyError:
+    EMG_EBI_SEARCH_BACKOFF = 0.5
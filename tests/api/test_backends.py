@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from django.core.cache import caches
+
+from emgapi.backends import EMGBackend
+
+
+class StubAuthHandler(BaseHTTPRequestHandler):
+    """ENA auth service stub, Webin-000/secret is valid and
+    Webin-slow takes longer than the read timeout.
+    """
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        data = json.loads(self.rfile.read(length))
+        self.server.calls.append(data['username'])
+        if data['username'] == 'Webin-slow':
+            time.sleep(1)
+        body = json.dumps({
+            'authenticated': data['username'] == 'Webin-000' and
+            data['password'] == 'secret',
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def auth_server(settings):
+    server = HTTPServer(('127.0.0.1', 0), StubAuthHandler)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.EMG_BACKEND_AUTH_URL = 'http://127.0.0.1:{}/auth'.format(
+        server.server_port)
+    settings.EMG_BACKEND_AUTH_TIMEOUT = (1, 0.2)
+    settings.EMG_BACKEND_AUTH_CACHE_TTL = 60
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'emg-test-auth-cache',
+        }
+    }
+    yield server
+    caches['default'].clear()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.django_db
+class TestEMGBackend:
+
+    def test_authenticate(self, auth_server):
+        backend = EMGBackend()
+        user = backend.authenticate(None, 'Webin-000', 'secret')
+        assert user.username == 'webin-000'
+        assert auth_server.calls == ['Webin-000']
+
+    def test_cached_credentials(self, auth_server):
+        backend = EMGBackend()
+        assert backend.authenticate(None, 'Webin-000', 'secret')
+        assert backend.authenticate(None, 'webin-000', 'secret')
+        assert auth_server.calls == ['Webin-000']
+
+    def test_invalid_credentials_not_cached(self, auth_server):
+        backend = EMGBackend()
+        assert backend.authenticate(None, 'Webin-000', 'wrong') is None
+        assert backend.authenticate(None, 'Webin-000', 'wrong') is None
+        assert backend.authenticate(None, 'Webin-000', 'secret')
+        assert auth_server.calls == ['Webin-000'] * 3
+
+    def test_cache_disabled(self, auth_server, settings):
+        settings.EMG_BACKEND_AUTH_CACHE_TTL = 0
+        backend = EMGBackend()
+        assert backend.authenticate(None, 'Webin-000', 'secret')
+        assert backend.authenticate(None, 'Webin-000', 'secret')
+        assert len(auth_server.calls) == 2
+
+    def test_timeout(self, auth_server):
+        backend = EMGBackend()
+        assert backend.authenticate(None, 'Webin-slow', 'secret') is None
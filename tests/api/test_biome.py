@@ -71,6 +71,7 @@ class TestBiomeAPI(APITestCase):
             biome=emg_models.Biome.objects.get(lineage='root'),
             samples=self.data['samples']
         )
+        emg_models.refresh_biome_ancestors()
 
     def test_biomes_list(self):
         url = reverse('emgapi_v1:biomes-list')
@@ -139,3 +140,62 @@ class TestBiomeAPI(APITestCase):
         for b in biomes:
             assert b['type'] == 'biomes'
             assert b['id'] in _expected_biomes
+
+    def test_biome_studies(self):
+        url = reverse('emgapi_v1:biomes-studies-list', args=['root:foo2'])
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        rsp = response.json()
+
+        assert len(rsp['data']) == 1
+        assert rsp['data'][0]['id'] == 'MGYS00000001'
+
+    def test_study_biomes(self):
+        url = reverse('emgapi_v1:studies-biomes-list', args=['SPR0001'])
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        rsp = response.json()
+
+        # only the biomes of the samples, not their ancestors
+        assert len(rsp['data']) == 6
+        for b in rsp['data']:
+            assert b['id'] != 'root'
+
+    def test_studies_lineage_filter(self):
+        url = reverse('emgapi_v1:studies-list')
+        response = self.client.get(url, {'lineage': 'root:foo:bar'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['data']) == 1
+
+        emg_models.Sample.objects.filter(biome__lineage='root:foo:bar') \
+            .update(biome=emg_models.Biome.objects.get(lineage='root:foo2'))
+        emg_models.refresh_biome_ancestors(samples=[3])
+
+        response = self.client.get(url, {'lineage': 'root:foo:bar'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['data']) == 0
+
+    def test_studies_lineage_filter_private_sample(self):
+        emg_models.Sample.objects.filter(biome__lineage='root:foo:bar') \
+            .update(is_public=0)
+        emg_models.refresh_biome_ancestors()
+
+        url = reverse('emgapi_v1:studies-list')
+        # the study is only matched by the private sample
+        response = self.client.get(url, {'lineage': 'root:foo:bar'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['data']) == 0
+
+        response = self.client.get(url, {'lineage': 'root:foo'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['data']) == 1
+
+    def test_samples_lineage_filter(self):
+        url = reverse('emgapi_v1:samples-list')
+        response = self.client.get(url, {'lineage': 'root:foo2'})
+        assert response.status_code == status.HTTP_200_OK
+        rsp = response.json()
+
+        assert len(rsp['data']) == 3
+        for s in rsp['data']:
+            assert s['id'] in ('ERS005', 'ERS006', 'ERS007')
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from model_bakery import baker
+
+from django.urls import reverse
+
+from rest_framework import status
+
+from emgapi import models as emg_models
+
+from test_utils.emg_fixtures import *  # noqa
+
+
+@pytest.fixture
+def study_files(tmpdir, settings, study, run, pipelines):
+    settings.RESULTS_DIR = str(tmpdir)
+    sha1, _ = emg_models.ChecksumAlgorithm.objects.get_or_create(name='SHA1')
+    taxonomy = baker.make('emgapi.DownloadGroupType',
+                          group_type='Taxonomic analysis')
+    functional = baker.make('emgapi.DownloadGroupType',
+                            group_type='Functional analysis')
+    job = emg_models.AnalysisJob.objects.get(pk=1234)
+
+    contents = {}
+    downloads = [
+        ('emgapi.StudyDownload', {'study': study}, study.result_directory,
+         'SRP01234_taxonomy_abundances_v4.1.tsv', taxonomy),
+        ('emgapi.AnalysisJobDownload', {'job': job}, job.result_directory,
+         'ABC_FASTQ_SSU.fasta.gz', taxonomy),
+        ('emgapi.AnalysisJobDownload', {'job': job}, job.result_directory,
+         'ABC_FASTQ_IPR.tsv.gz', functional),
+    ]
+    for model, fk, directory, name, group_type in downloads:
+        content = os.urandom(1000 + len(contents) * 700)
+        folder = tmpdir.join(directory)
+        folder.ensure(dir=True)
+        folder.join(name).write_binary(content)
+        contents[name] = content
+        baker.make(model, realname=name, alias=name, group_type=group_type,
+                   pipeline=job.pipeline, checksum_algorithm=sha1,
+                   file_checksum='checksum-' + name, **fk)
+    # not in RESULTS_DIR
+    baker.make('emgapi.AnalysisJobDownload', job=job, realname='missing',
+               alias='missing', pipeline=job.pipeline)
+    return contents
+
+
+@pytest.mark.django_db
+class TestStudyBundle:
+
+    def url(self, accession='MGYS00001234'):
+        return reverse('emgapi_v1:studydownload-bundle', args=[accession])
+
+    def test_tar(self, client, study_files):
+        response = client.get(self.url())
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-tar'
+        assert response['Accept-Ranges'] == 'bytes'
+        content = b''.join(response.streaming_content)
+        assert len(content) == int(response['Content-Length'])
+
+        archive = tarfile.open(fileobj=io.BytesIO(content))
+        assert archive.getnames() == [
+            'MGYS00001234/manifest.tsv',
+            'MGYS00001234/MGYA00001234/ABC_FASTQ_IPR.tsv.gz',
+            'MGYS00001234/MGYA00001234/ABC_FASTQ_SSU.fasta.gz',
+            'MGYS00001234/v4.1/SRP01234_taxonomy_abundances_v4.1.tsv',
+        ]
+        for name in archive.getnames()[1:]:
+            assert archive.extractfile(name).read() == \
+                study_files[name.split('/')[-1]]
+        manifest = archive.extractfile('MGYS00001234/manifest.tsv') \
+            .read().decode().splitlines()
+        assert manifest[0] == 'path\tsize\tchecksum_algorithm\tchecksum'
+        assert manifest[1] == \
+            'MGYS00001234/MGYA00001234/ABC_FASTQ_IPR.tsv.gz\t2400\tSHA1\t' \
+            'checksum-ABC_FASTQ_IPR.tsv.gz'
+
+    def test_range(self, client, study_files):
+        response = client.get(self.url())
+        content = b''.join(response.streaming_content)
+        etag = response['ETag']
+
+        response = client.get(self.url(), HTTP_RANGE='bytes=1500-',
+                              HTTP_IF_RANGE=etag)
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response['Content-Range'] == \
+            'bytes 1500-{}/{}'.format(len(content) - 1, len(content))
+        assert b''.join(response.streaming_content) == content[1500:]
+
+        response = client.get(self.url(), HTTP_RANGE='bytes=-100')
+        assert b''.join(response.streaming_content) == content[-100:]
+
+        # stale validator, the whole archive
+        response = client.get(self.url(), HTTP_RANGE='bytes=1500-',
+                              HTTP_IF_RANGE='"stale"')
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get(
+            self.url(), HTTP_RANGE='bytes={}-'.format(len(content)))
+        assert response.status_code == \
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+        response = client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_zip_filtered(self, client, study_files):
+        response = client.get(self.url(), {
+            'archive': 'zip', 'group_type': 'Taxonomic analysis'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/zip'
+        archive = zipfile.ZipFile(
+            io.BytesIO(b''.join(response.streaming_content)))
+        assert archive.testzip() is None
+        assert archive.namelist() == [
+            'MGYS00001234/manifest.tsv',
+            'MGYS00001234/MGYA00001234/ABC_FASTQ_SSU.fasta.gz',
+            'MGYS00001234/v4.1/SRP01234_taxonomy_abundances_v4.1.tsv',
+        ]
+
+    def test_invalid_archive(self, client, study_files):
+        response = client.get(self.url(), {'archive': 'rar'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_private_study(self, client, study_private):
+        response = client.get(self.url('MGYS00000222'))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
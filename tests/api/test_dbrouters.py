@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+
+import pytest
+
+from emgapi import models as emg_models
+from emgcli import dbrouters
+
+
+@pytest.fixture
+def replica(settings, monkeypatch):
+    databases = copy.deepcopy(settings.DATABASES)
+    databases['replica'] = databases['default']
+    settings.DATABASES = databases
+    settings.DATABASE_READ_REPLICAS = ['replica']
+    monkeypatch.setattr(dbrouters, '_probe', lambda alias: True)
+    monkeypatch.setattr(dbrouters, '_unhealthy', {})
+    yield 'replica'
+    dbrouters.end_request()
+
+
+class TestReadReplicaRouter:
+
+    def test_no_request_uses_primary(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        assert router.db_for_read(emg_models.Study) is None
+
+    def test_safe_request_reads_from_replica(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        dbrouters.start_request()
+        assert router.db_for_read(emg_models.Study) == replica
+
+    def test_unsafe_request_is_pinned(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        dbrouters.start_request(pinned=True)
+        assert router.db_for_read(emg_models.Study) is None
+
+    def test_pinned_after_write(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        dbrouters.start_request()
+        assert router.db_for_read(emg_models.Study) == replica
+        assert router.db_for_write(emg_models.Study) == 'default'
+        assert router.db_for_read(emg_models.Study) is None
+
+    def test_unhealthy_replica_fails_over(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        dbrouters.mark_unhealthy(replica, cooldown=60)
+        dbrouters.start_request()
+        assert router.db_for_read(emg_models.Study) is None
+
+    def test_unhealthy_replica_comes_back(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        dbrouters.mark_unhealthy(replica, cooldown=0)
+        dbrouters.start_request()
+        assert router.db_for_read(emg_models.Study) == replica
+
+    def test_no_migrations_on_replica(self, replica):
+        router = dbrouters.ReadReplicaRouter()
+        assert router.allow_migrate(replica, 'emgapi') is False
+        assert router.allow_migrate('default', 'emgapi') is None
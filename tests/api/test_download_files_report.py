@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import os
+
+import pytest
+
+from model_bakery import baker
+
+from django.core.management import call_command
+
+from emgapi import models as emg_models
+
+from test_utils.emg_fixtures import *  # noqa
+
+
+@pytest.fixture
+def analysis_files(tmpdir, settings, study, run, pipelines):
+    settings.RESULTS_DIR = str(tmpdir)
+    job = emg_models.AnalysisJob.objects.get(pk=1234)
+    subdir = baker.make('emgapi.DownloadSubdir', subdir='taxonomy-summary/SSU')
+    folder = tmpdir.join(job.result_directory)
+    folder.ensure(dir=True)
+    folder.join('ABC_FASTQ_IPR.tsv.gz').write('ipr')
+    folder.join('ABC_FASTQ_CDS.faa').write('cds')
+    folder.join('taxonomy-summary', 'SSU').ensure(dir=True) \
+        .join('ABC_FASTQ_SSU.fasta.mseq.tsv').write('ssu')
+
+    downloads = {}
+    for name, download_subdir in [('ABC_FASTQ_IPR.tsv.gz', None),
+                                  ('ABC_FASTQ_SSU.fasta.mseq.tsv', subdir),
+                                  ('ABC_FASTQ_CDS.faa.gz', None),
+                                  ('ABC_FASTQ_LSU.fasta.mseq.tsv', subdir)]:
+        downloads[name] = baker.make(
+            'emgapi.AnalysisJobDownload', job=job, realname=name, alias=name,
+            subdir=download_subdir, pipeline=job.pipeline)
+    return job, downloads
+
+
+def read_report(path):
+    with open(path) as f:
+        return list(csv.reader(f, delimiter='\t'))
+
+
+@pytest.mark.django_db
+class TestDownloadFilesReport:
+
+    def test_missing_files(self, tmpdir, analysis_files):
+        job, downloads = analysis_files
+        output = str(tmpdir.join('report.tsv'))
+        call_command('download_files_report', '--output', output,
+                     '--chunk-size', '1', '--workers', '2')
+
+        rows = read_report(output)
+        assert rows[0] == ['file_id', 'file_path', 'job_accession',
+                           'study_accession', 'unzipped?']
+        result_dir = os.path.join(str(tmpdir), job.result_directory)
+        assert sorted(rows[1:]) == sorted([
+            [str(downloads['ABC_FASTQ_CDS.faa.gz'].pk),
+             os.path.join(result_dir, 'ABC_FASTQ_CDS.faa.gz'),
+             job.accession, job.study.accession, 'True'],
+            [str(downloads['ABC_FASTQ_LSU.fasta.mseq.tsv'].pk),
+             os.path.join(result_dir, 'taxonomy-summary', 'SSU',
+                          'ABC_FASTQ_LSU.fasta.mseq.tsv'),
+             job.accession, job.study.accession, ''],
+        ])
+
+    def test_resume(self, tmpdir, analysis_files):
+        job, downloads = analysis_files
+        output = str(tmpdir.join('report.tsv'))
+        call_command('download_files_report', '--output', output,
+                     '--study', job.study.accession,
+                     '--after', str(downloads['ABC_FASTQ_CDS.faa.gz'].pk))
+
+        rows = read_report(output)
+        assert [row[0] for row in rows] == [
+            str(downloads['ABC_FASTQ_LSU.fasta.mseq.tsv'].pk)]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import io
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from django.urls import reverse
+
+from rest_framework import status
+
+from emgapi import ebisearch
+
+
+class StubSearchServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    """EBI Search stub, the first pages are the slowest and the first
+    request of the page starting at 100 fails.
+    """
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        start = int(params['start'][0])
+        size = int(params['size'][0])
+        with self.server.lock:
+            self.server.calls.append(start)
+            fail = start == 100 and self.server.calls.count(start) == 1
+        if fail:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        time.sleep(max(0, 0.2 - start / 1000))
+        entries = [
+            {'id': str(i), 'fields': {'name': ['entry-{}'.format(i)]}}
+            for i in range(start, min(start + size, self.server.total))
+        ]
+        body = json.dumps({'entries': entries}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def search_server(settings):
+    server = StubSearchServer(('127.0.0.1', 0), StubSearchHandler)
+    server.calls = []
+    server.lock = threading.Lock()
+    server.total = 450
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.EBI_SEARCH_URL = 'http://127.0.0.1:{}/'.format(
+        server.server_port)
+    settings.EMG_EBI_SEARCH_WORKERS = 4
+    settings.EMG_EBI_SEARCH_TIMEOUT = (1, 2)
+    settings.EMG_EBI_SEARCH_RETRIES = 2
+    settings.EMG_EBI_SEARCH_BACKOFF = 0
+    ebisearch._session = None
+    yield server
+    ebisearch._session = None
+    server.shutdown()
+    server.server_close()
+
+
+class TestEBISearchCSVDownload:
+
+    def test_download(self, client, search_server):
+        url = reverse('emgapi_v1:ebi-search-download',
+                      args=['metagenomics_samples'])
+        response = client.get(url, {'total': 450, 'fields': 'name'})
+        assert response.status_code == status.HTTP_200_OK
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        assert rows[0] == ['name']
+        # in order, the page starting at 100 was retried
+        assert rows[1:] == [['entry-{}'.format(i)] for i in range(450)]
+        assert sorted(search_server.calls) == [0, 100, 100, 200, 300, 400]
+
+    def test_missing_total(self, client, search_server):
+        url = reverse('emgapi_v1:ebi-search-download',
+                      args=['metagenomics_samples'])
+        response = client.get(url, {'fields': 'name'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_iter_entries_prefetch(self, search_server, settings):
+        url = settings.EBI_SEARCH_URL + 'metagenomics_samples'
+        entries = ebisearch.iter_entries(
+            url, {'format': 'json'}, 450, page_size=100, workers=2)
+        assert next(entries)['id'] == '0'
+        # two pages ahead at most
+        assert {0, 100} <= set(search_server.calls)
+        assert max(search_server.calls) <= 200
+        assert len(list(entries)) == 449
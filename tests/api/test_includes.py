@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+
+from test_utils.emg_fixtures import *  # noqa
+
+
+@pytest.mark.django_db
+class TestIncludes:
+
+    def _get(self, client, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json(), len(queries)
+
+    def test_study_biomes(self, client, samples):
+        url = reverse("emgapi_v1:studies-list")
+        data, few = self._get(client, url, include='biomes', page_size=5)
+        data, many = self._get(client, url, include='biomes', page_size=25)
+        assert few == many
+
+        assert len(data['data']) == 25
+        for study in data['data']:
+            biomes = study['relationships']['biomes']['data']
+            assert [b['id'] for b in biomes] == ['root:foo:bar']
+        # the shared biome is included once
+        assert [i['id'] for i in data['included']] == ['root:foo:bar']
+
+    def test_sample_studies(self, client, samples):
+        url = reverse("emgapi_v1:samples-list")
+        data, few = self._get(client, url, page_size=5)
+        data, many = self._get(client, url, page_size=25)
+        assert few == many
+
+        for sample in data['data']:
+            studies = sample['relationships']['studies']['data']
+            assert len(studies) == 1
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import datetime
+import decimal
+import io
+import json
+import uuid
+
+import pytest
+
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import renderers
+from rest_framework import serializers
+from rest_framework import status
+from rest_framework_json_api.renderers import JSONRenderer
+
+from emgapi import renderers as emg_renderers
+
+from test_utils.emg_fixtures import *  # noqa
+
+
+class TestNativeJSONRenderer:
+
+    @pytest.mark.parametrize('data', [
+        {'a': 1, 'b': [1.5, 1e-05, 1e+16, 0.0001, -0.1], 'c': None},
+        {'text': 'separators \u2028 \u2029 \x00 é "quoted"'},
+        {'date': datetime.date(2021, 7, 1),
+         'datetime': datetime.datetime(2021, 7, 1, 10, 0, 0, 123,
+                                       tzinfo=timezone.utc),
+         'naive': datetime.datetime(2021, 7, 1, 10, 0, 0),
+         'decimal': decimal.Decimal('1.10'),
+         'uuid': uuid.UUID('12345678123456781234567812345678')},
+        {'big': 2 ** 70, 1: 'int key'},
+        [True, False, (1, 2), 'e10'],
+    ])
+    def test_same_output(self, data):
+        expected = renderers.JSONRenderer().render(data)
+        assert emg_renderers.NativeJSONRenderer().render(data) == expected
+
+    @pytest.mark.parametrize('data, exponent', [
+        ({'a': [1.5, 1e-05]}, True),
+        ({'a': -1e+16}, True),
+        (1e-07, True),
+        ({'a': [0.0001, 2 ** 60, 123.0e-2]}, False),
+        ({'sha1': '3e7f1d4b2c9a0e8d7f6c5b4a3e2d1c0b9a8f7e6d'}, False),
+        ({'text': 'diluted 1e-5, 0.00001 and [1e16]', '1e5': ':1e5'}, False),
+    ])
+    def test_exponent_numbers(self, data, exponent):
+        orjson = pytest.importorskip('orjson')
+        renderer = emg_renderers.NativeJSONRenderer()
+        assert renderer.has_exponent_numbers(orjson.dumps(data)) == exponent
+
+    def test_indent(self):
+        data = {'a': [1, 2]}
+        media_type = 'application/json; indent=4'
+        assert emg_renderers.NativeJSONRenderer().render(data, media_type) \
+            == renderers.JSONRenderer().render(data, media_type)
+
+
+@pytest.mark.django_db
+class TestJSONAPIRenderer:
+
+    @pytest.mark.parametrize('view, args', [
+        ('emgapi_v1:studies-list', []),
+        ('emgapi_v1:studies-detail', ['MGYS00001234']),
+        ('emgapi_v1:samples-list', []),
+    ])
+    def test_same_output(self, client, study, sample, view, args):
+        media_type = JSONRenderer.media_type
+        response = client.get(reverse(view, args=args),
+                              HTTP_ACCEPT=media_type)
+        assert response.status_code == status.HTTP_200_OK
+        assert isinstance(response.accepted_renderer,
+                          emg_renderers.JSONAPIRenderer)
+        expected = JSONRenderer().render(
+            response.data, media_type, response.renderer_context)
+        assert response.content == expected
+
+
+@pytest.mark.django_db
+class TestCSVStreamingRenderer:
+
+    @pytest.mark.parametrize('ordering', ['', 'accession', '-accession'])
+    def test_chunks(self, client, settings, studies, ordering):
+        settings.EMG_EXPORT_CHUNK_SIZE = 10
+        params = {'format': 'csv'}
+        if ordering:
+            params['ordering'] = ordering
+        response = client.get(reverse('emgapi_v1:studies-list'), params)
+        assert response.status_code == status.HTTP_200_OK
+        rows = list(csv.DictReader(
+            io.StringIO(b''.join(response.streaming_content).decode())))
+        assert len(rows) == 49
+        accessions = [r['accession'] for r in rows]
+        assert len(set(accessions)) == 49
+        if ordering == 'accession':
+            assert accessions[0] == 'MGYS00000001'
+        elif ordering == '-accession':
+            assert accessions[0] == 'MGYS00000049'
+
+
+@pytest.mark.django_db
+class TestExportRenderers:
+
+    def test_ndjson(self, client, settings, studies):
+        settings.EMG_EXPORT_CHUNK_SIZE = 10
+        response = client.get(
+            reverse('emgapi_v1:studies-list'), {'format': 'ndjson'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert response['Content-Disposition'] == \
+            'attachment; filename="Study.ndjson"'
+        lines = b''.join(response.streaming_content).splitlines()
+        rows = [json.loads(line) for line in lines]
+        assert len(rows) == 49
+        assert len(set(r['accession'] for r in rows)) == 49
+
+    def test_parquet(self, client, settings, studies):
+        pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+        settings.EMG_EXPORT_CHUNK_SIZE = 10
+        response = client.get(
+            reverse('emgapi_v1:studies-list'), {'format': 'parquet'})
+        assert response.status_code == status.HTTP_200_OK
+        parquet_file = pyarrow_parquet.ParquetFile(
+            io.BytesIO(b''.join(response.streaming_content)))
+        assert parquet_file.num_row_groups == 5
+        table = parquet_file.read()
+        assert table.num_rows == 49
+        assert len(set(table.column('accession').to_pylist())) == 49
+
+    def test_parquet_schema(self):
+        pytest.importorskip('pyarrow')
+
+        class Serializer(serializers.Serializer):
+            count = serializers.IntegerField()
+            score = serializers.FloatField()
+            public = serializers.BooleanField()
+            name = serializers.CharField()
+            attributes = serializers.DictField()
+
+        renderer = emg_renderers.ParquetRenderer()
+        schema = renderer.get_schema(Serializer().fields)
+        assert [str(f.type) for f in schema] == \
+            ['int64', 'double', 'bool', 'string', 'string']
+        table = renderer.to_table([{
+            'count': 2 ** 60, 'score': 0.5, 'public': True, 'name': 'x',
+            'attributes': {'depth': 1}}], schema)
+        assert table.to_pylist() == [{
+            'count': 2 ** 60, 'score': 0.5, 'public': True, 'name': 'x',
+            'attributes': '{"depth": 1}'}]
+
+    def test_parquet_chunks(self):
+        pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+
+        class Serializer(serializers.Serializer):
+            count = serializers.IntegerField()
+            tags = serializers.ListField()
+            attributes = serializers.DictField()
+
+        chunks = [
+            [{'count': 1, 'tags': [], 'attributes': {'depth': None}}],
+            [{'count': 2, 'tags': ['soil'], 'attributes': {'ph': 7.5}}],
+            [{'count': 'many', 'tags': [], 'attributes': {}}],
+        ]
+
+        class Renderer(emg_renderers.ParquetRenderer):
+            def serialized_chunks(self, queryset, serializer, context):
+                return iter(chunks)
+
+        content = Renderer().render(
+            {'queryset': None, 'serializer': Serializer, 'context': {}})
+        next(content)
+        next(content)
+        # the values that don't fit the schema are not written as null
+        with pytest.raises(ValueError, match='count'):
+            next(content)
+
+        del chunks[2]
+        content = b''.join(Renderer().render(
+            {'queryset': None, 'serializer': Serializer, 'context': {}}))
+        parquet_file = pyarrow_parquet.ParquetFile(io.BytesIO(content))
+        assert parquet_file.num_row_groups == 2
+        assert parquet_file.read().to_pylist() == [
+            {'count': 1, 'tags': '[]', 'attributes': '{"depth": null}'},
+            {'count': 2, 'tags': '["soil"]', 'attributes': '{"ph": 7.5}'},
+        ]
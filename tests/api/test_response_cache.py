@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+
+from django.http import HttpResponse
+from django.urls import reverse
+
+from rest_framework import status
+
+from emgapi import models as emg_models
+from emgcli import cache as response_cache
+from emgcli.middleware import ResponseCacheMiddleware
+
+from test_utils.emg_fixtures import *  # noqa
+
+
+@pytest.fixture
+def response_cache_settings(settings):
+    settings.CACHES = {
+        'response': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'emg-test-response-cache',
+        }
+    }
+    settings.RESPONSE_CACHE = {'cache': 'response', 'timeout': 60}
+    middleware = list(settings.MIDDLEWARE)
+    middleware.insert(
+        middleware.index('django.middleware.http.ConditionalGetMiddleware') + 1,
+        'emgcli.middleware.ResponseCacheMiddleware')
+    settings.MIDDLEWARE = middleware
+    yield settings
+    response_cache.get_cache().clear()
+
+
+@pytest.mark.django_db
+class TestResponseCache:
+
+    def test_hit_and_purge(self, client, study, response_cache_settings):
+        url = reverse("emgapi_v1:studies-detail", args=["MGYS00001234"])
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Cache'] == 'MISS'
+
+        emg_models.Study.objects.filter(pk=study.pk) \
+            .update(study_name='New name')
+
+        response = client.get(url)
+        assert response['X-Cache'] == 'HIT'
+        assert response.json()['data']['attributes']['study-name'] == \
+            'Example study name SRP01234'
+
+        response_cache.purge(*response_cache.study_tags(study))
+
+        response = client.get(url)
+        assert response['X-Cache'] == 'MISS'
+        assert response.json()['data']['attributes']['study-name'] == \
+            'New name'
+
+    def test_purge_while_rendering(self, rf, response_cache_settings):
+        request = rf.get('/v1/studies/MGYS00001234')
+
+        def view(request):
+            # i.e. an import finishes while the response is rendered
+            response_cache.purge('MGYS00001234')
+            return HttpResponse('old content')
+
+        response = ResponseCacheMiddleware(view)(request)
+        assert response['X-Cache'] == 'MISS'
+        assert response_cache.get_response(request) is None
+
+    def test_key_normalisation(self, rf):
+        a = rf.get('/v1/studies', {'page': 2, 'ordering': 'accession'})
+        b = rf.get('/v1/studies?ordering=accession&page=2')
+        c = rf.get('/v1/studies', {'page': 2, 'ordering': 'accession'},
+                   HTTP_ACCEPT='text/csv')
+        assert response_cache.request_key(a) == response_cache.request_key(b)
+        assert response_cache.request_key(a) != response_cache.request_key(c)
+
+    def test_tags(self, rf):
+        request = rf.get('/v1/studies/MGYS00001234/analyses')
+        assert response_cache.request_tags(request) == ['MGYS00001234']
+        request = rf.get('/v1/biomes/root:foo/studies')
+        assert response_cache.request_tags(request) == ['collection:biomes']
+
+    def test_authenticated_requests_not_cached(self, rf):
+        request = rf.get('/v1/studies', HTTP_AUTHORIZATION='Bearer 123')
+        assert not response_cache.is_cacheable_request(request)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_save_purges(client, study, response_cache_settings):
+    """Saving a study (i.e. in the admin) purges its responses
+    """
+    url = reverse("emgapi_v1:studies-detail", args=["MGYS00001234"])
+    assert client.get(url)['X-Cache'] == 'MISS'
+    assert client.get(url)['X-Cache'] == 'HIT'
+
+    study.study_name = 'New name'
+    study.save()
+
+    response = client.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.json()['data']['attributes']['study-name'] == 'New name'
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from rest_framework.request import Request
+from rest_framework.reverse import reverse as drf_reverse
+
+from emgapi import reverse as emg_reverse
+
+
+@pytest.fixture
+def templates(settings, monkeypatch):
+    settings.ALLOWED_HOSTS = ['*']
+    monkeypatch.setattr(emg_reverse, '_templates', {})
+    return emg_reverse._templates
+
+
+class TestURLTemplates:
+
+    @pytest.mark.parametrize('path', [
+        '/v1/studies',
+        '/v1/studies?format=json',
+    ])
+    @pytest.mark.parametrize('view, kwargs', [
+        ('emgapi_v1:studies-detail', {'accession': 'MGYS00001234'}),
+        ('emgapi_v1:studies-detail', {'accession': 'a b?#%é{0}'}),
+        ('emgapi_v1:analyses-detail', {'accession': 'MGYA00001234'}),
+        ('emgapi_v1:biomes-detail', {'lineage': 'root:Host-associated'}),
+        ('emgapi_v1:studies-samples-list', {'accession': 'MGYS00001234'}),
+        ('emgapi_v1:genomes-detail', {'accession': 'MGYG000000001'}),
+    ])
+    def test_same_url(self, rf, templates, path, view, kwargs):
+        request = Request(rf.get(path, HTTP_HOST='www.ebi.ac.uk'))
+        expected = drf_reverse(view, kwargs=kwargs, request=request)
+        # compile and use the template
+        for _ in range(2):
+            assert emg_reverse.reverse(
+                view, kwargs=kwargs, request=request) == expected
+
+    def test_template_per_host(self, rf, templates):
+        kwargs = {'accession': 'MGYS00001234'}
+        for host in ('www.ebi.ac.uk', 'wwwdev.ebi.ac.uk'):
+            request = Request(rf.get('/v1/studies', HTTP_HOST=host))
+            url = emg_reverse.reverse(
+                'emgapi_v1:studies-detail', kwargs=kwargs, request=request)
+            assert url == \
+                'http://{}/v1/studies/MGYS00001234'.format(host)
+        assert len(templates) == 2
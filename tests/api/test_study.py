@@ -21,6 +21,8 @@ from django.urls import reverse
 
 from rest_framework import status
 
+from emgapi import models as emg_models
+
 from test_utils.emg_fixtures import *  # noqa
 
 
@@ -68,3 +70,24 @@ class TestStudyAPI:
         assert d['type'] == "studies"
         assert d['id'] == "MGYS00001234"
         assert d['attributes']['accession'] == "MGYS00001234"
+
+    def test_conditional_get(self, client, study):
+        url = reverse("emgapi_v1:studies-detail", args=["MGYS00001234"])
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+        # different fields, different validator
+        response = client.get(
+            url, {'fields[studies]': 'accession'}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+        emg_models.Study.objects.filter(pk=study.pk) \
+            .update(last_update='2021-01-01 00:00:00')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
@@ -84,8 +84,11 @@ def mongodb(request):
         db = mongoengine.connect('testdb', host='localhost:27017', alias='test')
 
     def finalizer():
+        from emgapianns.management.commands.import_taxonomy import lineage_resolver
         db.drop_database('testdb')
         db.close()
+        # the organisms were dropped
+        lineage_resolver.clear()
 
     request.addfinalizer(finalizer)
 
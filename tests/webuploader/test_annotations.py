@@ -22,6 +22,8 @@ from django.core.management import call_command
 
 from rest_framework import status
 
+from emgapianns import models as m_models
+
 from test_utils.emg_fixtures import *  # noqa
 
 
@@ -120,6 +122,44 @@ class TestAnnotations:
         rsp = response.json()
         assert rsp['data']['id'] == 'IPR009739'
 
+    def test_go_reimport(self, client, run):
+        """Test GO and GO slim of the same analysis, imported twice"""
+        path = os.path.dirname(os.path.abspath(__file__))
+        for _ in range(2):
+            for suffix in ('.go', '.go_slim'):
+                call_command('import_summary', run.accession, path,
+                             suffix=suffix)
+
+        url = reverse('emgapi_v1:goterms-list')
+        response = client.get(url)
+        assert len(response.json()['data']) == 6
+
+        # both annotations are kept
+        for view, count in (('emgapi_v1:analysis-goterms-list', 6),
+                            ('emgapi_v1:analysis-goslim-list', 3)):
+            url = reverse(view, args=['MGYA00001234'])
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.json()['data']) == count
+
+    @pytest.mark.parametrize('suffix, analysis_model, field', [
+        ('.pfam', m_models.AnalysisJobPfam, 'pfam_entries'),
+        ('.antismash', m_models.AnalysisJobAntiSmashGeneCluser,
+         'antismash_gene_clusters'),
+    ])
+    def test_sorted_entries(self, analysis_results, suffix, analysis_model,
+                            field):
+        """The sorted list fields are stored by count, descending"""
+        job = analysis_results['5.0']
+        call_command('import_summary', job.run.accession,
+                     os.path.dirname(os.path.abspath(__file__)),
+                     pipeline='5.0', suffix=suffix)
+
+        entries = getattr(analysis_model.objects.get(pk=str(job.job_id)), field)
+        counts = [entry.count for entry in entries]
+        assert len(counts) > 1
+        assert counts == sorted(counts, reverse=True)
+
     def test_object_does_not_exist(self, client):
         """Test results for an existent annotation"""
         url = reverse('emgapi_v1:goterms-detail', args=['GO:9999'])
@@ -398,3 +438,46 @@ class TestAnnotations:
                     for a in rsp['data']
                 }
                 assert ids == expected
+
+
+@pytest.mark.usefixtures('mongodb')
+@pytest.mark.django_db
+class TestStudyAnnotationMatrix:
+
+    def test_go_terms(self, client, run, settings):
+        settings.EMG_MATRIX_CACHE_TTL = 0
+        call_command('import_summary', run.accession,
+                     os.path.dirname(os.path.abspath(__file__)),
+                     suffix='.go')
+
+        url = reverse('study-annotation-matrix',
+                      args=['MGYS00001234', '4.1', 'go-terms'])
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        rsp = response.json()
+        assert rsp['matrix_type'] == 'sparse'
+        assert rsp['shape'] == [6, 1]
+        assert rsp['columns'][0]['id'] == 'MGYA00001234'
+        assert rsp['columns'][0]['metadata']['sample'] == 'ERS01234'
+        counts = {
+            rsp['rows'][r]['id']: value for r, c, value in rsp['data']
+        }
+        assert counts['GO:0030170'] == 2885
+        assert counts['GO:0005515'] == 6016
+        assert rsp['rows'][0]['metadata']['description'] == 'protein binding'
+
+        response = client.get(url, {'format': 'tsv'})
+        assert response.status_code == status.HTTP_200_OK
+        lines = response.content.decode().splitlines()
+        assert lines[1] == '#OTU ID\tMGYA00001234\tdescription\tlineage'
+        assert lines[2] == \
+            'GO:0005515\t6016\tprotein binding\tmolecular_function'
+
+        response = client.get(url, {'samples': 'ERS99999'})
+        assert response.json()['shape'] == [0, 0]
+
+    def test_unknown_matrix(self, client, study):
+        url = reverse('study-annotation-matrix',
+                      args=['MGYS00001234', '4.1', 'unknown'])
+        response = client.get(url)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -14,14 +14,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gzip
 import pytest
 import os
 
 from django.urls import reverse
-from django.core.management import call_command
+from django.core.management import call_command, CommandError
 
 from rest_framework import status
 
+from emgapianns import models as m_models
+from emgapianns.management.commands.import_contigs import Command
+
 from test_utils.emg_fixtures import *  # noqa
 
 
@@ -65,3 +69,105 @@ class TestContigs:
         list_resp_empty = client.get(list_url + '?go=XXXXXX')
         assert list_resp_empty.status_code == status.HTTP_200_OK
         len(list_resp_empty.json()['data']) == 0
+
+    def test_import_contigs_staged(self, client, run_v5):
+        """Re-import the contigs as a new generation
+        """
+        rootpath = os.path.dirname(os.path.abspath(__file__))
+        call_command('import_contigs', run_v5.accession, rootpath, '--pipeline', '5.0')
+        call_command('import_contigs', run_v5.accession, rootpath, '--pipeline', '5.0',
+                     '--staged')
+
+        active = m_models.AnalysisJobContigGeneration.objects.get(pk='1234')
+        assert active.generation is not None
+        # the previous generation was removed
+        contigs = m_models.AnalysisJobContig.objects.filter(analysis_id='1234')
+        assert contigs.count() == 3
+        assert set(c.generation for c in contigs) == {active.generation}
+
+        list_url = reverse('emgapi_v1:analysis-contigs-list', args=['MGYA00001234'])
+        list_response = client.get(list_url)
+        assert list_response.status_code == status.HTTP_200_OK
+        assert len(list_response.json()['data']) == 3
+
+    def test_import_contigs_staged_old_index(self, run_v5):
+        """The unique index without the generation is rebuilt
+        with ensure_indexes before the staged imports
+        """
+        rootpath = os.path.dirname(os.path.abspath(__file__))
+        collection = m_models.AnalysisJobContig._get_collection()
+        collection.create_index([('contig_id', 1), ('accession', 1), ('pipeline_version', 1)],
+                                unique=True, name='contig_id_1_accession_1_pipeline_version_1')
+        call_command('import_contigs', run_v5.accession, rootpath, '--pipeline', '5.0')
+
+        with pytest.raises(CommandError, match='ensure_indexes'):
+            call_command('import_contigs', run_v5.accession, rootpath, '--pipeline', '5.0',
+                         '--staged')
+        assert m_models.AnalysisJobContig.objects.filter(analysis_id='1234').count() == 3
+
+        call_command('ensure_indexes', 'AnalysisJobContig')
+        assert 'contig_id_1_accession_1_pipeline_version_1' not in collection.index_information()
+        call_command('import_contigs', run_v5.accession, rootpath, '--pipeline', '5.0',
+                     '--staged')
+        active = m_models.AnalysisJobContigGeneration.objects.get(pk='1234')
+        contigs = m_models.AnalysisJobContig.objects.filter(analysis_id='1234')
+        assert set(c.generation for c in contigs) == {active.generation}
+
+
+class TestContigsJoin:
+    """Merge join of the fasta index and the annotations
+    """
+
+    def write_gff(self, path, contigs):
+        with gzip.open(str(path), 'wt') as gff:
+            gff.write('##gff-version 3\n')
+            for contig, atts in contigs:
+                gff.write('\t'.join([contig, 'eggNOG-v2', 'CDS', '1', '10',
+                                     '.', '+', '.', atts]) + '\n')
+
+    def test_join(self, tmpdir):
+        faix = tmpdir.join('contigs.fasta.bgz.fai')
+        faix.write('c3\t900\t1\t1\nc1\t100\t1\t1\nc2\t800\t1\t1\n'
+                   'c4\t700\t1\t1\n')
+        gff = tmpdir.join('annotations.gff.bgz')
+        self.write_gff(gff, [('c1', 'pfam=PF1'), ('c2', 'pfam=PF1,PF2'),
+                             ('c2', 'pfam=PF2'), ('c3', 'go=GO:1')])
+        antismash = tmpdir.join('antismash.gff.bgz')
+        self.write_gff(antismash, [('c4', 'as_gene_clusters=terpene')])
+
+        command = Command()
+        command.SORT_CHUNK = 2
+        contigs = list(command.join_annotations(
+            command.load_faix(str(faix), 500),
+            command.load_gff(str(gff)),
+            command.load_antismash(str(antismash))))
+        # c1 is too short
+        assert [(c, length) for c, length, _ in contigs] == [
+            ('c2', 800), ('c3', 900), ('c4', 700)]
+        assert contigs[0][2]['pfam'] == ['PF1', 'PF2', 'PF2']
+        assert contigs[1][2]['go'] == ['GO:1']
+        assert contigs[2][2] == {'antismash': ['terpene']}
+
+    def test_unsorted_gff(self, tmpdir):
+        """Grouped but not byte sorted GFF (i.e. locale sorted)
+        """
+        gff = tmpdir.join('annotations.gff.bgz')
+        self.write_gff(gff, [('c_2', 'pfam=PF2'), ('c_2', 'pfam=PF3'),
+                             ('C3', 'go=GO:1'), ('c1', 'pfam=PF1'),
+                             ('c1', 'pfam=PF4')])
+        command = Command()
+        command.SORT_CHUNK = 2
+        contigs = list(command.load_gff(str(gff)))
+        assert [c for c, _ in contigs] == ['C3', 'c1', 'c_2']
+        assert contigs[1][1]['pfam'] == ['PF1', 'PF4']
+        assert contigs[2][1]['pfam'] == ['PF2', 'PF3']
+
+    def test_antismash_contig_ids(self, tmpdir):
+        """The antiSMASH contig ids are sorted after the ' ' to '-' rewrite
+        """
+        antismash = tmpdir.join('antismash.gff.bgz')
+        self.write_gff(antismash, [('c 1', 'as_gene_clusters=terpene'),
+                                   ('c!1', 'as_gene_clusters=NRPS')])
+        contigs = list(Command().load_antismash(str(antismash)))
+        assert contigs == [('c!1', {'antismash': ['NRPS']}),
+                           ('c-1', {'antismash': ['terpene']})]
@@ -14,11 +14,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import csv
+import json
 import pytest
 import os
+import shutil
 
 from django.urls import reverse
-from django.core.management import call_command
+from django.core.management import call_command, CommandError
 
 from rest_framework import status
 
@@ -126,3 +129,89 @@ class TestGenomes:
         ]
         returned_ids = [d.get('attributes').get('accession') for d in resp_data['data']]
         assert expected_ids.sort() == returned_ids.sort()
+
+    @pytest.mark.django_db
+    def test_import_genomes_counts(self):
+        """Genome and pan-genome counts, imported twice
+        """
+        self._setup()
+        baker.make('emgapi.Biome',
+                   lineage='root:Host-Associated:Human:Digestive System:Large intestine')
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data/genomes/')
+        genome_dir = os.path.join(path, '1.0', 'MGYG-HGUT-00777')
+
+        def read_counts(f, column):
+            with open(os.path.join(genome_dir, f)) as tsv:
+                rows = csv.DictReader(tsv, delimiter='\t')
+                return {r[column]: int(r['Counts']) for r in rows}
+
+        for _ in range(2):
+            call_command('import_genomes', path, '1.0')
+
+            genome = emg_models.Genome.objects.get(accession='MGYG-HGUT-00777')
+            cogs = emg_models.GenomeCogCounts.objects.filter(genome=genome)
+            genome_cogs = read_counts('genome/cog_summary.tsv', 'COG_category')
+            pangenome_cogs = read_counts('pan-genome/cog_summary.tsv', 'COG_category')
+            assert cogs.count() == len(set(genome_cogs) | set(pangenome_cogs))
+            for count in cogs:
+                assert count.genome_count == genome_cogs.get(count.cog.name, 0)
+                assert count.pangenome_count == pangenome_cogs.get(count.cog.name, 0)
+
+            modules = emg_models.GenomeKeggModuleCounts.objects.filter(genome=genome)
+            genome_modules = read_counts('genome/kegg_modules.tsv', 'KEGG_module')
+            assert {m.kegg_module.name: m.genome_count for m in modules
+                    if m.kegg_module.name in genome_modules} == genome_modules
+
+        assert emg_models.CogCat.objects.count() == \
+            emg_models.CogCat.objects.values('name').distinct().count()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_import_genomes_workers(self):
+        """Upload the genomes with a pool of processes
+        """
+        self._setup()
+        baker.make('emgapi.Biome',
+                   lineage='root:Host-Associated:Human:Digestive System:Large intestine')
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data/genomes/')
+        call_command('import_genomes', path, '1.0', '--workers', '2')
+
+        assert emg_models.Genome.objects.count() == 3
+        assert emg_models.ReleaseGenomes.objects.count() == 3
+        genome = emg_models.Genome.objects.get(accession='MGYG-HGUT-00777')
+        assert emg_models.GenomeCogCounts.objects.filter(genome=genome).exists()
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize('workers', ['1', '2'])
+    def test_import_genomes_failed(self, tmp_path, workers):
+        """A failed genome doesn't stop the upload of the others,
+        the antiSMASH clusters are shared by the genomes
+        """
+        self._setup()
+        baker.make('emgapi.Biome',
+                   lineage='root:Host-Associated:Human:Digestive System:Large intestine')
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data/genomes/')
+        rootpath = os.path.join(str(tmp_path), 'genomes')
+        shutil.copytree(path, rootpath)
+        release_dir = os.path.join(rootpath, '1.0')
+        for accession in ('MGYG-HGUT-00776', 'MGYG-HGUT-00777'):
+            with open(os.path.join(release_dir, accession, 'genome', 'geneclusters.txt'), 'w') as f:
+                f.write('{0}\tcontig_1\tNRPS\tgene_1;gene_2\t\n'.format(accession))
+                f.write('{0}\tcontig_2\tterpene\tgene_3\t\n'.format(accession))
+        genome_json = os.path.join(release_dir, 'MGYG-HGUT-00778', 'genome.json')
+        with open(genome_json) as f:
+            data = json.load(f)
+        data['gold_biome'] = 'root:Unknown'
+        with open(genome_json, 'w') as f:
+            json.dump(data, f)
+
+        with pytest.raises(CommandError, match='1 genomes failed to upload: MGYG-HGUT-00778'):
+            call_command('import_genomes', rootpath, '1.0', '--workers', workers)
+
+        assert set(emg_models.Genome.objects.values_list('accession', flat=True)) == \
+            {'MGYG-HGUT-00776', 'MGYG-HGUT-00777'}
+        assert sorted(emg_models.AntiSmashGC.objects.values_list('name', flat=True)) == \
+            ['NRPS', 'terpene']
+        counts = emg_models.GenomeAntiSmashGCCounts.objects \
+            .filter(genome__accession='MGYG-HGUT-00777')
+        assert {c.antismash_genecluster.name: c.genome_count for c in counts} == \
+            {'NRPS': 2, 'terpene': 1}
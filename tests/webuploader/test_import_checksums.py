@@ -141,3 +141,44 @@ class TestDownloadFileChecksums:
             assert f in returned
             assert returned[f][0] == f_hash
             assert returned[f][1] == f_hash_alg.name
+
+    @pytest.mark.django_db
+    def test_import_checksums_accessions(self, pipelines, analysis_results):
+        """Assert that the analyses can be given by accession, in batches
+        """
+        fasta_gz, _ = emg_models.FileFormat.objects.get_or_create(format_name="FASTA", compression=True)
+        sha1, _ = emg_models.ChecksumAlgorithm.objects.get_or_create(name="SHA1")
+
+        files = {
+            "RNase_P.RF01577.fasta.gz": "8bb47dbe7db5d8af73e3dbcba697d5c8db057460",
+            "alpha_tmRNA.RF01849.fasta.gz": "846dee603b7b8f2f400a6b02558bb9c26938e51f",
+            "beta_tmRNA.RF01850.fasta.gz": "718b7708a1571e64a5ac8848db7ab7497513e8e7",
+            "not_in_the_checksums.fasta.gz": None,
+        }
+
+        a_job = analysis_results["5.0"]
+        pipeline = pipelines.filter(release_version="5.0").first()
+
+        for f in files:
+            baker.make("emgapi.AnalysisJobDownload",
+                       job=a_job,
+                       pipeline=pipeline,
+                       realname=f,
+                       alias=f,
+                       file_format=fasta_gz)
+
+        call_command("import_checksums", "ERR0000000",
+                     os.path.dirname(os.path.abspath(__file__)),
+                     "--pipeline", "5.0",
+                     "--accessions", a_job.accession,
+                     "--batch-size", "2")
+
+        downloads = emg_models.AnalysisJobDownload.objects.filter(job=a_job)
+        assert len(downloads) == len(files)
+        for download in downloads:
+            if files[download.realname]:
+                assert download.file_checksum == files[download.realname]
+                assert download.checksum_algorithm == sha1
+            else:
+                assert download.file_checksum == ""
+                assert download.checksum_algorithm is None
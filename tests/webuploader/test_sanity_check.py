@@ -14,7 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gzip
 import os
+import shutil
 from unittest.mock import patch
 import pytest
 import logging
@@ -243,3 +245,29 @@ class TestSanityCheck:
         test_instance = sanity_check.SanityCheck(accession, result_dir, experiment_type, version, result_status)
         with pytest.raises(CoverageCheckException):
             test_instance.run_coverage_check()
+
+    def test_coverage_check_counts_are_memoised(self, tmp_path):
+        root_dir = os.path.join(os.path.dirname(__file__), "test_data")
+        result_dir = os.path.join(str(tmp_path), "ERZ782882_FASTA")
+        shutil.copytree(os.path.join(root_dir, "sanity_check/version_5.0/assembly/ERZ782882_FASTA"), result_dir)
+        # single chunks
+        with open(os.path.join(result_dir, "ERZ782882_FASTA_CDS.faa.chunks"), "w") as f:
+            f.write("ERZ782882_FASTA_CDS.faa.gz\n")
+        interpro = os.path.join(result_dir, "functional-annotation", "ERZ782882_FASTA.I5.tsv.gz")
+        with open(os.path.join(result_dir, "functional-annotation", "ERZ782882_FASTA.I5.tsv.chunks"), "w") as f:
+            f.write("ERZ782882_FASTA.I5.tsv.gz\n")
+        test_instance = sanity_check.SanityCheck("ERZ782882", result_dir, "assembly", "5.0", "full")
+        test_instance.run_coverage_check()
+
+        # same files, the counts are not read again
+        with patch.object(sanity_check, "count_content") as mock_count:
+            test_instance = sanity_check.SanityCheck("ERZ782882", result_dir, "assembly", "5.0", "full")
+            test_instance.run_coverage_check()
+        assert not mock_count.called
+
+        # the annotations are gone, the file changed
+        with gzip.open(interpro, "wt") as f:
+            f.write("header\n")
+        test_instance = sanity_check.SanityCheck("ERZ782882", result_dir, "assembly", "5.0", "full")
+        with pytest.raises(CoverageCheckException):
+            test_instance.run_coverage_check()
@@ -21,7 +21,7 @@ import pytest
 from model_bakery import baker
 from pandas.util.testing import assert_frame_equal
 
-from emgapianns.management.lib import study_summary_generator  # noqa: E402
+from emgapianns.management.lib import sequence_counts, study_summary_generator  # noqa: E402
 
 
 @pytest.fixture
@@ -86,6 +86,23 @@ class TestStudySummaryGenerator:
         study_df = study_summary.generate_taxonomy_phylum_summary_v5(analysis_result_dirs, rna_type)
         self.compare_dataframes(study_df, "phylum_taxonomy_abundances_{}_v5.tsv".format(rna_type))
 
+    @pytest.mark.django_db(transaction=True)
+    def test_generate_summaries_workers(self, study_summary):
+        """The result files parsed by a pool of processes give the same summaries
+        """
+        analysis_result_dirs = dict()
+        for acc in ["ERR2237853_MERGED_FASTQ", "ERR2237860_MERGED_FASTQ"]:
+            analysis_result_dirs[acc] = os.path.join(self._test_data_dir(), acc)
+        expected = study_summary.generate_taxonomy_phylum_summary_v5(analysis_result_dirs, "LSU")
+
+        study_summary.workers = 2
+        with study_summary.parsing_pool():
+            assert study_summary.pool is not None
+            study_df = study_summary.generate_taxonomy_phylum_summary_v5(analysis_result_dirs, "LSU")
+        assert study_summary.pool is None
+        assert_frame_equal(expected, study_df)
+        self.compare_dataframes(study_df, "phylum_taxonomy_abundances_LSU_v5.tsv")
+
     def test_generate_ipr_summary_v5(self, study_summary_v5_assembly):
         """
             Tests InterProScan summary file generation on v5 assembly data.
@@ -205,3 +222,49 @@ class TestStudySummaryGenerator:
     def test_get_abundance_file_description(self, study_summary, rna_type, expected):
         actual = study_summary._get_abundance_file_description(rna_type)
         assert expected == actual
+
+    @pytest.mark.parametrize("duplicated", [False, True])
+    def test_build_study_df(self, study_summary, duplicated):
+        """The pivoted matrix and the one merged analysis by analysis are equal
+        """
+        key = ["kingdom", "phylum"]
+        frames = [
+            ("ERR3", pd.DataFrame([["Bacteria", "P1", 5], ["Archaea", "P2", 1]],
+                                  columns=key + ["count"])),
+            ("ERR1", pd.DataFrame([["Bacteria", "P1", 2], ["Bacteria", "P0", 7]],
+                                  columns=key + ["count"])),
+            ("ERR2", pd.DataFrame([], columns=key + ["count"])),
+        ]
+        if duplicated:
+            # merged one analysis at a time
+            frames.append(("ERR4", pd.DataFrame([["Bacteria", "P0", 1], ["Bacteria", "P0", 3]],
+                                                columns=key + ["count"])))
+        study_df = study_summary.build_study_df(frames, key)
+        expected = pd.DataFrame([
+            ["Archaea", "P2", 1, 0, 0],
+            ["Bacteria", "P0", 0, 7, 0],
+            ["Bacteria", "P1", 5, 2, 0],
+        ], columns=key + ["ERR3", "ERR1", "ERR2"])
+        if duplicated:
+            expected = pd.DataFrame([
+                ["Archaea", "P2", 1, 0, 0, 0],
+                ["Bacteria", "P0", 0, 7, 0, 1],
+                ["Bacteria", "P0", 0, 7, 0, 3],
+                ["Bacteria", "P1", 5, 2, 0, 0],
+            ], columns=key + ["ERR3", "ERR1", "ERR2", "ERR4"])
+        assert list(study_df.columns) == list(expected.columns)
+        assert study_df.to_csv(sep="\t", index=False) == expected.to_csv(sep="\t", index=False)
+
+    def test_sequence_counts(self):
+        """Sequences of the FASTA file (as zcat | grep -c '>') and
+        assigned sequences of the mapseq file
+        """
+        run_dir = os.path.join(self._test_data_dir(), "ERR2237860_MERGED_FASTQ")
+        fasta = os.path.join(run_dir, "sequence-categorisation", "LSU.fasta.gz")
+        assert sequence_counts.count_fasta_records(fasta) == 400
+        assert sequence_counts.count_fasta_records(os.path.join(run_dir, "missing.fasta.gz")) == 0
+        mapseq = os.path.join(run_dir, "taxonomy-summary", "LSU",
+                              "ERR2237860_MERGED_FASTQ_LSU.fasta.mseq.gz")
+        lineages = sequence_counts.count_mapseq_lineages(mapseq, "SILVA")
+        assert sum(lineages.values()) == 399
+        assert all(lineage for lineage in lineages)
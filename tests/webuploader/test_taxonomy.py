@@ -121,3 +121,20 @@ class TestTaxonomy(object):
             for a in rsp['data']
         }
         assert ids == expected
+
+    def test_reimport_pipeline_v1(self, client, runjob_pipeline_v1):
+        run_accession = runjob_pipeline_v1.run.accession
+        for _ in range(2):
+            call_command('import_taxonomy', run_accession,
+                         os.path.dirname(os.path.abspath(__file__)),
+                         pipeline='1.0')
+            # the organisms were cached by the first import
+            url = reverse('emgapi_v1:organisms-list')
+            response = client.get(url)
+            assert len(response.json()['data']) == 8
+
+            url = reverse('emgapi_v1:analysis-taxonomy-list',
+                          args=[runjob_pipeline_v1.accession])
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.json()['data']) == 8